@@ -0,0 +1,141 @@
+"""
+pluggable kernels for the scatter reductions in remeshing
+
+backends
+- 'native'          ATen scatter_reduce_ with the index expanded to the source shape
+- 'torch_scatter'   torch_scatter/scatter_add_ as originally used, fallback if 'native' is not wanted
+- 'auto'            'native' on CPU, 'torch_scatter' on other devices
+
+NeighborMean averages vertex attributes over edge neighbors for MeshOptimizer.step(), independent of the backend
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import torch
+try:
+    import torch_scatter
+except ImportError:
+    torch_scatter = None
+
+BACKENDS = ('auto','native','torch_scatter')
+
+_backend = 'auto'
+_pool = None
+_pool_threads = 0
+
+def set_backend(backend:str):
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown kernel backend: {backend}')
+    if backend=='torch_scatter' and torch_scatter is None:
+        raise ValueError('kernel backend torch_scatter requires the torch_scatter package')
+    _backend = backend
+
+def get_backend(device:torch.device) -> str:
+    """resolve the backend used for tensors on device"""
+    if _backend!='auto':
+        return _backend
+    if torch.device(device).type=='cpu' or torch_scatter is None:
+        return 'native'
+    return 'torch_scatter'
+
+def _get_pool(threads:int) -> ThreadPoolExecutor:
+    global _pool,_pool_threads
+    if _pool is None or _pool_threads!=threads:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ThreadPoolExecutor(max_workers=threads)
+        _pool_threads = threads
+    return _pool
+
+def parallel_map(fn,items,threads:int=None)->list:
+    """
+    list(map(fn,items)) on a shared pool of threads workers, None for torch.get_num_threads().
+    The intra-op thread count is process global and left alone, fn should work on pieces small enough
+    that torch runs them on the calling thread, like a single view of util.rasterize.rasterize().
+    """
+    return list(_get_pool(torch.get_num_threads() if threads is None else threads).map(fn,items))
+
+def _native_reduce_(
+        out:torch.Tensor, #V or V,C
+        index:torch.Tensor, #N long
+        src:torch.Tensor, #N or N,C
+        reduce:str, #'amax' or 'sum'
+        )->torch.Tensor:
+    if src.dim()>1:
+        index = index[:,None].expand_as(src) #expanded index takes the ATen fast path
+    return out.scatter_reduce_(dim=0,index=index,src=src,reduce=reduce)
+
+def scatter_max_(
+        out:torch.Tensor, #V or V,C
+        index:torch.Tensor, #N long or int32
+        src:torch.Tensor, #N or N,C
+        )->torch.Tensor:
+    """out[index[i]] = max(out[index[i]],src[i]) in place"""
+    if get_backend(out.device)=='torch_scatter':
+        index = index.long() #torch_scatter only takes int64
+        if src.dim()>1:
+            index = index[:,None].expand_as(src)
+        torch_scatter.scatter_max(src=src,index=index,dim=0,out=out)
+        return out
+    return _native_reduce_(out,index,src,'amax')
+
+def scatter_add_(
+        out:torch.Tensor, #V or V,C
+        index:torch.Tensor, #N long or int32
+        src:torch.Tensor, #N or N,C
+        )->torch.Tensor:
+    """out[index[i]] += src[i] in place"""
+    if get_backend(out.device)=='torch_scatter':
+        index = index.long()
+        if src.dim()>1:
+            index = index[:,None].expand_as(src)
+        return out.scatter_add_(dim=0,index=index,src=src)
+    return _native_reduce_(out,index,src,'sum')
+
+class NeighborMean:
+    """
+    mean of x over the edge neighbors of each vertex, 0 for vertices without edges.
+    The first call gathers and index_add_s one edge direction at a time without an E,2,S temporary.
+    Later calls with the same edges use a CSR adjacency with 1/degree weights that is built once, one spmm per call.
+    Create a new instance whenever the edges change, so topology that lives for a single step never pays for the sort.
+    """
+
+    def __init__(self,
+            edges:torch.Tensor, #E,2 long
+            num_vertices:int,
+            ):
+        self._edges = edges
+        self._num_vertices = num_vertices
+        self._inv_degree = None #V
+        self._adjacency = None #sparse CSR V,V
+        self._calls = 0
+
+    def _get_inv_degree(self)->torch.Tensor:
+        if self._inv_degree is None:
+            degree = torch.bincount(self._edges.reshape(-1),minlength=self._num_vertices)
+            self._inv_degree = degree.clamp_(min=1).reciprocal().type(torch.float32)
+        return self._inv_degree
+
+    def _build_adjacency(self)->torch.Tensor:
+        V = self._num_vertices
+        edges = self._edges
+        rows = torch.cat((edges[:,0],edges[:,1])).type(torch.int32) #int32 sorts faster
+        cols = torch.cat((edges[:,1],edges[:,0])).type(torch.int32)
+        rows,order = torch.sort(rows)
+        crow = torch.zeros(V+1,dtype=torch.int32,device=edges.device)
+        torch.cumsum(torch.bincount(rows,minlength=V),dim=0,out=crow[1:])
+        values = self._get_inv_degree()[rows]
+        return torch.sparse_csr_tensor(crow,cols[order],values,(V,V))
+
+    def __call__(self,x:torch.Tensor)->torch.Tensor: #V,S -> V,S
+        self._calls += 1
+        if self._calls>1:
+            if self._adjacency is None:
+                self._adjacency = self._build_adjacency()
+            return self._adjacency.to(x.dtype) @ x
+
+        edges = self._edges
+        out = torch.zeros_like(x)
+        out.index_add_(0,edges[:,0],x.index_select(0,edges[:,1]))
+        out.index_add_(0,edges[:,1],x.index_select(0,edges[:,0]))
+        return out.mul_(self._get_inv_degree()[:,None].to(x.dtype))
@@ -1,8 +1,10 @@
 from copy import deepcopy
 import time
+import warnings
 import torch
-import torch_scatter
-from core.remesh import calc_edge_length, calc_edges, calc_face_collapses, calc_face_normals, calc_vertex_normals, collapse_edges, flip_edges, pack, prepend_dummies, remove_dummies, split_edges
+from core import remesh_sync_free
+from core.kernels import NeighborMean
+from core.remesh import calc_edge_length, calc_edge_to_face, calc_edges, calc_face_collapses, calc_face_normals, calc_vertex_normals, collapse_edges, flip_edges, pack, prepend_dummies, prepend_edge_dummies, remove_dummies, remove_edge_dummies, split_edges
 
 @torch.no_grad()
 def remesh(
@@ -11,55 +13,207 @@ def remesh(
         min_edgelen:torch.Tensor, #V
         max_edgelen:torch.Tensor, #V
         flip:bool,
-        max_vertices=1e6
-        ):
+        max_vertices=1e6, #splits add at most max_vertices minus the vertex count before collapsing, the longest edges
+            #relative to max_edgelen first. The same rule holds with sync_free and per mesh with group_channel
+        edges:torch.Tensor=None, #E,2 long, from calc_edges(faces) or a previous remesh()
+        face_to_edge:torch.Tensor=None, #F,3 long
+        sync_free:bool=False, #use upper bound buffers and read back the sizes once at the end
+        face_normals:torch.Tensor=None, #F,3 not normalized, from calc_face_normals(), computed if None
+        vertex_normals:torch.Tensor=None, #V,3
+        group_channel:int=None, #channel of vertices_etc holding a mesh index 0..num_groups-1, max_vertices then applies per mesh
+        num_groups:int=1,
+        return_topology:bool=None, #also return edges and face_to_edge for the next call, None for only if edges are given
+        )->"tuple[torch.Tensor,...]": #(vertices_etc,faces) or with return_topology (vertices_etc,faces,edges,face_to_edge)
+
+    if return_topology is None:
+        return_topology = edges is not None
+    if edges is None:
+        edges,face_to_edge = calc_edges(faces,num_vertices=vertices_etc.shape[0]) #E,2 F,3
 
     # dummies
     vertices_etc,faces = prepend_dummies(vertices_etc,faces)
+    edges,face_to_edge = prepend_edge_dummies(edges,face_to_edge)
     vertices = vertices_etc[:,:3] #V,3
-    nan_tensor = torch.tensor([torch.nan],device=min_edgelen.device)
+    nan_tensor = torch.full((1,),fill_value=torch.nan,device=min_edgelen.device)
     min_edgelen = torch.concat((nan_tensor,min_edgelen))
     max_edgelen = torch.concat((nan_tensor,max_edgelen))
 
     # collapse
-    edges,face_to_edge = calc_edges(faces) #E,2 F,3
     edge_length = calc_edge_length(vertices,edges) #E
-    face_normals = calc_face_normals(vertices,faces,normalize=False) #F,3
-    vertex_normals = calc_vertex_normals(vertices,faces,face_normals) #V,3
+    if face_normals is None:
+        face_normals = calc_face_normals(vertices,faces,normalize=False) #F,3
+        vertex_normals = calc_vertex_normals(vertices,faces,face_normals) #V,3
+    else:
+        nan_normal = torch.full((1,3),fill_value=torch.nan,device=face_normals.device) #normals of the dummies
+        face_normals = torch.concat((nan_normal,face_normals))
+        vertex_normals = torch.concat((nan_normal,vertex_normals))
     face_collapse = calc_face_collapses(vertices,faces,edges,face_to_edge,edge_length,face_normals,vertex_normals,min_edgelen,area_ratio=0.5)
     shortness = (1 - edge_length / min_edgelen[edges].mean(dim=-1)).clamp_min_(0) #e[0,1] 0...ok, 1...edgelen=0
     priority = face_collapse.float() + shortness
-    vertices_etc,faces = collapse_edges(vertices_etc,faces,edges,priority)
+
+    # split budget, vertices counted before collapsing and with a dummy per mesh, as if each mesh was remeshed on its own
+    budget = None #no limit
+    if max_vertices-vertices.shape[0] < edges.shape[0]:
+        if group_channel is None:
+            budget = torch.tensor([int(max_vertices)-vertices.shape[0]],device=vertices.device) #1
+        else:
+            group = vertices_etc[1:,group_channel].long() #V
+            group_counts = torch.ones(num_groups,dtype=torch.long,device=group.device).index_add_(0,group,torch.ones_like(group)) #G
+            budget = int(max_vertices)-group_counts #G
+
+    if sync_free:
+        result = _remesh_sync_free(vertices_etc,faces,edges,face_to_edge,priority,max_edgelen,flip,budget,group_channel)
+        return result if return_topology else result[:2]
+
+    vertices_etc,faces,edges,face_to_edge = collapse_edges(vertices_etc,faces,edges,priority,face_to_edge=face_to_edge)
 
     # split
-    if vertices.shape[0]<max_vertices:
-        edges,face_to_edge = calc_edges(faces) #E,2 F,3
-        vertices = vertices_etc[:,:3] #V,3
-        edge_length = calc_edge_length(vertices,edges) #E
-        splits = edge_length > max_edgelen[edges].mean(dim=-1)
-        vertices_etc,faces = split_edges(vertices_etc,faces,edges,face_to_edge,splits,pack_faces=False)
-
-    vertices_etc,faces = pack(vertices_etc,faces)
+    splits = _calc_splits(vertices_etc,edges,max_edgelen,budget,group_channel)
+    vertices_etc,faces,edges,face_to_edge = split_edges(vertices_etc,faces,edges,face_to_edge,splits,pack_faces=False,with_edges=True)
+
+    vertices_etc,faces,edges,face_to_edge = pack(vertices_etc,faces,edges,face_to_edge)
     vertices = vertices_etc[:,:3]
 
     if flip:
-        edges,_,edge_to_face = calc_edges(faces,with_edge_to_face=True) #E,2 F,3
-        flip_edges(vertices,faces,edges,edge_to_face,with_border=False)
+        edge_to_face = calc_edge_to_face(faces,edges,face_to_edge) #E,2,2
+        flip_edges(vertices,faces,edges,edge_to_face,with_border=False,face_to_edge=face_to_edge)
+
+    if not return_topology:
+        return remove_dummies(vertices_etc,faces)
+    return (*remove_dummies(vertices_etc,faces),*remove_edge_dummies(edges,face_to_edge))
+
+def _calc_splits(
+        vertices_etc:torch.Tensor, #V,D
+        edges:torch.Tensor, #E,2
+        max_edgelen:torch.Tensor, #V
+        budget:torch.Tensor, #G long, splits allowed per mesh, None for no limit
+        group_channel:int=None, #mesh index channel of vertices_etc, None for a single mesh
+        )->torch.Tensor: #E bool
+    """edges longer than max_edgelen, within budget per mesh the longest relative to max_edgelen, without host syncs"""
+    ratio = calc_edge_length(vertices_etc[:,:3],edges) / max_edgelen[edges].mean(dim=-1) #E, nan for the dummy
+    splits = ratio > 1 #E
+    if budget is None:
+        return splits
 
-    return remove_dummies(vertices_etc,faces)
+    # rank the candidates by ratio within their mesh, keep the first budget
+    if group_channel is None:
+        edge_group = torch.zeros_like(edges[:,0]) #E
+    else:
+        edge_group = vertices_etc[:,group_channel].nan_to_num(0).long()[edges[:,0]] #E, dummy in mesh 0, never split
+    order = torch.where(splits,ratio,-1).argsort(descending=True,stable=True) #E
+    sorted_group,group_order = edge_group[order].sort(stable=True) #E
+    order = order[group_order] #by mesh, then by descending ratio
+    sorted_splits = splits[order].long() #E
+    group_splits = torch.zeros_like(budget).index_add_(0,edge_group,splits.long()) #G
+    rank = sorted_splits.cumsum(dim=0) - sorted_splits - (group_splits.cumsum(dim=0)-group_splits)[sorted_group] #E
+    splits[order] = (sorted_splits>0) & (rank < budget[sorted_group])
+    return splits
+
+def _remesh_sync_free(vertices_etc,faces,edges,face_to_edge,priority,max_edgelen,flip,budget,group_channel=None):
+    """collapse, split, pack and flip without host syncs, see core.remesh_sync_free"""
+    vertices_etc,faces,edges,face_to_edge = remesh_sync_free.collapse_edges(vertices_etc,faces,edges,priority,face_to_edge)
+
+    # split, buffers are bounded by the edge count
+    splits = _calc_splits(vertices_etc,edges,max_edgelen,budget,group_channel)
+    vertices_etc,faces,edges,face_to_edge = remesh_sync_free.split_edges(vertices_etc,faces,edges,face_to_edge,splits)
+
+    vertices_etc,faces,edges,face_to_edge,counts = remesh_sync_free.pack(vertices_etc,faces,edges,face_to_edge)
+    vertices = vertices_etc[:,:3]
+
+    if flip:
+        edge_to_face = calc_edge_to_face(faces,edges,face_to_edge) #E,2,2
+        remesh_sync_free.flip_edges(vertices,faces,edges,edge_to_face,face_to_edge,with_border=False)
+
+    V,F,E = counts.tolist() #sync, the only one
+    return (*remove_dummies(vertices_etc[:V],faces[:F]),*remove_edge_dummies(edges[:E],face_to_edge[:F]))
     
-def lerp_unbiased(a:torch.Tensor,b:torch.Tensor,weight:float,step:int):
-    """lerp with adam's bias correction"""
+def unbiased_weights(weight:float,step:int)->"tuple[float,float]":
+    """weights of a and b in lerp_unbiased()"""
     c_prev = 1-weight**(step-1)
     c = 1-weight**step
-    a_weight = weight*c_prev/c
-    b_weight = (1-weight)/c
+    return weight*c_prev/c, (1-weight)/c
+
+def lerp_unbiased(a:torch.Tensor,b:torch.Tensor,weight:float,step:int):
+    """lerp with adam's bias correction"""
+    a_weight,b_weight = unbiased_weights(weight,step)
     a.mul_(a_weight).add_(b, alpha=b_weight)
 
+def _fused_update(
+        vertices_etc:torch.Tensor, #V,D with vertices,m2,nu,m1,ref_len in the first 9 channels, updated in place
+        grad:torch.Tensor, #V,3
+        neighbor_smooth:torch.Tensor, #V,S
+        coefs:torch.Tensor, #7, unbiased weights of m1,m2,nu and learning rate ramp, a tensor so that compiled code is not specialized on the step
+        lr, nu_ref, edge_len_lims, #floats or V tensors
+        betas, gammas, gain:float, laplacian_weight:float, grad_lim:float,
+        clip:bool, update_ref_len:bool,
+        ):
+    """MeshOptimizer.step() after the spatial smoothing, functional so that torch.compile fuses it into a single pass"""
+    eps = 1e-8
+    vertices = vertices_etc[:,:3]
+    m2 = vertices_etc[:,3]
+    nu = vertices_etc[:,4]
+    m1 = vertices_etc[:,5:8]
+    ref_len = vertices_etc[:,8]
+
+    if gammas[0]:
+        m1 = m1.lerp(neighbor_smooth[:,5:8],gammas[0])
+    if gammas[1]:
+        m2 = m2.lerp(neighbor_smooth[:,3],gammas[1])
+    if gammas[2]:
+        nu = nu.lerp(neighbor_smooth[:,4],gammas[2])
+
+    grad = grad + (vertices - neighbor_smooth[:,:3]) * nu[:,None] * laplacian_weight
+    if clip:
+        lim = m1.abs() * grad_lim
+        grad = torch.maximum(torch.minimum(grad,lim),-lim)
+
+    m1 = m1 * coefs[0] + grad * coefs[1]
+    m2 = m2 * coefs[2] + (grad**2).sum(dim=-1) * coefs[3]
+    velocity = m1 / (m2[:,None].sqrt() + eps)
+    speed = velocity.norm(dim=-1)
+    nu = nu * coefs[4] + speed * coefs[5] if betas[2] else speed
+
+    vertices = vertices - velocity * (ref_len * lr * coefs[6])[:,None]
+    if update_ref_len:
+        ref_len = (ref_len * (1 + (nu - nu_ref) * gain)).clamp(*edge_len_lims)
+
+    vertices_etc[:,:3] = vertices
+    vertices_etc[:,3] = m2
+    vertices_etc[:,4] = nu
+    vertices_etc[:,5:8] = m1
+    vertices_etc[:,8] = ref_len
+
+_compiled_fused_update = None
+
+def _get_fused_update():
+    """torch.compile'd _fused_update(), eager _fused_update() if compilation is not available"""
+    global _compiled_fused_update
+    if _compiled_fused_update is None:
+        try:
+            compiled = torch.compile(_fused_update)
+        except Exception as e: #e.g. unsupported python version
+            warnings.warn(f'torch.compile not available, fused step runs eagerly: {e}')
+            compiled = _fused_update
+        def fused_update(vertices_etc,grad,neighbor_smooth,*args,**kwargs):
+            global _compiled_fused_update
+            for x in vertices_etc,grad,neighbor_smooth: #vertex count changes with every remesh, avoid recompiles
+                torch._dynamo.maybe_mark_dynamic(x,0)
+            try:
+                return compiled(vertices_etc,grad,neighbor_smooth,*args,**kwargs)
+            except Exception as e: #e.g. no C++ compiler for the CPU backend
+                if compiled is _fused_update:
+                    raise
+                warnings.warn(f'torch.compile failed, fused step runs eagerly: {e}')
+                _compiled_fused_update = _fused_update
+                return _fused_update(vertices_etc,grad,neighbor_smooth,*args,**kwargs)
+        _compiled_fused_update = fused_update
+    return _compiled_fused_update
 
 class MeshOptimizer:
     """Use this like a pytorch Optimizer, but after calling opt.step(), do vertices,faces = opt.remesh()."""
 
+    _etc_channels = 9 #vertices,m2,nu,m1,ref_len
+
     def __init__(self, 
             vertices:torch.Tensor, #V,3
             faces:torch.Tensor, #F,3
@@ -74,8 +228,19 @@ class MeshOptimizer:
             ramp=1, #learning rate ramp, actual ramp width is ramp/(1-betas[0])
             grad_lim=10., #gradients are clipped to m1.abs()*grad_lim
             remesh_interval=1, #larger intervals are faster but with worse mesh quality
+            max_vertices=1e6, #splits stop at this many vertices, longest edges first, see remesh()
             local_edgelen=True, #set to False to use a global scalar reference edge length instead
+            sync_free=False, #remesh without intermediate host syncs, see core.remesh_sync_free
+            fused=False, #compile the per-vertex update into one kernel with torch.compile, see _fused_update()
+            layout='aos', #'aos' stores vertex data row by row (V,D), 'soa' channel by channel (D,V) with contiguous channels
+            state_dtype=None, #torch.float16 or torch.bfloat16 to store m2,nu,m1 in reduced precision, updates are computed in float32
+                #float16 underflows for gradients below ~1e-4, scale the loss (steps are invariant to it) or use bfloat16
+            index_dtype=None, #torch.int32 to store faces and edges as int32 throughout remeshing and rendering, None keeps the dtype of faces
             ):
+        if index_dtype is not None:
+            assert index_dtype in (torch.int32,torch.long)
+            assert index_dtype==torch.long or 8*faces.shape[0]<2**31, 'mesh too large for int32 indices' #split buffers hold up to 2E+3F=6F edges
+            faces = faces.type(index_dtype)
         self._vertices = vertices
         self._faces = faces
         self._lr = lr
@@ -89,17 +254,28 @@ class MeshOptimizer:
         self._ramp = ramp
         self._grad_lim = grad_lim
         self._remesh_interval = remesh_interval
+        self._max_vertices = max_vertices
         self._local_edgelen = local_edgelen
+        self._sync_free = sync_free
+        self._fused = fused
+        assert layout in ('aos','soa')
+        self._layout = layout
+        assert state_dtype in (None,torch.float16,torch.bfloat16)
+        assert not (fused and state_dtype), 'fused update requires float32 state'
+        self._state_dtype = state_dtype
         self._step = 0
         self._start = time.time()
 
         V = self._vertices.shape[0]
         # prepare continuous tensor for all vertex-based data 
-        self._vertices_etc = torch.zeros([V,9],device=vertices.device)
-        self._split_vertices_etc()
+        self._set_vertices_etc(torch.zeros([V,self._etc_channels],device=vertices.device))
         self.vertices.copy_(vertices) #initialize vertices
         self._vertices.requires_grad_()
-        self._ref_len.fill_(edge_len_lims[1])
+        self._ref_len[:] = edge_len_lims[1]
+
+        # edge topology, updated by remesh() instead of being rebuilt every step
+        self._edges,self._face_to_edge = calc_edges(self._faces,num_vertices=V) #E,2 F,3
+        self._neighbor_mean = None #NeighborMean of self._edges, reset when the edges change
 
     @property
     def vertices(self):
@@ -109,15 +285,49 @@ class MeshOptimizer:
     def faces(self):
         return self._faces
 
+    def mean_ref_len(self)->torch.Tensor: #scalar on the device of the vertices, no sync
+        """mean reference edge length the remeshing currently aims for"""
+        return self._ref_len.mean()
+
+    # with state_dtype, channels 3:8 (m2,nu,m1) are stored in self._state and removed from self._vertices_etc
+
+    def _full_vertices_etc(self)->torch.Tensor: #V,D float32 with all channels
+        if self._state_dtype is None:
+            return self._vertices_etc
+        return torch.cat((self._vertices_etc[:,:3],self._state.float(),self._vertices_etc[:,3:]),dim=-1)
+
+    def _set_vertices_etc(self,vertices_etc:torch.Tensor): #V,D float32 with all channels
+        if self._state_dtype is None:
+            self._vertices_etc = vertices_etc
+        else:
+            self._state = vertices_etc[:,3:8].to(self._state_dtype)
+            self._vertices_etc = torch.cat((vertices_etc[:,:3],vertices_etc[:,8:]),dim=-1)
+        self._split_vertices_etc()
+
+    def _etc_channel(self,channel:int)->torch.Tensor: #V
+        if self._state_dtype is None:
+            return self._vertices_etc[:,channel]
+        if 3<=channel<8:
+            return self._state[:,channel-3]
+        return self._vertices_etc[:,channel if channel<3 else channel-5]
+
     def _split_vertices_etc(self):
+        if self._layout=='soa' and not self._vertices_etc.T.is_contiguous():
+            #remesh() gathers and concatenates rows of the V,D view into a new row major tensor, transpose once afterwards
+            self._vertices_etc = self._vertices_etc.T.contiguous().T
         self._vertices = self._vertices_etc[:,:3]
-        self._m2 = self._vertices_etc[:,3]
-        self._nu = self._vertices_etc[:,4]
-        self._m1 = self._vertices_etc[:,5:8]
-        self._ref_len = self._vertices_etc[:,8]
+        self._m2 = self._etc_channel(3)
+        self._nu = self._etc_channel(4)
+        self._m1 = self._vertices_etc[:,5:8] if self._state_dtype is None else self._state[:,2:5]
+        self._ref_len = self._etc_channel(8)
         
         with_gammas = any(g!=0 for g in self._gammas)
-        self._smooth = self._vertices_etc[:,:8] if with_gammas else self._vertices_etc[:,:3]
+        if not with_gammas:
+            self._smooth = self._vertices_etc[:,:3]
+        elif self._state_dtype is None:
+            self._smooth = self._vertices_etc[:,:8]
+        else:
+            self._smooth = None #concatenated and upcast in step()
 
     def zero_grad(self):
         self._vertices.grad = None
@@ -130,61 +340,206 @@ class MeshOptimizer:
         self._step += 1
 
         # spatial smoothing
-        edges,_ = calc_edges(self._faces) #E,2
-        E = edges.shape[0]
-        edge_smooth = self._smooth[edges] #E,2,S
-        neighbor_smooth = torch.zeros_like(self._smooth) #V,S
-        torch_scatter.scatter_mean(src=edge_smooth.flip(dims=[1]).reshape(E*2,-1),index=edges.reshape(E*2,1),dim=0,out=neighbor_smooth)
+        if self._neighbor_mean is None:
+            self._neighbor_mean = NeighborMean(self._edges,self._vertices_etc.shape[0])
+        smooth = self._smooth if self._smooth is not None else self._full_vertices_etc()[:,:8]
+        neighbor_smooth = self._neighbor_mean(smooth) #V,S
         
-        #apply optional smoothing of m1,m2,nu
-        if self._gammas[0]:
-            self._m1.lerp_(neighbor_smooth[:,5:8],self._gammas[0])
-        if self._gammas[1]:
-            self._m2.lerp_(neighbor_smooth[:,3],self._gammas[1])
-        if self._gammas[2]:
-            self._nu.lerp_(neighbor_smooth[:,4],self._gammas[2])
-
-        #add laplace smoothing to gradients
-        laplace = self._vertices - neighbor_smooth[:,:3]
-        grad = torch.addcmul(self._vertices.grad, laplace, self._nu[:,None], value=self._laplacian_weight)
-
-        #gradient clipping
-        if self._step>1:
-            grad_lim = self._m1.abs().mul_(self._grad_lim)
-            grad.clamp_(min=-grad_lim,max=grad_lim)
-
-        # moment updates
-        lerp_unbiased(self._m1, grad, self._betas[0], self._step)
-        lerp_unbiased(self._m2, (grad**2).sum(dim=-1), self._betas[1], self._step)
-
-        velocity = self._m1 / self._m2[:,None].sqrt().add_(eps) #V,3
-        speed = velocity.norm(dim=-1) #V
-
-        if self._betas[2]:
-            lerp_unbiased(self._nu,speed,self._betas[2],self._step) #V
+        fused_ref_len = self._fused and self._local_edgelen
+        if self._fused:
+            coefs = [*unbiased_weights(self._betas[0],self._step),*unbiased_weights(self._betas[1],self._step),
+                *(unbiased_weights(self._betas[2],self._step) if self._betas[2] else (0,1)),
+                min(1,self._step * (1-self._betas[0]) / self._ramp)]
+            coefs = torch.tensor(coefs).to(self._vertices_etc.device,non_blocking=True)
+            _get_fused_update()(self._vertices_etc,self._vertices.grad,neighbor_smooth,coefs,
+                self._lr,self._nu_ref,self._edge_len_lims,self._betas,self._gammas,self._gain,self._laplacian_weight,self._grad_lim,
+                clip=self._step>1,update_ref_len=fused_ref_len and self._step % self._remesh_interval == 0)
         else:
-            self._nu.copy_(speed) #V
+            m1,m2,nu = self._m1,self._m2,self._nu
+            if self._state_dtype is not None: #compute in float32, stored below
+                m1,m2,nu = m1.float(),m2.float(),nu.float()
+
+            #apply optional smoothing of m1,m2,nu
+            if self._gammas[0]:
+                m1.lerp_(neighbor_smooth[:,5:8],self._gammas[0])
+            if self._gammas[1]:
+                m2.lerp_(neighbor_smooth[:,3],self._gammas[1])
+            if self._gammas[2]:
+                nu.lerp_(neighbor_smooth[:,4],self._gammas[2])
+
+            #add laplace smoothing to gradients
+            laplace = self._vertices - neighbor_smooth[:,:3]
+            grad = torch.addcmul(self._vertices.grad, laplace, nu[:,None], value=self._laplacian_weight)
 
-        # update vertices
-        ramped_lr = self._lr * min(1,self._step * (1-self._betas[0]) / self._ramp)
-        self._vertices.add_(velocity * self._ref_len[:,None], alpha=-ramped_lr)
+            #gradient clipping
+            if self._step>1:
+                grad_lim = m1.abs().mul_(self._grad_lim)
+                grad.clamp_(min=-grad_lim,max=grad_lim)
+
+            # moment updates
+            lerp_unbiased(m1, grad, self._betas[0], self._step)
+            lerp_unbiased(m2, (grad**2).sum(dim=-1), self._betas[1], self._step)
+
+            velocity = m1 / m2[:,None].sqrt().add_(eps) #V,3
+            speed = velocity.square().sum(dim=-1).sqrt_() #V, faster than norm() for both layouts
+
+            if self._betas[2]:
+                lerp_unbiased(nu,speed,self._betas[2],self._step) #V
+            else:
+                nu.copy_(speed) #V
+
+            # update vertices
+            ramped_lr = self._lr * min(1,self._step * (1-self._betas[0]) / self._ramp)
+            self._vertices.sub_(velocity * (self._ref_len * ramped_lr)[:,None])
+
+            if self._state_dtype is not None:
+                self._m1.copy_(m1)
+                self._m2.copy_(m2)
+                self._nu.copy_(nu)
 
         # update target edge length
-        if self._step % self._remesh_interval == 0:
+        if self._step % self._remesh_interval == 0 and not fused_ref_len:
             if self._local_edgelen:
                 len_change = (1 + (self._nu - self._nu_ref) * self._gain)
             else:
-                len_change = (1 + (self._nu.mean() - self._nu_ref) * self._gain)
+                len_change = (1 + (self._mean_nu() - self._nu_ref) * self._gain)
             self._ref_len *= len_change
             self._ref_len.clamp_(*self._edge_len_lims)
 
+    def _mean_nu(self):
+        return self._nu.mean()
+
+    def _remesh_groups(self)->dict: #group_channel and num_groups for remesh()
+        return {}
+
     def remesh(self, flip:bool=True)->"tuple[torch.Tensor,torch.Tensor]":
         min_edge_len = self._ref_len * (1 - self._edge_len_tol)
         max_edge_len = self._ref_len * (1 + self._edge_len_tol)
-            
-        self._vertices_etc,self._faces = remesh(self._vertices_etc,self._faces,min_edge_len,max_edge_len,flip)
 
-        self._split_vertices_etc()
+        vertices_etc,self._faces,self._edges,self._face_to_edge = remesh(self._full_vertices_etc(),self._faces,
+            min_edge_len,max_edge_len,flip,self._max_vertices,edges=self._edges,face_to_edge=self._face_to_edge,sync_free=self._sync_free,
+            **self._remesh_groups())
+        self._neighbor_mean = None
+
+        self._set_vertices_etc(vertices_etc)
         self._vertices.requires_grad_()
 
         return self._vertices, self._faces
+
+
+class BatchedMeshOptimizer(MeshOptimizer):
+    """
+    MeshOptimizer for N meshes packed into one vertex and face buffer, step() and remesh() process all meshes at once.
+    lr, nu_ref and edge_len_lims may be given per mesh, all other settings are shared.
+    Meshes never share edges, so remeshing the packed buffer is the same as remeshing each mesh, max_vertices applies
+    per mesh. Vertices and faces are regrouped by mesh after each remesh(), see vertex_offsets and face_offsets.
+    """
+
+    _etc_channels = 14 #vertices,m2,nu,m1,ref_len,mesh,lr,nu_ref,edge_len_lims
+
+    def __init__(self,
+            vertices:"list[torch.Tensor]", #N*(V_i,3)
+            faces:"list[torch.Tensor]", #N*(F_i,3) long, indices into vertices[i]
+            lr=0.3, #float or N floats
+            nu_ref=0.3, #float or N floats
+            edge_len_lims=(.01,.15), #tuple or N tuples
+            **kwargs, #shared settings, see MeshOptimizer
+            ):
+        N = len(vertices)
+        assert len(faces)==N
+        device = vertices[0].device
+        vertex_counts = torch.tensor([v.shape[0] for v in vertices],device=device) #N
+        vertex_offsets = vertex_counts.cumsum(dim=0) - vertex_counts #N
+        mesh = torch.arange(0,N,device=device).repeat_interleave(vertex_counts) #V
+
+        def per_vertex(value): #float or N floats -> V
+            value = torch.tensor(value,dtype=torch.float,device=device).expand(N)
+            return value[mesh]
+        lr = per_vertex(lr)
+        nu_ref = per_vertex(nu_ref)
+        edge_len_lims = torch.tensor(edge_len_lims,dtype=torch.float,device=device).expand(N,2)
+        edge_len_lims = (edge_len_lims[mesh,0],edge_len_lims[mesh,1])
+
+        self._num_meshes = N
+        packed_faces = torch.concat([f+o for f,o in zip(faces,vertex_offsets)],dim=0) #F,3
+        super().__init__(torch.concat(vertices,dim=0),packed_faces,lr=lr,nu_ref=nu_ref,edge_len_lims=edge_len_lims,**kwargs)
+        self._mesh.copy_(mesh)
+        self._lr.copy_(lr)
+        self._nu_ref.copy_(nu_ref)
+        self._edge_len_lims[0].copy_(edge_len_lims[0])
+        self._edge_len_lims[1].copy_(edge_len_lims[1])
+        face_counts = torch.tensor([f.shape[0] for f in faces],device=device) #N
+        zero = vertex_counts.new_zeros(1)
+        self._offsets = torch.cat((zero,vertex_counts.cumsum(dim=0),zero,face_counts.cumsum(dim=0))) #2N+2 vertex and face offsets
+        self._offsets_list = None
+
+    @property
+    def num_meshes(self)->int:
+        return self._num_meshes
+
+    def _read_offsets(self)->"tuple[list[int],list[int]]":
+        """offsets stay on device after remesh(), read back on first access"""
+        if self._offsets_list is None:
+            offsets = self._offsets.tolist() #sync
+            N = self._num_meshes
+            self._offsets_list = offsets[:N+1],offsets[N+1:]
+        return self._offsets_list
+
+    @property
+    def vertex_offsets(self)->"list[int]":
+        """N+1 offsets, vertices of mesh i are vertices[vertex_offsets[i]:vertex_offsets[i+1]]"""
+        return self._read_offsets()[0]
+
+    @property
+    def face_offsets(self)->"list[int]":
+        """N+1 offsets, faces of mesh i are faces[face_offsets[i]:face_offsets[i+1]]"""
+        return self._read_offsets()[1]
+
+    def meshes(self)->"list[tuple[torch.Tensor,torch.Tensor]]":
+        """(vertices,faces) per mesh, vertices are views into the packed vertices, faces use local indices"""
+        v,f = self._read_offsets()
+        return [(self._vertices[v[i]:v[i+1]],self._faces[f[i]:f[i+1]]-v[i]) for i in range(self._num_meshes)]
+
+    def _split_vertices_etc(self):
+        super()._split_vertices_etc()
+        self._mesh = self._etc_channel(9)
+        self._lr = self._etc_channel(10)
+        self._nu_ref = self._etc_channel(11)
+        self._edge_len_lims = (self._etc_channel(12),self._etc_channel(13))
+
+    def _mean_nu(self):
+        mesh = self._mesh.long() #V
+        nu_sum = torch.zeros(self._num_meshes,device=mesh.device).index_add_(0,mesh,self._nu.float()) #N
+        counts = torch.bincount(mesh,minlength=self._num_meshes) #N
+        return (nu_sum / counts)[mesh] #V
+
+    def _remesh_groups(self)->dict:
+        return dict(group_channel=9,num_groups=self._num_meshes)
+
+    def remesh(self, flip:bool=True)->"tuple[torch.Tensor,torch.Tensor]":
+        super().remesh(flip)
+        self._group_by_mesh()
+        return self._vertices, self._faces
+
+    @torch.no_grad()
+    def _group_by_mesh(self):
+        """stable sort vertices and faces by mesh, split vertices are appended at the end by remesh()"""
+        V = self._vertices.shape[0]
+        vertex_mesh = self._mesh.long() #V
+        vertex_mesh,order = vertex_mesh.sort(stable=True) #V
+        new_ind = torch.empty_like(order,dtype=self._faces.dtype)
+        new_ind[order] = torch.arange(0,V,dtype=new_ind.dtype,device=order.device)
+        self._set_vertices_etc(self._full_vertices_etc()[order])
+        self._edges = new_ind[self._edges] #order within a mesh is kept, so lower index stays first
+        self._neighbor_mean = None
+
+        faces = new_ind[self._faces] #F,3
+        face_mesh,face_order = vertex_mesh[faces[:,0]].sort(stable=True) #F
+        self._faces = faces[face_order]
+        self._face_to_edge = self._face_to_edge[face_order]
+
+        meshes = torch.arange(0,self._num_meshes+1,device=vertex_mesh.device) #N+1
+        self._offsets = torch.cat((torch.searchsorted(vertex_mesh,meshes),torch.searchsorted(face_mesh,meshes))) #2N+2, no sync
+        self._offsets_list = None
+
+        self._vertices.requires_grad_()
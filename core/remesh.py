@@ -1,6 +1,6 @@
 import torch
 import torch.nn.functional as tfunc
-import torch_scatter
+from core import kernels
 
 def prepend_dummies(
         vertices:torch.Tensor, #V,D
@@ -9,7 +9,7 @@ def prepend_dummies(
     """prepend dummy elements to vertices and faces to enable "masked" scatter operations"""
     V,D = vertices.shape
     vertices = torch.concat((torch.full((1,D),fill_value=torch.nan,device=vertices.device),vertices),dim=0)
-    faces = torch.concat((torch.zeros((1,3),dtype=torch.long,device=faces.device),faces+1),dim=0)
+    faces = torch.concat((torch.zeros((1,3),dtype=faces.dtype,device=faces.device),faces+1),dim=0)
     return vertices,faces
 
 def remove_dummies(
@@ -19,10 +19,31 @@ def remove_dummies(
     """remove dummy elements added with prepend_dummies()"""
     return vertices[1:],faces[1:]-1
 
+def prepend_edge_dummies(
+        edges:torch.Tensor, #E,2 long
+        face_to_edge:torch.Tensor, #F,3 long
+    )->"tuple[torch.Tensor,torch.Tensor]":
+    """prepend dummy elements to edges and face_to_edge, to match prepend_dummies()"""
+    edges = torch.concat((torch.zeros((1,2),dtype=edges.dtype,device=edges.device),edges+1),dim=0)
+    face_to_edge = torch.concat((torch.zeros((1,3),dtype=face_to_edge.dtype,device=face_to_edge.device),face_to_edge+1),dim=0)
+    return edges,face_to_edge
+
+def remove_edge_dummies(
+        edges:torch.Tensor, #E,2 long - first edge all zeros
+        face_to_edge:torch.Tensor, #F,3 long - first face all zeros
+    )->"tuple[torch.Tensor,torch.Tensor]":
+    """remove dummy elements added with prepend_edge_dummies()"""
+    return edges[1:]-1,face_to_edge[1:]-1
+
+
+KEY_ENGINE_MAX_VERTICES = 2**31 #v0*V+v1 must fit into int64
+KEY_INT32_MAX = 2**31-1
 
 def calc_edges(
         faces: torch.Tensor,  # F,3 long - first face may be dummy with all zeros
-        with_edge_to_face: bool = False
+        with_edge_to_face: bool = False,
+        engine: str = None, # 'key', 'rows' or None to select by mesh size
+        num_vertices: int = None, # vertex count, e.g. vertices.shape[0], None for faces.max()+1 which syncs with the host
     ) -> "tuple[torch.Tensor, ...]":
     """
     returns tuple of
@@ -30,6 +51,12 @@ def calc_edges(
     - face_to_edge F,3 long
     - (optional) edge_to_face shape=E,[left,right],[face,side]
 
+    engine 'key' packs each edge into a single int64 v0*V+v1 and uses a 1-D unique,
+    engine 'rows' uses the (much slower) lexicographic torch.unique(dim=0), results are identical,
+    it is selected above KEY_ENGINE_MAX_VERTICES and serves as reference in the tests and paper/benchmark_edges.py
+
+    all results have the dtype of faces, int32 faces give int32 edges and face_to_edge
+
     o-<-----e1     e0,e1...edge, e0<e1
     |      /A      L,R....left and right face
     |  L /  |      both triangles ordered counter clockwise
@@ -40,32 +67,58 @@ def calc_edges(
 
     F = faces.shape[0]
     
-    # make full edges, lower vertex index first
-    face_edges = torch.stack((faces,faces.roll(-1,1)),dim=-1) #F*3,3,2
-    full_edges = face_edges.reshape(F*3,2)
-    sorted_edges,_ = full_edges.sort(dim=-1) #F*3,2 TODO min/max faster?
+    # full edges as lower and higher vertex index, elementwise min/max avoids stack+sort
+    next_faces = faces.roll(-1,1) #F,3
+    lower = torch.minimum(faces,next_faces).reshape(F*3) #F*3
+    higher = torch.maximum(faces,next_faces).reshape(F*3) #F*3
 
     # make unique edges
-    edges,full_to_unique = torch.unique(input=sorted_edges,sorted=True,return_inverse=True,dim=0) #(E,2),(F*3)
-    E = edges.shape[0]
-    face_to_edge = full_to_unique.reshape(F,3) #F,3
+    V = num_vertices
+    if V is None and engine!='rows':
+        V = faces.max().item()+1 if F>0 else 1 #sync
+    if engine is None:
+        engine = 'key' if V<=KEY_ENGINE_MAX_VERTICES else 'rows'
+    if engine=='key':
+        if V*V>KEY_INT32_MAX: #int32 keys only if they can't overflow, sorting them is faster
+            lower = lower.type(torch.long)
+        keys = lower*V + higher #F*3
+        unique_keys,full_to_unique = torch.unique(input=keys,sorted=True,return_inverse=True) #(E),(F*3)
+        edges = torch.stack((unique_keys.div(V,rounding_mode='floor'),unique_keys.remainder(V)),dim=-1).type(faces.dtype) #E,2
+    elif engine=='rows':
+        sorted_edges = torch.stack((lower,higher),dim=-1) #F*3,2
+        edges,full_to_unique = torch.unique(input=sorted_edges,sorted=True,return_inverse=True,dim=0) #(E,2),(F*3)
+    else:
+        raise ValueError(f'unknown calc_edges engine: {engine}')
+    face_to_edge = full_to_unique.reshape(F,3).type(faces.dtype) #F,3
 
     if not with_edge_to_face:
         return edges, face_to_edge
 
-    is_right = full_edges[:,0]!=sorted_edges[:,0] #F*3
-    edge_to_face = torch.zeros((E,2,2),dtype=torch.long,device=faces.device) #E,LR=2,S=2
-    scatter_src = torch.cartesian_prod(torch.arange(0,F,device=faces.device),torch.arange(0,3,device=faces.device)) #F*3,2
-    edge_to_face.reshape(2*E,2).scatter_(dim=0,index=(2*full_to_unique+is_right)[:,None].expand(F*3,2),src=scatter_src) #E,LR=2,S=2
-    edge_to_face[0] = 0
+    edge_to_face = calc_edge_to_face(faces,edges,face_to_edge) #E,LR=2,S=2
     return edges, face_to_edge, edge_to_face
 
+def calc_edge_to_face(
+        faces: torch.Tensor, #F,3 long - first face may be dummy with all zeros
+        edges: torch.Tensor, #E,2 long, 0 for unused, lower vertex index first
+        face_to_edge: torch.Tensor, #F,3 long
+        ) -> torch.Tensor: #E,[left,right],[face,side]
+    """edge_to_face as returned by calc_edges(), but from existing edges without sorting"""
+    F = faces.shape[0]
+    E = edges.shape[0]
+    is_right = (faces>faces.roll(-1,1)).reshape(F*3) #F*3
+    edge_to_face = torch.zeros((E,2,2),dtype=faces.dtype,device=faces.device) #E,LR=2,S=2
+    scatter_src = torch.cartesian_prod(torch.arange(0,F,dtype=faces.dtype,device=faces.device),torch.arange(0,3,dtype=faces.dtype,device=faces.device)) #F*3,2
+    edge_to_face.reshape(2*E,2).scatter_(dim=0,index=(2*face_to_edge.reshape(F*3)+is_right)[:,None].expand(F*3,2),src=scatter_src) #E,LR=2,S=2
+    edge_to_face[0] = 0
+    return edge_to_face
+
 def calc_edge_length(
         vertices:torch.Tensor, #V,3 first may be dummy
         edges:torch.Tensor, #E,2 long, lower vertex index first, (0,0) for unused
         )->torch.Tensor: #E
 
-    full_vertices = vertices[edges] #E,2,3
+    E = edges.shape[0]
+    full_vertices = vertices.index_select(0,edges.reshape(E*2)).reshape(E,2,vertices.shape[1]) #E,2,3 index_select is much faster than vertices[edges] on CPU
     a,b = full_vertices.unbind(dim=1) #E,3
     return torch.norm(a-b,p=2,dim=-1)
 
@@ -81,27 +134,39 @@ def calc_face_normals(
         / \     looking onto surface (in neg normal direction)
       c1---c2
     """
-    full_vertices = vertices[faces] #F,C=3,3
+    F = faces.shape[0]
+    full_vertices = vertices.index_select(0,faces.reshape(F*3)).reshape(F,3,vertices.shape[1]) #F,C=3,3
     v0,v1,v2 = full_vertices.unbind(dim=1) #F,3
     face_normals = torch.cross(v1-v0,v2-v0, dim=1) #F,3
     if normalize:
         face_normals = tfunc.normalize(face_normals, eps=1e-6, dim=1) #TODO inplace?
     return face_normals #F,3
 
+def add_face_normals_(
+        vertex_normals:torch.Tensor, #V,3
+        faces:torch.Tensor, #F,3
+        face_normals:torch.Tensor, #F,3
+        )->torch.Tensor: #V,3
+    """vertex_normals[faces[f,c]] += face_normals[f] in place, one corner at a time without an F*3,3 copy of the face normals"""
+    if torch.is_grad_enabled() and (vertex_normals.requires_grad or face_normals.requires_grad):
+        for c in range(3): #index_add_ saves nothing for backward, so the corners can accumulate in place
+            vertex_normals.index_add_(0,faces[:,c],face_normals)
+    else:
+        for c in range(3):
+            kernels.scatter_add_(vertex_normals,faces[:,c],face_normals)
+    return vertex_normals
+
 def calc_vertex_normals(
         vertices:torch.Tensor, #V,3 first vertex may be unreferenced
         faces:torch.Tensor, #F,3 long, first face may be all zero
         face_normals:torch.Tensor=None, #F,3, not normalized
         )->torch.Tensor: #F,3
 
-    F = faces.shape[0]
-
     if face_normals is None:
         face_normals = calc_face_normals(vertices,faces)
     
-    vertex_normals = torch.zeros((vertices.shape[0],3,3),dtype=vertices.dtype,device=vertices.device) #V,C=3,3
-    vertex_normals.scatter_add_(dim=0,index=faces[:,:,None].expand(F,3,3),src=face_normals[:,None,:].expand(F,3,3))
-    vertex_normals = vertex_normals.sum(dim=1) #V,3
+    vertex_normals = torch.zeros((vertices.shape[0],3),dtype=vertices.dtype,device=vertices.device) #V,3
+    add_face_normals_(vertex_normals,faces,face_normals)
     return tfunc.normalize(vertex_normals, eps=1e-6, dim=1)
 
 def calc_face_ref_normals(
@@ -110,7 +175,8 @@ def calc_face_ref_normals(
         normalize:bool=False,
         )->torch.Tensor: #F,3
     """calculate reference normals for face flip detection"""
-    full_normals = vertex_normals[faces] #F,C=3,3
+    F = faces.shape[0]
+    full_normals = vertex_normals.index_select(0,faces.reshape(F*3)).reshape(F,3,vertex_normals.shape[1]) #F,C=3,3
     ref_normals = full_normals.sum(dim=1) #F,3
     if normalize:
         ref_normals = tfunc.normalize(ref_normals, eps=1e-6, dim=1)
@@ -119,8 +185,10 @@ def calc_face_ref_normals(
 def pack(
         vertices:torch.Tensor, #V,3 first unused and nan
         faces:torch.Tensor, #F,3 long, 0 for unused
-        )->"tuple[torch.Tensor,torch.Tensor]": #(vertices,faces), keeps first vertex unused
-    """removes unused elements in vertices and faces"""
+        edges:torch.Tensor=None, #E,2 long, 0 for unused, lower vertex index first
+        face_to_edge:torch.Tensor=None, #F,3 long, 0 for unused
+        )->"tuple[torch.Tensor,...]": #(vertices,faces[,edges,face_to_edge]), keeps first vertex unused
+    """removes unused elements in vertices and faces, and in edges and face_to_edge if given"""
     V = vertices.shape[0]
     
     # remove unused faces
@@ -136,12 +204,26 @@ def pack(
     vertices = vertices[used_vertices] #sync
 
     # update used faces
-    ind = torch.zeros(V,dtype=torch.long,device=vertices.device)
+    ind = torch.zeros(V,dtype=faces.dtype,device=vertices.device)
     V1 = used_vertices.sum()
-    ind[used_vertices] =  torch.arange(0,V1,device=vertices.device) #sync
+    ind[used_vertices] =  torch.arange(0,V1,dtype=faces.dtype,device=vertices.device) #sync
     faces = ind[faces]
 
-    return vertices,faces
+    if edges is None:
+        return vertices,faces
+
+    # remove edges not referenced by any used face
+    E = edges.shape[0]
+    face_to_edge = face_to_edge[used_faces] #sync
+    used_edges = torch.zeros(E,dtype=torch.bool,device=edges.device)
+    used_edges[face_to_edge] = True
+    used_edges[0] = True
+    edges = ind[edges[used_edges]] #sync
+    edge_ind = torch.zeros(E,dtype=face_to_edge.dtype,device=edges.device)
+    edge_ind[used_edges] = torch.arange(0,edges.shape[0],dtype=face_to_edge.dtype,device=edges.device)
+    face_to_edge = edge_ind[face_to_edge]
+
+    return vertices,faces,edges,face_to_edge
 
 def split_edges(
         vertices:torch.Tensor, #V,3 first unused
@@ -150,7 +232,8 @@ def split_edges(
         face_to_edge:torch.Tensor, #F,3 long 0 for unused
         splits, #E bool
         pack_faces:bool=True,
-        )->"tuple[torch.Tensor,torch.Tensor]": #(vertices,faces)
+        with_edges:bool=False, #also return updated edges and face_to_edge
+        )->"tuple[torch.Tensor,...]": #(vertices,faces[,edges,face_to_edge])
 
     #   c2                    c2               c...corners = faces
     #    . .                   . .             s...side_vert, 0 means no split
@@ -174,10 +257,10 @@ def split_edges(
     S = splits.sum().item() #sync
 
     if S==0:
-        return vertices,faces
+        return (vertices,faces,edges,face_to_edge) if with_edges else (vertices,faces)
     
-    edge_vert = torch.zeros_like(splits, dtype=torch.long) #E
-    edge_vert[splits] = torch.arange(V,V+S,dtype=torch.long,device=vertices.device) #E 0 for no split, sync
+    edge_vert = torch.zeros_like(splits, dtype=faces.dtype) #E
+    edge_vert[splits] = torch.arange(V,V+S,dtype=faces.dtype,device=vertices.device) #E 0 for no split, sync
     side_vert = edge_vert[face_to_edge] #F,3 long, 0 for no split
     split_edges = edges[splits] #S sync
 
@@ -188,13 +271,41 @@ def split_edges(
     #faces
     side_split = side_vert!=0 #F,3
     shrunk_faces = torch.where(side_split,side_vert,faces) #F,3 long, 0 for no split
-    new_faces = side_split[:,:,None] * torch.stack((faces,side_vert,shrunk_faces.roll(1,dims=-1)),dim=-1) #F,N=3,C=3
+    prev_shrunk = shrunk_faces.roll(1,dims=-1) #F,3
+    new_faces = side_split[:,:,None] * torch.stack((faces,side_vert,prev_shrunk),dim=-1) #F,N=3,C=3
+
+    if with_edges:
+        # split edge (a,b) keeps (a,s) and appends (b,s), each split side appends an inner edge (s_i,S_i-1)
+        E = edges.shape[0]
+        I = side_split.sum().item() #sync
+        upper_half = torch.zeros_like(splits, dtype=face_to_edge.dtype) #E
+        upper_half[splits] = torch.arange(E,E+S,dtype=face_to_edge.dtype,device=vertices.device) #sync
+        inner = torch.zeros_like(face_to_edge) #F,3
+        inner[side_split] = torch.arange(E+S,E+S+I,dtype=face_to_edge.dtype,device=vertices.device) #sync
+        lower = edges[face_to_edge,0] #F,3
+        half_at_start = torch.where(faces==lower,face_to_edge,upper_half[face_to_edge]) #F,3 half of side i at c_i
+        half_at_end = torch.where(faces.roll(-1,dims=-1)==lower,face_to_edge,upper_half[face_to_edge]) #F,3 half of side i at c_i+1
+        prev_side = torch.where(side_split.roll(1,dims=-1),half_at_end.roll(1,dims=-1),face_to_edge.roll(1,dims=-1)) #F,3
+        shrunk_face_to_edge = torch.where(side_split.roll(-1,dims=-1),inner.roll(-1,dims=-1),
+            torch.where(side_split,half_at_end,face_to_edge)) #F,3
+        new_face_to_edge = side_split[:,:,None] * torch.stack((half_at_start,inner,prev_side),dim=-1) #F,N=3,S=3
+        face_to_edge = torch.concat((shrunk_face_to_edge,new_face_to_edge.reshape(F*3,3))) #4F,3
+
+        upper_edges = torch.stack((split_edges[:,1],edge_vert[splits]),dim=-1) #S,2
+        inner_edges,_ = torch.stack((side_vert[side_split],prev_shrunk[side_split]),dim=-1).sort(dim=-1) #I,2
+        edges = torch.concat((edges,upper_edges,inner_edges)) #E+S+I,2
+        edges[:E,1] = torch.where(splits,edge_vert,edges[:E,1])
+
     faces = torch.concat((shrunk_faces,new_faces.reshape(F*3,3))) #4F,3
     if pack_faces:
         mask = faces[:,0]!=0
         mask[0] = True
         faces = faces[mask] #F',3 sync
+        if with_edges:
+            face_to_edge = face_to_edge[mask] #F',3
 
+    if with_edges:
+        return vertices,faces,edges,face_to_edge
     return vertices,faces
 
 def collapse_edges(
@@ -203,43 +314,66 @@ def collapse_edges(
         edges:torch.Tensor, #E,2 long 0 for unused, lower vertex index first
         priorities:torch.Tensor, #E float
         stable:bool=False, #only for unit testing
-        )->"tuple[torch.Tensor,torch.Tensor]": #(vertices,faces)
+        face_to_edge:torch.Tensor=None, #F,3 long, if given, edges are updated in place and (vertices,faces,edges,face_to_edge) is returned
+        )->"tuple[torch.Tensor,...]": #(vertices,faces[,edges,face_to_edge])
         
     V = vertices.shape[0]
     
     # check spacing
     _,order = priorities.sort(stable=stable) #E
-    rank = torch.zeros_like(order)
-    rank[order] = torch.arange(0,len(rank),device=rank.device)
-    vert_rank = torch.zeros(V,dtype=torch.long,device=vertices.device) #V
+    rank = torch.zeros_like(order,dtype=edges.dtype)
+    rank[order] = torch.arange(0,len(rank),dtype=edges.dtype,device=rank.device)
+    vert_rank = torch.zeros(V,dtype=edges.dtype,device=vertices.device) #V
     edge_rank = rank #E
     for i in range(3):
-        torch_scatter.scatter_max(src=edge_rank[:,None].expand(-1,2).reshape(-1),index=edges.reshape(-1),dim=0,out=vert_rank)
+        kernels.scatter_max_(vert_rank,edges.reshape(-1),edge_rank[:,None].expand(-1,2).reshape(-1))
         edge_rank,_ = vert_rank[edges].max(dim=-1) #E
     candidates = edges[(edge_rank==rank).logical_and_(priorities>0)] #E',2
 
     # check connectivity
-    vert_connections = torch.zeros(V,dtype=torch.long,device=vertices.device) #V
+    vert_connections = torch.zeros(V,dtype=edges.dtype,device=vertices.device) #V
     vert_connections[candidates[:,0]] = 1 #start
-    edge_connections = vert_connections[edges].sum(dim=-1) #E, edge connected to start
-    vert_connections.scatter_add_(dim=0,index=edges.reshape(-1),src=edge_connections[:,None].expand(-1,2).reshape(-1))# one edge from start
+    edge_connections = vert_connections[edges].sum(dim=-1,dtype=vert_connections.dtype) #E, edge connected to start
+    kernels.scatter_add_(vert_connections,edges.reshape(-1),edge_connections[:,None].expand(-1,2).reshape(-1))# one edge from start
     vert_connections[candidates] = 0 #clear start and end
-    edge_connections = vert_connections[edges].sum(dim=-1) #E, one or two edges from start
-    vert_connections.scatter_add_(dim=0,index=edges.reshape(-1),src=edge_connections[:,None].expand(-1,2).reshape(-1)) #one or two edges from start
+    edge_connections = vert_connections[edges].sum(dim=-1,dtype=vert_connections.dtype) #E, one or two edges from start
+    kernels.scatter_add_(vert_connections,edges.reshape(-1),edge_connections[:,None].expand(-1,2).reshape(-1)) #one or two edges from start
     collapses = candidates[vert_connections[candidates[:,1]] <= 2] # E" not more than two connections between start and end
 
     # mean vertices
     vertices[collapses[:,0]] = vertices[collapses].mean(dim=1) #TODO dim?
 
     # update faces
-    dest = torch.arange(0,V,dtype=torch.long,device=vertices.device) #V
+    dest = torch.arange(0,V,dtype=faces.dtype,device=vertices.device) #V
     dest[collapses[:,1]] = dest[collapses[:,0]]
     faces = dest[faces] #F,3 TODO optimize?
     c0,c1,c2 = faces.unbind(dim=-1)
     collapsed = (c0==c1).logical_or_(c1==c2).logical_or_(c0==c2)
     faces[collapsed] = 0
 
-    return vertices,faces
+    if face_to_edge is None:
+        return vertices,faces
+
+    # update edges, only edges touching a collapse can degenerate or merge into duplicates
+    E = edges.shape[0]
+    touched = torch.zeros(V,dtype=torch.bool,device=vertices.device) #V
+    touched[collapses] = True
+    touched[0] = False
+    touched_ind = touched[edges].any(dim=-1).nonzero()[:,0] #K sync
+    touched_edges,_ = dest[edges[touched_ind]].sort(dim=-1) #K,2
+    edges[touched_ind] = touched_edges
+    if touched_ind.shape[0]>0:
+        unique_edges,inverse = torch.unique(touched_edges,return_inverse=True,dim=0) #K',2 K, small sort
+        first = torch.full((unique_edges.shape[0],),E,dtype=face_to_edge.dtype,device=edges.device) #K'
+        first.scatter_reduce_(dim=0,index=inverse,src=touched_ind.type(first.dtype),reduce='amin')
+        edge_dest = torch.arange(0,E,dtype=face_to_edge.dtype,device=edges.device) #E
+        edge_dest[touched_ind] = first[inverse]
+        edge_dest[touched_ind[touched_edges[:,0]==touched_edges[:,1]]] = 0
+        edges[edge_dest!=torch.arange(0,E,device=edges.device)] = 0 #merged and degenerated edges become unused, removed by pack()
+        face_to_edge = edge_dest[face_to_edge]
+    face_to_edge[collapsed] = 0
+
+    return vertices,faces,edges,face_to_edge
 
 def calc_face_collapses(
         vertices:torch.Tensor, #V,3 first unused
@@ -294,6 +428,7 @@ def flip_edges(
         with_border:bool=True, #handle border edges (D=4 instead of D=6)
         with_normal_check:bool=True, #check face normal flips
         stable:bool=False, #only for unit testing
+        face_to_edge:torch.Tensor=None, #F,3 long, if given, edges, face_to_edge and edge_to_face are updated in place
         ):
     V = vertices.shape[0]
     E = edges.shape[0]
@@ -329,11 +464,10 @@ def flip_edges(
 
     edges_neighbors = torch.concat((edges[candidates],neighbors[candidates]),dim=-1) #E',4
     _,order = loss_change.sort(descending=True, stable=stable) #E'
-    rank = torch.zeros_like(order)
-    rank[order] = torch.arange(0,len(rank),device=rank.device)
-    vertex_rank = torch.zeros((V,4),dtype=torch.long,device=device) #V,4
-    torch_scatter.scatter_max(src=rank[:,None].expand(-1,4),index=edges_neighbors,dim=0,out=vertex_rank)
-    vertex_rank,_ = vertex_rank.max(dim=-1) #V
+    rank = torch.zeros_like(order,dtype=edges.dtype)
+    rank[order] = torch.arange(0,len(rank),dtype=edges.dtype,device=rank.device)
+    vertex_rank = torch.zeros(V,dtype=edges.dtype,device=device) #V
+    kernels.scatter_max_(vertex_rank,edges_neighbors.reshape(-1),rank[:,None].expand(-1,4).reshape(-1))
     neighborhood_rank,_ = vertex_rank[edges_neighbors].max(dim=-1) #E'
     flip = rank==neighborhood_rank #E'
 
@@ -349,11 +483,25 @@ def flip_edges(
         e1 = v[:,1]
         cl = v[:,2]
         cr = v[:,3]
-        n = torch.cross(e1,cl) + torch.cross(cr,e1) #sum of old normal vectors 
-        flip.logical_and_(torch.sum(n*torch.cross(cr,cl),dim=-1)>0) #first new face
-        flip.logical_and_(torch.sum(n*torch.cross(cl-e1,cr-e1),dim=-1)>0) #second new face
+        n = torch.cross(e1,cl,dim=-1) + torch.cross(cr,e1,dim=-1) #sum of old normal vectors 
+        flip.logical_and_(torch.sum(n*torch.cross(cr,cl,dim=-1),dim=-1)>0) #first new face
+        flip.logical_and_(torch.sum(n*torch.cross(cl-e1,cr-e1,dim=-1),dim=-1)>0) #second new face
 
     flip_edges_neighbors = edges_neighbors[flip] #E",4
     flip_edge_to_face = edge_to_face[candidates,:,0][flip] #E",2
     flip_faces = flip_edges_neighbors[:,[[0,3,2],[1,2,3]]] #E",2,3
+
+    if face_to_edge is not None:
+        #  left face [e0,e1,cl] -> [e0,cr,cl], right face [e1,e0,cr] -> [e1,cl,cr]
+        flip_ind = candidates.nonzero()[:,0][flip].type(face_to_edge.dtype) #E"
+        flip_sides = edge_to_face[flip_ind,:,1] #E",2
+        outer = face_to_edge[flip_edge_to_face[:,:,None],(flip_sides[:,:,None]+torch.arange(1,3,device=device))%3] #E",LR=2,2
+        flip_face_to_edge = torch.stack((
+            torch.stack((outer[:,1,0],flip_ind,outer[:,0,1]),dim=-1),
+            torch.stack((outer[:,0,0],flip_ind,outer[:,1,1]),dim=-1)),dim=1) #E",2,3
+        face_to_edge[flip_edge_to_face] = flip_face_to_edge
+        edges[flip_ind] = flip_edges_neighbors[:,2:].sort(dim=-1)[0]
+        is_right = flip_faces>flip_faces.roll(-1,dims=-1) #E",2,3
+        edge_to_face[flip_face_to_edge,is_right.long()] = torch.stack((flip_edge_to_face[:,:,None].expand(-1,2,3),torch.arange(0,3,dtype=edge_to_face.dtype,device=device).expand_as(is_right)),dim=-1)
+
     faces.scatter_(dim=0,index=flip_edge_to_face.reshape(-1,1).expand(-1,3),src=flip_faces.reshape(-1,3))
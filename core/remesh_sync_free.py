@@ -0,0 +1,248 @@
+import torch
+from core import kernels
+
+# Sync-free variants of collapse_edges(), split_edges(), pack() and flip_edges() from core.remesh.
+# All buffers keep their upper-bound size, unused vertices are nan, unused faces and edges are all zero.
+# Masked writes are redirected to the dummy element 0, which is reset afterwards.
+# pack() returns the used element counts as a tensor, so the caller can read back all sizes at once.
+# Index tensors keep the dtype of faces, see core.remesh.calc_edges().
+
+def collapse_edges(
+        vertices:torch.Tensor, #V,D first unused
+        faces:torch.Tensor, #F,3 long 0 for unused
+        edges:torch.Tensor, #E,2 long 0 for unused, lower vertex index first, updated in place
+        priorities:torch.Tensor, #E float
+        face_to_edge:torch.Tensor, #F,3 long 0 for unused
+        stable:bool=False, #only for unit testing
+        )->"tuple[torch.Tensor,torch.Tensor,torch.Tensor,torch.Tensor]": #(vertices,faces,edges,face_to_edge)
+
+    V = vertices.shape[0]
+    E = edges.shape[0]
+    device = vertices.device
+    edge_ind = torch.arange(0,E,dtype=edges.dtype,device=device) #E
+
+    # check spacing
+    _,order = priorities.sort(stable=stable) #E
+    rank = torch.zeros_like(edge_ind)
+    rank[order] = edge_ind
+    vert_rank = torch.zeros(V,dtype=edges.dtype,device=device) #V
+    edge_rank = rank #E
+    for i in range(3):
+        kernels.scatter_max_(vert_rank,edges.reshape(-1),edge_rank[:,None].expand(-1,2).reshape(-1))
+        edge_rank,_ = vert_rank[edges].max(dim=-1) #E
+    candidates = (edge_rank==rank).logical_and_(priorities>0) #E
+
+    # check connectivity
+    vert_connections = torch.zeros(V,dtype=edges.dtype,device=device) #V
+    vert_connections[torch.where(candidates,edges[:,0],0)] = 1 #start
+    vert_connections[0] = 0
+    edge_connections = vert_connections[edges].sum(dim=-1,dtype=vert_connections.dtype) #E, edge connected to start
+    kernels.scatter_add_(vert_connections,edges.reshape(-1),edge_connections[:,None].expand(-1,2).reshape(-1))# one edge from start
+    vert_connections[torch.where(candidates[:,None],edges,0)] = 0 #clear start and end
+    edge_connections = vert_connections[edges].sum(dim=-1,dtype=vert_connections.dtype) #E, one or two edges from start
+    kernels.scatter_add_(vert_connections,edges.reshape(-1),edge_connections[:,None].expand(-1,2).reshape(-1)) #one or two edges from start
+    collapses = candidates.logical_and_(vert_connections[edges[:,1]] <= 2) #E not more than two connections between start and end
+
+    # mean vertices
+    vertices[torch.where(collapses,edges[:,0],0)] = vertices[edges].mean(dim=1)
+    vertices[0] = torch.nan
+
+    # update faces
+    dest = torch.arange(0,V,dtype=faces.dtype,device=device) #V
+    dest[torch.where(collapses,edges[:,1],0)] = torch.where(collapses,edges[:,0],0)
+    faces = dest[faces] #F,3
+    c0,c1,c2 = faces.unbind(dim=-1)
+    collapsed = (c0==c1).logical_or_(c1==c2).logical_or_(c0==c2)
+    faces.masked_fill_(collapsed[:,None],0)
+
+    # update edges, merge duplicates with a 1-D sort, untouched edges get unique negative keys
+    touched = torch.zeros(V,dtype=torch.bool,device=device) #V
+    touched[torch.where(collapses[:,None],edges,0)] = True
+    touched[0] = False
+    is_touched = touched[edges].any(dim=-1) #E
+    touched_edges,_ = dest[edges].sort(dim=-1) #E,2
+    edges.copy_(torch.where(is_touched[:,None],touched_edges,edges))
+    keys = torch.where(is_touched,edges[:,0].type(torch.long)*V+edges[:,1],-1-edge_ind) #E int64
+    sorted_keys,order = keys.sort(stable=True) #E
+    is_first = torch.ones(E,dtype=torch.bool,device=device) #E
+    is_first[1:] = sorted_keys[1:]!=sorted_keys[:-1]
+    first,_ = torch.where(is_first,edge_ind,0).cummax(dim=0) #E
+    edge_dest = torch.empty_like(edge_ind) #E
+    edge_dest[order] = order[first].type(edge_dest.dtype)
+    edge_dest.masked_fill_(edges[:,0]==edges[:,1],0)
+    edges.masked_fill_((edge_dest!=edge_ind)[:,None],0) #merged and degenerated edges become unused
+    face_to_edge = edge_dest[face_to_edge].masked_fill_(collapsed[:,None],0)
+
+    return vertices,faces,edges,face_to_edge
+
+def split_edges(
+        vertices:torch.Tensor, #V,D first unused
+        faces:torch.Tensor, #F,3 long, 0 for unused
+        edges:torch.Tensor, #E,2 long 0 for unused, lower vertex index first
+        face_to_edge:torch.Tensor, #F,3 long 0 for unused
+        splits:torch.Tensor, #E bool
+        max_vertices:int=None, #splits exceeding this vertex count are dropped
+        )->"tuple[torch.Tensor,torch.Tensor,torch.Tensor,torch.Tensor]": #(vertices,faces,edges,face_to_edge) V+S,4F,2E+3F
+
+    # upper bound allocation:
+    #   vertices: V+S with S=min(E,max_vertices-V), new vertices numbered by cumsum
+    #   faces: 4F, same layout as core.remesh.split_edges(pack_faces=False)
+    #   edges: 2E+3F, upper half of split edge e at E+e, inner edge of face f side i at 2E+3f+i
+
+    V,D = vertices.shape
+    F = faces.shape[0]
+    E = edges.shape[0]
+    device = vertices.device
+
+    S = E if max_vertices is None else int(min(E,max(0,max_vertices-V)))
+    split_ind = splits.cumsum(dim=0,dtype=faces.dtype) #E
+    splits = splits.logical_and(split_ind<=S) #E
+    edge_vert = torch.where(splits,split_ind+(V-1),0) #E 0 for no split
+    side_vert = edge_vert[face_to_edge] #F,3 long, 0 for no split
+
+    #vertices
+    vertices = torch.concat((vertices,torch.full((S,D),fill_value=torch.nan,device=device)),dim=0) #V+S,D
+    vertices[edge_vert] = vertices[edges].mean(dim=1)
+    vertices[0] = torch.nan
+
+    #faces
+    side_split = side_vert!=0 #F,3
+    shrunk_faces = torch.where(side_split,side_vert,faces) #F,3 long, 0 for no split
+    prev_shrunk = shrunk_faces.roll(1,dims=-1) #F,3
+    new_faces = side_split[:,:,None] * torch.stack((faces,side_vert,prev_shrunk),dim=-1) #F,N=3,C=3
+
+    #edges, see core.remesh.split_edges()
+    upper_half = torch.where(splits,torch.arange(E,2*E,dtype=face_to_edge.dtype,device=device),0) #E
+    inner = torch.arange(2*E,2*E+3*F,dtype=face_to_edge.dtype,device=device).reshape(F,3) #F,3
+    lower = edges[face_to_edge,0] #F,3
+    half_at_start = torch.where(faces==lower,face_to_edge,upper_half[face_to_edge]) #F,3 half of side i at c_i
+    half_at_end = torch.where(faces.roll(-1,dims=-1)==lower,face_to_edge,upper_half[face_to_edge]) #F,3 half of side i at c_i+1
+    prev_side = torch.where(side_split.roll(1,dims=-1),half_at_end.roll(1,dims=-1),face_to_edge.roll(1,dims=-1)) #F,3
+    shrunk_face_to_edge = torch.where(side_split.roll(-1,dims=-1),inner.roll(-1,dims=-1),
+        torch.where(side_split,half_at_end,face_to_edge)) #F,3
+    new_face_to_edge = side_split[:,:,None] * torch.stack((half_at_start,inner,prev_side),dim=-1) #F,N=3,S=3
+    face_to_edge = torch.concat((shrunk_face_to_edge,new_face_to_edge.reshape(F*3,3))) #4F,3
+
+    upper_edges = splits[:,None] * torch.stack((edges[:,1],edge_vert),dim=-1) #E,2
+    inner_edges,_ = torch.stack((side_vert,prev_shrunk),dim=-1).sort(dim=-1) #F,3,2
+    inner_edges.masked_fill_(~side_split[:,:,None],0)
+    edges = torch.concat((edges,upper_edges,inner_edges.reshape(F*3,2))) #2E+3F,2
+    edges[:E,1] = torch.where(splits,edge_vert,edges[:E,1])
+
+    faces = torch.concat((shrunk_faces,new_faces.reshape(F*3,3))) #4F,3
+
+    return vertices,faces,edges,face_to_edge
+
+def pack(
+        vertices:torch.Tensor, #V,D first unused and nan
+        faces:torch.Tensor, #F,3 long, 0 for unused
+        edges:torch.Tensor, #E,2 long, 0 for unused
+        face_to_edge:torch.Tensor, #F,3 long, 0 for unused
+        )->"tuple[torch.Tensor,...]": #(vertices,faces,edges,face_to_edge,counts)
+    """moves used elements to the front, buffer sizes stay the same, counts=[V',F',E'] stays on the device"""
+    V = vertices.shape[0]
+    E = edges.shape[0]
+    device = vertices.device
+
+    # faces
+    used_faces = faces[:,0]!=0
+    used_faces[0] = True
+    face_ind = used_faces.cumsum(dim=0)-1 #F long, index_copy_ only takes long indices
+    face_dest = torch.where(used_faces,face_ind,0) #F
+    faces = torch.zeros_like(faces).index_copy_(0,face_dest,faces)
+    faces[0] = 0
+    face_to_edge = torch.zeros_like(face_to_edge).index_copy_(0,face_dest,face_to_edge)
+    face_to_edge[0] = 0
+
+    # vertices
+    used_vertices = torch.zeros(V,dtype=torch.bool,device=device)
+    used_vertices[faces] = True
+    used_vertices[0] = True
+    vert_ind = used_vertices.cumsum(dim=0)-1 #V long
+    vertices = torch.full_like(vertices,torch.nan).index_copy_(0,torch.where(used_vertices,vert_ind,0),vertices)
+    vertices[0] = torch.nan
+    faces = vert_ind.type(faces.dtype)[faces]
+
+    # edges
+    used_edges = torch.zeros(E,dtype=torch.bool,device=device)
+    used_edges[face_to_edge] = True
+    used_edges[0] = True
+    edge_ind = used_edges.cumsum(dim=0)-1 #E long
+    edges = torch.zeros_like(edges).index_copy_(0,torch.where(used_edges,edge_ind,0),vert_ind.type(edges.dtype)[edges])
+    edges[0] = 0
+    face_to_edge = edge_ind.type(face_to_edge.dtype)[face_to_edge]
+
+    counts = torch.stack((vert_ind[-1],face_ind[-1],edge_ind[-1]))+1 #3
+    return vertices,faces,edges,face_to_edge,counts
+
+def flip_edges(
+        vertices:torch.Tensor, #V,3 first unused
+        faces:torch.Tensor, #F,3 long, first must be 0, 0 for unused
+        edges:torch.Tensor, #E,2 long, first must be 0, 0 for unused, lower vertex index first
+        edge_to_face:torch.Tensor, #E,[left,right],[face,side]
+        face_to_edge:torch.Tensor, #F,3 long
+        with_border:bool=True, #handle border edges (D=4 instead of D=6)
+        with_normal_check:bool=True, #check face normal flips
+        stable:bool=False, #only for unit testing
+        ):
+    """same as core.remesh.flip_edges(), faces, edges, edge_to_face and face_to_edge are updated in place"""
+    V = vertices.shape[0]
+    E = edges.shape[0]
+    device=vertices.device
+    vertex_degree = torch.zeros(V,dtype=torch.long,device=device) #V long
+    vertex_degree.scatter_(dim=0,index=edges.reshape(E*2),value=1,reduce='add')
+    neighbor_corner = (edge_to_face[:,:,1] + 2) % 3 #go from side to corner
+    neighbors = faces[edge_to_face[:,:,0],neighbor_corner] #E,LR=2
+    edge_is_inside = neighbors.all(dim=-1) #E
+
+    if with_border:
+        vertex_is_inside = torch.ones(V,2,dtype=torch.float32,device=device) #V,2 float
+        src = edge_is_inside.type(torch.float32)[:,None].expand(E,2) #E,2 float
+        vertex_is_inside.scatter_(dim=0,index=edges,src=src,reduce='multiply')
+        vertex_is_inside = vertex_is_inside.prod(dim=-1,dtype=torch.long) #V long
+        vertex_degree -= 2 * vertex_is_inside #V long
+
+    neighbor_degrees = vertex_degree[neighbors] #E,LR=2
+    edge_degrees = vertex_degree[edges] #E,2
+    loss_change = 2 + neighbor_degrees.sum(dim=-1) - edge_degrees.sum(dim=-1) #E
+    candidates = torch.logical_and(loss_change<0, edge_is_inside) #E
+    loss_change.masked_fill_(~candidates,torch.iinfo(loss_change.dtype).max) #non-candidates get the lowest ranks
+
+    edges_neighbors = torch.concat((edges,neighbors),dim=-1) #E,4
+    _,order = loss_change.sort(descending=True, stable=stable) #E
+    rank = torch.zeros_like(order,dtype=edges.dtype)
+    rank[order] = torch.arange(0,E,dtype=edges.dtype,device=device)
+    vertex_rank = torch.zeros(V,dtype=edges.dtype,device=device) #V
+    kernels.scatter_max_(vertex_rank,torch.where(candidates[:,None],edges_neighbors,0).reshape(-1),rank[:,None].expand(-1,4).reshape(-1))
+    neighborhood_rank,_ = vertex_rank[edges_neighbors].max(dim=-1) #E
+    flip = candidates.logical_and_(rank==neighborhood_rank) #E
+
+    if with_normal_check:
+        v = vertices[edges_neighbors] #E,4,3
+        v = v - v[:,0:1] #make relative to e0
+        e1 = v[:,1]
+        cl = v[:,2]
+        cr = v[:,3]
+        n = torch.cross(e1,cl,dim=-1) + torch.cross(cr,e1,dim=-1) #sum of old normal vectors
+        flip.logical_and_(torch.sum(n*torch.cross(cr,cl,dim=-1),dim=-1)>0) #first new face
+        flip.logical_and_(torch.sum(n*torch.cross(cl-e1,cr-e1,dim=-1),dim=-1)>0) #second new face
+
+    #  left face [e0,e1,cl] -> [e0,cr,cl], right face [e1,e0,cr] -> [e1,cl,cr], see core.remesh.flip_edges()
+    flip_edge_to_face = torch.where(flip[:,None],edge_to_face[:,:,0],0) #E,2
+    flip_faces = edges_neighbors[:,[[0,3,2],[1,2,3]]] #E,2,3
+    flip_ind = torch.where(flip,torch.arange(0,E,dtype=face_to_edge.dtype,device=device),0) #E
+    flip_sides = edge_to_face[:,:,1] #E,2
+    outer = face_to_edge[flip_edge_to_face[:,:,None],(flip_sides[:,:,None]+torch.arange(1,3,device=device))%3] #E,LR=2,2
+    flip_face_to_edge = torch.stack((
+        torch.stack((outer[:,1,0],flip_ind,outer[:,0,1]),dim=-1),
+        torch.stack((outer[:,0,0],flip_ind,outer[:,1,1]),dim=-1)),dim=1) #E,2,3
+    is_right = flip_faces>flip_faces.roll(-1,dims=-1) #E,2,3
+
+    face_to_edge[flip_edge_to_face] = flip_face_to_edge
+    face_to_edge[0] = 0
+    edges[flip_ind] = edges_neighbors[:,2:].sort(dim=-1)[0]
+    edges[0] = 0
+    edge_to_face[flip_face_to_edge,is_right.long()] = torch.stack((flip_edge_to_face[:,:,None].expand(-1,2,3),torch.arange(0,3,dtype=edge_to_face.dtype,device=device).expand_as(is_right)),dim=-1)
+    edge_to_face[0] = 0
+    faces[flip_edge_to_face] = flip_faces
+    faces[0] = 0
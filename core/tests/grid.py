@@ -1,8 +1,9 @@
 import torch
 from core.remesh import calc_face_normals, prepend_dummies
 
-def make_grid(flip:torch.Tensor,device='cuda'): #HW,2
+def make_grid(flip:torch.Tensor,device=None): #HW,2
     H,W = flip.shape
+    device = flip.device if device is None else device
     vertices = torch.zeros(((H+1)*(W+1),3),device=device)
     vertices[:,[1,0]] = torch.cartesian_prod(torch.arange(0,H+1),torch.arange(0,W+1)).float().to(device)
     c = (torch.arange(0,W) + (W+1)*torch.arange(0,H)[:,None]).reshape(-1).to(device) #HW
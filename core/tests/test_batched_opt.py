@@ -0,0 +1,75 @@
+import unittest
+import torch
+from core.opt import BatchedMeshOptimizer, MeshOptimizer
+from core.tests.test_topology import check_topology
+from util.func import DEVICE, make_sphere
+
+def make_meshes():
+    meshes = [make_sphere(level=level,radius=.5,device=DEVICE) for level in [1,2,2]]
+    meshes[1][0][:] += .1
+    return [m[0] for m in meshes],[m[1] for m in meshes]
+
+def sphere_loss(vertices):
+    return (vertices.norm(dim=-1)-.8).abs().mean()
+
+class TestBatchedMeshOptimizer(unittest.TestCase):
+
+    def test_step(self):
+        lr = [.1,.3,.5]
+        nu_ref = [.2,.3,.4]
+        edge_len_lims = [(.01,.1),(.02,.15),(.03,.2)]
+        for local_edgelen in [True,False]:
+            vertices,faces = make_meshes()
+            opts = [MeshOptimizer(v.clone(),f,lr=lr[i],nu_ref=nu_ref[i],edge_len_lims=edge_len_lims[i],local_edgelen=local_edgelen,gammas=(.5,.5,.5))
+                for i,(v,f) in enumerate(zip(vertices,faces))]
+            batched = BatchedMeshOptimizer(vertices,faces,lr=lr,nu_ref=nu_ref,edge_len_lims=edge_len_lims,local_edgelen=local_edgelen,gammas=(.5,.5,.5))
+
+            for _ in range(10):
+                for opt in opts:
+                    opt.zero_grad()
+                    sphere_loss(opt.vertices).backward()
+                    opt.step()
+                batched.zero_grad()
+                sum(sphere_loss(v) for v,_ in batched.meshes()).backward()
+                batched.step()
+
+            for opt,(v,f) in zip(opts,batched.meshes()):
+                self.assertTrue(v.allclose(opt.vertices,atol=1e-5))
+                self.assertTrue(f.equal(opt.faces))
+            self.assertTrue(batched._ref_len.allclose(torch.concat([opt._ref_len for opt in opts])))
+
+    def test_remesh(self):
+        vertices,faces = make_meshes()
+        edge_len_lims = [(.02,.1),(.05,.15),(.1,.2)]
+        opt = BatchedMeshOptimizer(vertices,faces,lr=[.1,.3,.5],edge_len_lims=edge_len_lims)
+        for _ in range(20):
+            opt.zero_grad()
+            sum(sphere_loss(v) for v,_ in opt.meshes()).backward()
+            opt.step()
+            vertices,faces = opt.remesh()
+            check_topology(self,faces,opt._edges,opt._face_to_edge,dummies=False)
+            self.assertEqual(opt.vertex_offsets[-1],vertices.shape[0])
+            self.assertEqual(opt.face_offsets[-1],faces.shape[0])
+            for i,(v,f) in enumerate(opt.meshes()):
+                self.assertEqual(f.min().item(),0)
+                self.assertEqual(f.max().item(),v.shape[0]-1)
+                ref_len = opt._ref_len[opt.vertex_offsets[i]:opt.vertex_offsets[i+1]]
+                self.assertTrue((ref_len>=edge_len_lims[i][0]).all().item() and (ref_len<=edge_len_lims[i][1]).all().item())
+                self.assertTrue((opt._mesh[opt.vertex_offsets[i]:opt.vertex_offsets[i+1]]==i).all().item())
+
+    def test_max_vertices(self):
+        for sync_free in [False,True]:
+            vertices,faces = make_meshes() #42,162,162 vertices
+            opt = BatchedMeshOptimizer(vertices,faces,edge_len_lims=(.01,.02),max_vertices=100,sync_free=sync_free)
+            single = MeshOptimizer(vertices[0].clone(),faces[0],edge_len_lims=(.01,.02),max_vertices=100,sync_free=sync_free)
+            opt.remesh()
+            single.remesh()
+            counts = [v.shape[0] for v,_ in opt.meshes()]
+            self.assertEqual(counts[0],single.vertices.shape[0])
+            self.assertGreater(counts[0],42)
+            self.assertLessEqual(max(counts[1:]),162)
+            check_topology(self,opt.faces,opt._edges,opt._face_to_edge,dummies=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,12 @@ import unittest
 import torch
 from torch import nan
 from core.remesh import calc_edge_length, calc_edges
+from util.func import DEVICE
 import math
 
+
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, **kwargs, device='cuda')
+    return torch.tensor(*args, **kwargs, device=DEVICE)
     
 
 class TestCalcEdges(unittest.TestCase):
@@ -71,6 +73,19 @@ class TestCalcEdges(unittest.TestCase):
         length_expected = tensor([nan,1,1,math.sqrt(2),1,1])
         self.assertTrue(length.allclose(length_expected,equal_nan=True))
 
+    def test_calc_edges_engines(self):
+        for F in [1,10,100,1000]:
+            faces = torch.randint(0,F,(F,3),device=DEVICE)
+            faces[0] = 0
+            key = calc_edges(faces,with_edge_to_face=True,engine='key')
+            rows = calc_edges(faces,with_edge_to_face=True,engine='rows')
+            auto = calc_edges(faces,with_edge_to_face=True)
+            given = calc_edges(faces,with_edge_to_face=True,num_vertices=F)
+            for a,b,c,d in zip(key,rows,auto,given):
+                self.assertTrue(a.equal(b))
+                self.assertTrue(a.equal(c))
+                self.assertTrue(a.equal(d))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,11 +2,11 @@ import unittest
 import torch
 from torch import nan
 from core.remesh import calc_edge_length, calc_edges, calc_face_collapses, calc_face_normals, calc_vertex_normals
+from util.func import DEVICE
 
-device='cuda'
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device=device, **kwargs)
+    return torch.tensor(*args, device=DEVICE, **kwargs)
     
 
 class TesCalcFaceCollapses(unittest.TestCase):
@@ -49,7 +49,7 @@ class TesCalcFaceCollapses(unittest.TestCase):
         edge_length = calc_edge_length(vertices,edges) #E
         collapses = calc_face_collapses(vertices,faces,edges,face_to_edge,edge_length,face_normals,vertex_normals,shortest_probability=1)
 
-        collapses_expected = torch.zeros(edges.shape[0],dtype=torch.bool,device=device)
+        collapses_expected = torch.zeros(edges.shape[0],dtype=torch.bool,device=DEVICE)
         collapses_expected[-1] = True
 
         self.assertTrue(collapses.equal(collapses_expected))
@@ -80,17 +80,17 @@ class TesCalcFaceCollapses(unittest.TestCase):
         vertex_normals = calc_vertex_normals(vertices,faces,face_normals) #V,3
         edges,face_to_edge = calc_edges(faces) #E,2 F,3
         edge_length = calc_edge_length(vertices,edges) #E
-        min_edge_length = torch.full((vertices.shape[0],),fill_value=1.,device=device)
+        min_edge_length = torch.full((vertices.shape[0],),fill_value=1.,device=DEVICE)
         collapses = calc_face_collapses(vertices,faces,edges,face_to_edge,edge_length,face_normals,vertex_normals,min_edge_length=min_edge_length,shortest_probability=1)
 
-        collapses_expected = torch.zeros(edges.shape[0],dtype=torch.bool,device=device)
+        collapses_expected = torch.zeros(edges.shape[0],dtype=torch.bool,device=DEVICE)
         collapses_expected[-1] = True
         self.assertTrue(collapses.equal(collapses_expected))
 
         # random edge selection
         for _ in range(200):
             collapses = calc_face_collapses(vertices,faces,edges,face_to_edge,edge_length,face_normals,vertex_normals,min_edge_length=min_edge_length,shortest_probability=0.7)
-            collapses_expected = torch.zeros([3,edges.shape[0]],dtype=torch.bool,device=device)
+            collapses_expected = torch.zeros([3,edges.shape[0]],dtype=torch.bool,device=DEVICE)
             collapses_expected[0,3] = True
             collapses_expected[1,4] = True
             collapses_expected[2,5] = True
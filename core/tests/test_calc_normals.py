@@ -2,13 +2,13 @@ import unittest
 import torch
 from torch import nan
 from core.remesh import calc_vertex_normals,calc_face_normals,calc_face_ref_normals
+from util.func import DEVICE, make_sphere
 import torch.nn.functional as tfunc
 import math
 
-device='cuda'
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device=device, **kwargs)
+    return torch.tensor(*args, device=DEVICE, **kwargs)
     
 
 class TestCalcNormals(unittest.TestCase):
@@ -78,6 +78,19 @@ class TestCalcNormals(unittest.TestCase):
         self.assertTrue(vertex_normals.allclose(vertex_normals_expected,equal_nan=True))
         self.assertTrue(ref_normals.allclose(ref_normals_expected,equal_nan=True))
 
+    def test_vertex_normals_grad(self):
+        vertices,faces = make_sphere(level=1,radius=.5,device=DEVICE)
+        vertices = (vertices + torch.randn_like(vertices)*.05).double().requires_grad_()
+        F = faces.shape[0]
+        def expected(vertices):
+            face_normals = calc_face_normals(vertices,faces)
+            vertex_normals = torch.zeros_like(vertices).scatter_add(0,faces.reshape(F*3,1).expand(F*3,3),face_normals.repeat_interleave(3,dim=0))
+            return tfunc.normalize(vertex_normals,eps=1e-6,dim=1)
+        self.assertTrue(calc_vertex_normals(vertices,faces).allclose(expected(vertices)))
+        self.assertTrue(torch.autograd.gradcheck(lambda v: calc_vertex_normals(v,faces),(vertices,)))
+        with torch.no_grad():
+            self.assertTrue(calc_vertex_normals(vertices,faces).allclose(expected(vertices)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,15 +3,15 @@ import torch
 from torch import nan
 from core.remesh import calc_face_normals, collapse_edges, calc_edges
 from core.tests.grid import area, make_grid
+from util.func import DEVICE
 import matplotlib.pyplot as plt
 import os
 
 #os.environ['CUDA_LAUNCH_BLOCKING'] = "1"
 
-device='cuda'
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device=device, **kwargs)
+    return torch.tensor(*args, device=DEVICE, **kwargs)
     
 def plot(src_vertices:torch.Tensor,src_faces:torch.Tensor,vertices:torch.Tensor=None,faces:torch.Tensor=None):
     def p(vertices,faces,shrink,color):
@@ -52,7 +52,7 @@ class TestCollapseEdgesSafe(unittest.TestCase):
 
         edges,_ = calc_edges(faces)
 
-        collapses = torch.zeros(edges.shape[0],dtype=torch.bool,device=device)
+        collapses = torch.zeros(edges.shape[0],dtype=torch.bool,device=DEVICE)
         collapses[5] = True 
         self.assertTrue(edges[5].equal(tensor([3,4])))
         
@@ -77,14 +77,14 @@ class TestCollapseEdgesSafe(unittest.TestCase):
         self.assertTrue(faces.equal(faces_expected))
 
     def test_collapse_connectivity(self):        
-        flip = torch.zeros((2,3),dtype=torch.bool,device=device)
+        flip = torch.zeros((2,3),dtype=torch.bool,device=DEVICE)
         vertices,faces = make_grid(flip)
         faces[(faces-1)%4==3] -= 3
         faces[0] = 0
         #plot(vertices,faces)
         edges,_ = calc_edges(faces)
         src_vertices,src_faces = vertices.clone(),faces.clone()
-        priorities = torch.zeros(edges.shape[0],device=device)
+        priorities = torch.zeros(edges.shape[0],device=DEVICE)
         priorities[10] = 1
         self.assertTrue((vertices[edges[10],1]==1).all().item())
         vertices,faces = collapse_edges(vertices,faces,edges,priorities)
@@ -94,13 +94,13 @@ class TestCollapseEdgesSafe(unittest.TestCase):
     def test_collapse_random(self):        
         for _ in range(5):
             for w in range(1,20):
-                flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=device)
+                flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=DEVICE)
                 vertices,faces = make_grid(flip)
                 edges,_ = calc_edges(faces)
 
                 self.assertEqual(area(vertices,faces),w*w)
                 src_vertices,src_faces = vertices.clone(),faces.clone()
-                priorities = torch.rand(edges.shape[0],device=device)-.5
+                priorities = torch.rand(edges.shape[0],device=DEVICE)-.5
                 priorities[0] = 0
                 vertices,faces = collapse_edges(vertices,faces,edges,priorities)
                 
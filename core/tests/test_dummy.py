@@ -2,9 +2,11 @@ import unittest
 import torch
 from torch import nan
 from core.remesh import prepend_dummies, remove_dummies
+from util.func import DEVICE
+
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device='cuda', **kwargs)
+    return torch.tensor(*args, device=DEVICE, **kwargs)
     
 
 class TestPack(unittest.TestCase):
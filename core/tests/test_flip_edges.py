@@ -3,11 +3,11 @@ import torch
 from core.remesh import calc_edges, calc_face_normals, flip_edges
 import matplotlib.pyplot as plt
 from core.tests.grid import area, make_grid
+from util.func import DEVICE
 
-device='cuda'
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device=device, **kwargs)
+    return torch.tensor(*args, device=DEVICE, **kwargs)
     
 def sort_faces(a:torch.Tensor):
     b = a.clone()
@@ -24,7 +24,7 @@ def degree_loss(vertices:torch.Tensor,faces:torch.Tensor,with_border=True):
     V = vertices.shape[0]
     edges,_ = calc_edges(faces)
     E = edges.shape[0]
-    vertex_degree = torch.zeros(V,dtype=torch.long,device=device) #V
+    vertex_degree = torch.zeros(V,dtype=torch.long,device=DEVICE) #V
     vertex_degree.scatter_(dim=0,index=edges.reshape(E*2),value=1,reduce='add')
     
     if with_border:
@@ -96,7 +96,7 @@ class TestFlipEdges(unittest.TestCase):
 
         for i in range(10):
             for w in range(1,100):
-                flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=device)
+                flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=DEVICE)
                 vertices,faces = make_grid(flip)
                 edges,_,edge_to_face = calc_edges(faces, with_edge_to_face=True)
 
@@ -0,0 +1,34 @@
+import unittest
+import torch
+from core.opt import BatchedMeshOptimizer, MeshOptimizer
+from core.tests.test_batched_opt import make_meshes, sphere_loss
+from util.func import DEVICE, make_sphere
+
+def run(opt,steps=12):
+    for step in range(steps):
+        opt.zero_grad()
+        sphere_loss(opt.vertices).backward()
+        opt.step()
+        if step%4==3:
+            opt.remesh()
+    return opt._vertices_etc
+
+class TestFusedStep(unittest.TestCase):
+
+    def test_fused_step(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        kwargs = dict(gammas=(.5,.5,.5),betas=(.8,.8,.5),remesh_interval=2)
+        expected = run(MeshOptimizer(vertices.clone(),faces,**kwargs))
+        fused = run(MeshOptimizer(vertices.clone(),faces,fused=True,**kwargs))
+        self.assertTrue(fused.allclose(expected,atol=1e-5))
+
+    def test_fused_batched_step(self):
+        vertices,faces = make_meshes()
+        kwargs = dict(lr=[.1,.3,.5],edge_len_lims=[(.02,.1),(.05,.15),(.1,.2)],local_edgelen=False)
+        expected = run(BatchedMeshOptimizer([v.clone() for v in vertices],faces,**kwargs))
+        fused = run(BatchedMeshOptimizer(vertices,faces,fused=True,**kwargs))
+        self.assertTrue(fused.allclose(expected,atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
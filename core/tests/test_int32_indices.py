@@ -0,0 +1,70 @@
+import unittest
+import torch
+from core import kernels, remesh_sync_free
+from core.opt import BatchedMeshOptimizer, MeshOptimizer
+from core.remesh import calc_edges, flip_edges
+from core.tests.grid import make_grid
+from core.tests.test_batched_opt import make_meshes
+from core.tests.test_fused_step import run
+from util.func import DEVICE, make_sphere
+
+class TestInt32Indices(unittest.TestCase):
+
+    def test_calc_edges(self):
+        _,faces = make_sphere(level=3,radius=.5,device=DEVICE)
+        for engine in ['key','rows']:
+            expected = calc_edges(faces,with_edge_to_face=True,engine=engine)
+            result = calc_edges(faces.type(torch.int32),with_edge_to_face=True,engine=engine)
+            for e,r in zip(expected,result):
+                self.assertEqual(r.dtype,torch.int32)
+                self.assertTrue(r.long().equal(e))
+
+    def test_flip_edges(self):
+        torch.manual_seed(0)
+        flip = torch.randint(0,2,(20,20),dtype=torch.bool,device=DEVICE)
+        vertices,faces = make_grid(flip)
+        for flip_fn in [flip_edges,remesh_sync_free.flip_edges]:
+            results = []
+            for dtype in [torch.long,torch.int32]:
+                f = faces.clone().type(dtype)
+                edges,face_to_edge,edge_to_face = calc_edges(f,with_edge_to_face=True)
+                flip_fn(vertices,f,edges,edge_to_face,face_to_edge=face_to_edge,with_border=True,stable=True)
+                self.assertEqual(f.dtype,dtype)
+                self.assertEqual(edges.dtype,dtype)
+                results.append((f,edges,face_to_edge,edge_to_face))
+            for e,r in zip(*results):
+                self.assertTrue(r.long().equal(e))
+
+    def test_optimizer(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        for sync_free in [False,True]:
+            expected = MeshOptimizer(vertices.clone(),faces,sync_free=sync_free)
+            opt = MeshOptimizer(vertices.clone(),faces,sync_free=sync_free,index_dtype=torch.int32)
+            self.assertTrue(run(opt).allclose(run(expected),equal_nan=True))
+            for name in ['_faces','_edges','_face_to_edge']:
+                self.assertEqual(getattr(opt,name).dtype,torch.int32)
+                self.assertTrue(getattr(opt,name).long().equal(getattr(expected,name)))
+
+    def test_torch_scatter(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        expected = MeshOptimizer(vertices.clone(),faces)
+        kernels.set_backend('torch_scatter')
+        try:
+            opt = MeshOptimizer(vertices.clone(),faces,index_dtype=torch.int32)
+            self.assertTrue(run(opt).allclose(run(expected),equal_nan=True))
+        finally:
+            kernels.set_backend('auto')
+        self.assertTrue(opt._faces.long().equal(expected._faces))
+
+    def test_batched(self):
+        vertices,faces = make_meshes()
+        expected = BatchedMeshOptimizer([v.clone() for v in vertices],faces)
+        opt = BatchedMeshOptimizer(vertices,faces,index_dtype=torch.int32)
+        self.assertTrue(run(opt).allclose(run(expected)))
+        self.assertEqual(opt.faces.dtype,torch.int32)
+        self.assertTrue(opt.faces.long().equal(expected.faces))
+        self.assertEqual(opt.face_offsets,expected.face_offsets)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import torch
+from core import kernels
+from core.remesh import calc_edges, calc_vertex_normals
+from util.func import DEVICE, make_sphere
+
+class TestKernels(unittest.TestCase):
+
+    def tearDown(self):
+        kernels.set_backend('auto')
+
+    def test_scatter_max(self):
+        V,N = 1000,2**17
+        index = torch.randint(0,V,(N,),device=DEVICE)
+        src = torch.randint(0,N,(N,),device=DEVICE)
+        out = torch.zeros(V,dtype=torch.long,device=DEVICE)
+        expected = out.clone()
+        for i,s in zip(index.tolist(),src.tolist()):
+            expected[i] = max(expected[i],s)
+        self.assertTrue(kernels.scatter_max_(out.clone(),index,src).equal(expected))
+        kernels.set_backend('torch_scatter')
+        self.assertTrue(kernels.scatter_max_(out.clone(),index,src).equal(expected))
+
+    def test_scatter_add(self):
+        V,N = 1000,2**17
+        index = torch.randint(0,V,(N,),device=DEVICE)
+        src = torch.rand((N,3),device=DEVICE)
+        out = torch.rand((V,3),device=DEVICE)
+        expected = out.clone().index_add_(0,index,src)
+        self.assertTrue(kernels.scatter_add_(out.clone(),index,src).allclose(expected,atol=1e-5))
+        kernels.set_backend('torch_scatter')
+        self.assertTrue(kernels.scatter_add_(out.clone(),index,src).allclose(expected,atol=1e-5))
+
+    def test_vertex_normals_grad(self):
+        vertices,faces = make_sphere(level=2,device=DEVICE)
+        grads = []
+        for backend in ['native','torch_scatter']:
+            kernels.set_backend(backend)
+            v = vertices.clone().requires_grad_()
+            calc_vertex_normals(v,faces).sum().backward()
+            self.assertFalse(v.grad.isnan().any().item())
+            grads.append(v.grad)
+        self.assertTrue(grads[0].allclose(grads[1],atol=1e-5))
+
+    def test_neighbor_mean(self):
+        vertices,faces = make_sphere(level=2,device=DEVICE)
+        edges,_ = calc_edges(faces)
+        V = vertices.shape[0]+1 #last vertex without edges
+        x = torch.rand((V,9),device=DEVICE)[:,:8] #strided like MeshOptimizer._smooth
+        expected = torch.zeros_like(x)
+        for v in range(V):
+            neighbors = torch.cat((edges[edges[:,0]==v,1],edges[edges[:,1]==v,0]))
+            if neighbors.shape[0]:
+                expected[v] = x[neighbors].mean(dim=0)
+        neighbor_mean = kernels.NeighborMean(edges,V)
+        for _ in range(3): #gather path, then CSR
+            self.assertTrue(neighbor_mean(x).allclose(expected,atol=1e-6))
+
+    def test_parallel_map(self):
+        threads = torch.get_num_threads()
+        self.assertEqual(kernels.parallel_map(lambda i: i*i,range(5),4),[i*i for i in range(5)])
+        self.assertEqual(torch.get_num_threads(),threads)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            kernels.set_backend('csr')
+
+
+if __name__ == '__main__':
+    unittest.main()
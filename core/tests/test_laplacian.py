@@ -1,6 +1,7 @@
 import unittest
 import torch
-from util.func import laplacian
+from core.remesh import calc_edges
+from util.func import laplacian, laplacian_matmul, make_sphere
 
 class TestLaplacian(unittest.TestCase):
 
@@ -10,5 +11,16 @@ class TestLaplacian(unittest.TestCase):
         expected = torch.tensor([[2,-1,-1],[-1,1,0],[-1,0,1]],dtype=torch.float32)
         self.assertTrue(torch.allclose(L.to_dense(),expected))
 
+    def test_laplacian_matmul(self):
+        vertices,faces = make_sphere(level=2,device='cpu')
+        edges,_ = calc_edges(faces)
+        L = laplacian(vertices.shape[0],edges)
+        L_dense = L.to_dense()
+        x = vertices.clone().requires_grad_()
+        (x * laplacian_matmul(L,x)).sum().backward()
+        x_dense = vertices.clone().requires_grad_()
+        (x_dense * (L_dense@x_dense)).sum().backward()
+        self.assertTrue(x.grad.allclose(x_dense.grad,atol=1e-5))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+import torch
+from core.opt import BatchedMeshOptimizer, MeshOptimizer
+from core.tests.test_batched_opt import make_meshes
+from core.tests.test_fused_step import run
+from util.func import DEVICE, make_sphere
+
+class TestLayout(unittest.TestCase):
+
+    def test_soa(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        for sync_free in [False,True]:
+            kwargs = dict(gammas=(.5,.5,.5),sync_free=sync_free)
+            expected = run(MeshOptimizer(vertices.clone(),faces,**kwargs))
+            opt = MeshOptimizer(vertices.clone(),faces,layout='soa',**kwargs)
+            soa = run(opt)
+            self.assertTrue(soa.T.is_contiguous())
+            self.assertTrue(opt._nu.is_contiguous() and opt._ref_len.is_contiguous())
+            self.assertTrue(soa.allclose(expected,atol=1e-5))
+
+    def test_soa_batched(self):
+        vertices,faces = make_meshes()
+        expected = run(BatchedMeshOptimizer([v.clone() for v in vertices],faces,lr=[.1,.3,.5]))
+        soa = run(BatchedMeshOptimizer(vertices,faces,lr=[.1,.3,.5],layout='soa'))
+        self.assertTrue(soa.T.is_contiguous())
+        self.assertTrue(soa.allclose(expected,atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
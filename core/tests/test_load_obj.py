@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+from pathlib import Path
+import torch
+from util.func import load_obj, save_obj
+
+OBJ_TEXT = """# mixed face syntaxes
+v 0 0 0
+v 1 0 0
+vt 0 0
+vn 0 0 1
+v 1 1 0 0.5 0.5 0.5
+v 0 1 0
+f 1 2 3
+f 1/1 3/1 4/1
+v 2 0 0
+f 2/1/1 5/1/1 3/1/1
+f 1//1 2//1 3//1
+f 1 2 3 4
+"""
+
+class TestLoadObj(unittest.TestCase):
+
+    def test_load_obj(self):
+        vertices_expected = torch.tensor([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[2,0,0]],dtype=torch.float32)
+        faces_expected = torch.tensor([[0,1,2],[0,2,3],[1,4,2],[0,1,2],[0,1,2],[0,2,3]])
+        with tempfile.TemporaryDirectory() as tmp:
+            for newline in ['\n','\r\n']:
+                path = Path(tmp) / 'mesh.obj'
+                path.write_bytes(OBJ_TEXT.replace('\n',newline).encode())
+                for chunk_size in [7,64,1<<20]:
+                    vertices,faces = load_obj(path,device='cpu',chunk_size=chunk_size)
+                    self.assertTrue(vertices.equal(vertices_expected))
+                    self.assertTrue(faces.equal(faces_expected))
+
+    def test_leading_whitespace(self):
+        text = "  v 0 0 0\n\tv 1 0 0\n \t\n v\t0 1 0\n  f 1 2 3\n   "
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'mesh.obj'
+            path.write_bytes(text.encode())
+            for chunk_size in [5,1<<20]:
+                vertices,faces = load_obj(path,device='cpu',chunk_size=chunk_size)
+                self.assertTrue(vertices.equal(torch.tensor([[0,0,0],[1,0,0],[0,1,0]],dtype=torch.float32)))
+                self.assertTrue(faces.equal(torch.tensor([[0,1,2]])))
+
+    def test_save_load(self):
+        vertices = torch.rand(100,3)
+        faces = torch.randint(0,100,(200,3))
+        with tempfile.TemporaryDirectory() as tmp:
+            save_obj(vertices,faces,Path(tmp) / 'mesh.obj')
+            vertices_loaded,faces_loaded = load_obj(Path(tmp) / 'mesh.obj',device='cpu',chunk_size=1000)
+        self.assertTrue(vertices_loaded.allclose(vertices,atol=1e-4))
+        self.assertTrue(faces_loaded.equal(faces))
+
+
+if __name__ == '__main__':
+    unittest.main()
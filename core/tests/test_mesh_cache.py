@@ -0,0 +1,56 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+import torch
+from util.func import load_obj, save_obj
+from util.mesh_cache import MeshCache
+
+class TestMeshCache(unittest.TestCase):
+
+    def test_mesh_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            fname = tmp/'mesh.obj'
+            save_obj(torch.rand(100,3),torch.randint(0,100,(200,3)),fname)
+            cache = MeshCache(tmp/'cache')
+            loads = []
+            def load():
+                loads.append(fname)
+                return load_obj(fname,device='cpu')
+
+            vertices,faces = cache.load(fname,{'scale':1},load)
+            vertices_cached,faces_cached = cache.load(fname,{'scale':1},load)
+            self.assertEqual(len(loads),1)
+            self.assertTrue(vertices_cached.equal(vertices) and faces_cached.equal(faces))
+            vertices_cached += 1 #copy-on-write, the cache is unchanged
+            self.assertTrue(cache.load(fname,{'scale':1},load)[0].equal(vertices))
+
+            cache.load(fname,{'scale':2},load)
+            self.assertEqual(len(loads),2)
+
+            time.sleep(.01)
+            save_obj(torch.rand(50,3),torch.randint(0,50,(100,3)),fname)
+            vertices,_ = cache.load(fname,{'scale':1},load)
+            self.assertEqual(len(loads),3)
+            self.assertEqual(vertices.shape[0],50)
+
+            cache.load(fname,{'scale':1,'version':2},load) #loader changed
+            self.assertEqual(len(loads),4)
+            cache.version += 1 #storage layout changed
+            cache.load(fname,{'scale':1,'version':2},load)
+            self.assertEqual(len(loads),5)
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            cache = MeshCache(tmp/'cache',max_bytes=10000)
+            for i in range(10):
+                fname = tmp/f'mesh{i}.obj'
+                save_obj(torch.rand(100,3),torch.randint(0,100,(200,3)),fname)
+                cache.load(fname,{},lambda: load_obj(fname,device='cpu'))
+            self.assertLessEqual(sum(f.stat().st_size for f in (tmp/'cache').glob('*.npy')),10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import torch
+from core.opt import BatchedMeshOptimizer, MeshOptimizer
+from core.remesh import calc_edge_length, calc_face_collapses, calc_face_normals, calc_vertex_normals, prepend_dummies
+from core.tests.test_batched_opt import make_meshes, sphere_loss
+from core.tests.test_topology import check_topology
+from util.func import DEVICE, make_sphere
+
+def run(opt,steps,remesh=True):
+    for _ in range(steps):
+        opt.zero_grad()
+        sphere_loss(opt.vertices).backward()
+        opt.step()
+        if remesh:
+            opt.remesh()
+    return opt
+
+def face_collapses(opt):
+    vertices,faces = prepend_dummies(opt.vertices.detach(),opt.faces)
+    edges,face_to_edge = opt._edges+1,opt._face_to_edge
+    edges = torch.cat((torch.zeros(1,2,dtype=edges.dtype,device=DEVICE),edges))
+    face_to_edge = torch.cat((torch.zeros(1,3,dtype=face_to_edge.dtype,device=DEVICE),face_to_edge+1))
+    edge_length = calc_edge_length(vertices,edges)
+    face_normals = calc_face_normals(vertices,faces,normalize=False)
+    vertex_normals = calc_vertex_normals(vertices,faces,face_normals)
+    min_edge_len = torch.cat((torch.zeros(1,device=DEVICE),opt._ref_len*(1-opt._edge_len_tol)))
+    return calc_face_collapses(vertices,faces,edges,face_to_edge,edge_length,face_normals,vertex_normals,min_edge_len,area_ratio=.5)
+
+class TestMixedPrecision(unittest.TestCase):
+
+    def test_state_dtype(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        for dtype in [torch.float16,torch.bfloat16]:
+            opt = MeshOptimizer(vertices.clone(),faces,state_dtype=dtype,gammas=(.5,.5,.5))
+            for t in opt._m1,opt._m2,opt._nu:
+                self.assertEqual(t.dtype,dtype)
+            self.assertEqual(opt._vertices.dtype,torch.float32)
+            self.assertEqual(opt._ref_len.dtype,torch.float32)
+            self.assertEqual(opt._vertices_etc.shape[1],4)
+            run(opt,10)
+            check_topology(self,opt.faces,opt._edges,opt._face_to_edge,dummies=False)
+
+    def test_controller_stable(self):
+        """edge length controller and remesh result stay close to float32"""
+        vertices,faces = make_sphere(level=3,radius=.5,device=DEVICE)
+        expected = run(MeshOptimizer(vertices.clone(),faces,edge_len_lims=(.02,.15)),30)
+        for dtype in [torch.float16,torch.bfloat16]:
+            opt = run(MeshOptimizer(vertices.clone(),faces,edge_len_lims=(.02,.15),state_dtype=dtype),30)
+            self.assertLess(abs(opt._ref_len.mean()/expected._ref_len.mean()-1),.05)
+            self.assertLess(abs(opt.vertices.shape[0]/expected.vertices.shape[0]-1),.15)
+            distance = lambda opt: (opt.vertices.norm(dim=-1)-.8).abs().mean()
+            self.assertLess(distance(opt),distance(expected)*1.5)
+
+    def test_face_collapses_stable(self):
+        """calc_face_collapses() decisions agree with float32 after steps without remeshing"""
+        vertices,faces = make_sphere(level=3,radius=.5,device=DEVICE)
+        expected = face_collapses(run(MeshOptimizer(vertices.clone(),faces),10,remesh=False))
+        for dtype in [torch.float16,torch.bfloat16]:
+            collapses = face_collapses(run(MeshOptimizer(vertices.clone(),faces,state_dtype=dtype),10,remesh=False))
+            self.assertGreater((collapses==expected).float().mean().item(),.99)
+
+    def test_batched(self):
+        vertices,faces = make_meshes()
+        opt = run(BatchedMeshOptimizer(vertices,faces,lr=[.1,.3,.5],local_edgelen=False,state_dtype=torch.bfloat16),10)
+        for i,(v,f) in enumerate(opt.meshes()):
+            self.assertTrue((opt._mesh[opt.vertex_offsets[i]:opt.vertex_offsets[i+1]]==i).all().item())
+        self.assertTrue(opt._lr.unique().allclose(torch.tensor([.1,.3,.5],device=DEVICE)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import torch
+import math
+from core.remesh import calc_vertex_normals
+from util import rasterize
+from util.func import DEVICE, make_sphere, make_star_cameras
+from util.render import NormalsRenderer
+
+def tensor(*args, **kwargs):
+    return torch.tensor(*args, device=DEVICE, **kwargs)
+
+class TestRasterize(unittest.TestCase):
+
+    def test_rasterize(self):
+        # 3---2
+        # | / |
+        # 0---1
+        pos = tensor([[-.5,-.5,0,1],[.5,-.5,.5,1],[.5,.5,0,1],[-.5,.5,-.5,1]])[None] #1,4,4
+        tri = tensor([[0,1,2],[0,2,3]],dtype=torch.int32)
+        rast,_ = rasterize.rasterize(pos,tri,(8,8))
+        ids = rast[0,...,3].long()
+        self.assertTrue(ids[2:6,2:6].ne(0).all())
+        self.assertEqual(ids.ne(0).sum().item(),16)
+        self.assertTrue(ids[2:6,2:6].diagonal().eq(1).all())
+        self.assertEqual(ids[5,2].item(),2)
+        self.assertEqual(ids[2,5].item(),1)
+        col,_ = rasterize.interpolate(pos[0],rast,tri)
+        covered = ids.ne(0)
+        xy = (torch.arange(8,device=DEVICE)+.5)/4-1
+        self.assertTrue(col[0,...,0][covered].allclose(xy[None,:].expand(8,8)[covered]))
+        self.assertTrue(col[0,...,1][covered].allclose(xy[:,None].expand(8,8)[covered]))
+        self.assertTrue(col[0,...,2][covered].allclose(rast[0,...,2][covered]))
+
+    def test_depth(self):
+        pos = tensor([[-1.,-1,0,1],[3,-1,0,1],[-1,3,0,1]])[None].repeat(1,2,1) #1,6,4
+        pos[0,3:,2] = .5
+        tri = tensor([[3,4,5],[0,1,2]])
+        rast,_ = rasterize.rasterize(pos,tri,(4,4))
+        self.assertTrue(rast[...,3].eq(2).all())
+        self.assertTrue(rast[...,2].eq(0).all())
+
+    def test_cull(self):
+        mv,proj = make_star_cameras(2,2,device=DEVICE)
+        vertices,faces = make_sphere(level=3,radius=.5,device=DEVICE)
+        vertices = vertices + tensor([.35,0,0]) #partially off screen with r=.1 at distance 10
+        pos = torch.cat((vertices,torch.ones_like(vertices[:,:1])),dim=-1) @ (proj@mv).transpose(-2,-1) #C,V,4
+        expected,_ = rasterize.rasterize(pos,faces,(32,32))
+        self.assertTrue(rasterize.rasterize(pos,faces,(32,32),cull='ccw')[0].equal(expected))
+        back,_ = rasterize.rasterize(pos,faces,(32,32),cull='cw') #inside of the far half
+        covered = back[...,3].ne(0).logical_and_(expected[...,3].ne(0))
+        self.assertTrue(covered.any())
+        self.assertTrue(back[...,2][covered].gt(expected[...,2][covered]).all())
+        face,*_ = rasterize._cull_faces(pos[0],faces,(32,32),cull='ccw')
+        self.assertLess(face.shape[0],faces.shape[0]/2)
+
+    def test_sliver(self):
+        pos = tensor([[-.9,-.95,0,1],[.95,.9,0,1],[.93,.95,0,1]],dtype=torch.float64)[None] #diagonal across many tiles
+        tri = tensor([[0,1,2]])
+        H,W = 64,80
+        rast,_ = rasterize.rasterize(pos,tri,(H,W))
+        y,x = torch.meshgrid((torch.arange(H,device=DEVICE)+.5)/H*2-1,(torch.arange(W,device=DEVICE)+.5)/W*2-1,indexing='ij')
+        p = torch.stack((x,y),dim=-1)[...,None,:] #H,W,1,2
+        a = pos[0,:,:2] #3,2
+        e = rasterize._cross2(a.roll(-1,dims=0)-a,p-a) #H,W,3
+        self.assertTrue(rast[0,...,3].eq(1).equal((e>=0).all(dim=-1)))
+
+    def test_sphere(self):
+        mv,proj = make_star_cameras(2,2,device=DEVICE)
+        renderer = NormalsRenderer(mv,proj,[64,64],backend='torch')
+        vertices,faces = make_sphere(level=4,radius=.5,device=DEVICE)
+        scale = torch.ones((),device=DEVICE,requires_grad=True)
+        images = renderer.render(vertices*scale,calc_vertex_normals(vertices,faces),faces) #C,H,W,4
+        area = math.pi * (.5*32)**2 #radius .5 at distance 10 with r=.1 covers half the image
+        self.assertTrue(images[...,3].sum(dim=(1,2)).sub(area).abs().lt(.03*area).all())
+        self.assertTrue(images[:,32,32,:3].mul(2).sub(1).norm(dim=-1).sub(1).abs().lt(.01).all())
+        images[...,3].sum().backward()
+        #d area/d scale = 2 area
+        self.assertTrue(math.isclose(scale.grad.item(),2*area*4,rel_tol=.1))
+
+    def test_topology_cache(self):
+        _,faces = make_sphere(level=2,device=DEVICE)
+        topology = rasterize._get_topology(faces.type(torch.int32))
+        self.assertIs(rasterize._get_topology(faces.type(torch.int32))[0],topology[0]) #new tensor, same content
+        faces = faces.type(torch.int32)
+        faces[0] = faces[0].flip(0)
+        self.assertIsNot(rasterize._get_topology(faces)[0],topology[0])
+
+    def test_threads(self):
+        mv,proj = make_star_cameras(2,2,device=DEVICE)
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        pos = torch.cat((vertices,torch.ones_like(vertices[:,:1])),dim=-1) @ (proj@mv).transpose(-2,-1) #C,V,4
+        expected,_ = rasterize.rasterize(pos,faces,(32,32),threads=1)
+        self.assertTrue(rasterize.rasterize(pos,faces,(32,32),threads=3)[0].equal(expected))
+
+    def test_antialias_grad(self):
+        pos = tensor([[-.47,-.41,0,1],[.43,-.52,0,1],[.51,.46,0,1],[-.53,.49,0,1]],dtype=torch.float64)[None] #no edge halfway between pixel centers, where the blending has a kink
+        tri = tensor([[0,1,2],[0,2,3]])
+        rast,_ = rasterize.rasterize(pos,tri,(16,16))
+        color = torch.rand((1,16,16,2),device=DEVICE,dtype=torch.float64)
+        pos.requires_grad_()
+        color.requires_grad_()
+        self.assertTrue(torch.autograd.gradcheck(lambda c,p: rasterize.antialias(c,rast,p,tri),(color,pos)))
+
+
+if __name__ == '__main__':
+    unittest.main()
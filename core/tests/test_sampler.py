@@ -0,0 +1,51 @@
+import unittest
+import torch
+from util.func import DEVICE
+from util.sampler import ViewSampler, decode, encode
+
+class TestViewSampler(unittest.TestCase):
+
+    def test_encode(self):
+        images = torch.rand(4,8,8,3,device=DEVICE)
+        for dtype,atol in [(torch.float16,1e-3),(torch.bfloat16,4e-3),(torch.uint8,.5/255+1e-6)]:
+            encoded = encode(images,dtype)
+            self.assertEqual(encoded.dtype,dtype)
+            self.assertTrue(decode(encoded).allclose(images,atol=atol,rtol=0))
+
+    def test_batches(self):
+        images = torch.rand(6,4,4,3,device=DEVICE)
+        depth = torch.rand(6,4,4,1,device=DEVICE)
+        for prefetch in [False,True]:
+            sampler = ViewSampler(images,depth,batch_size=4,device=DEVICE,dtype=torch.float32,prefetch=prefetch,generator=torch.Generator(DEVICE).manual_seed(0))
+            for _ in range(5):
+                views,(b_images,b_depth) = sampler.next()
+                self.assertEqual(views.unique().shape[0],4)
+                self.assertTrue(b_images.equal(images[views]))
+                self.assertTrue(b_depth.equal(depth[views]))
+            sampler.close()
+
+    def test_importance(self):
+        views = 8
+        sampler = ViewSampler(torch.rand(views,2,2,3),batch_size=2,dtype=torch.uint8,importance=.9,generator=torch.Generator().manual_seed(0))
+        self.assertTrue(sampler.probabilities().allclose(torch.full((views,),1/views)))
+        sampler.update(torch.tensor([0,1]),torch.tensor([1.,0.]))
+        p = sampler.probabilities()
+        self.assertAlmostEqual(p.sum().item(),1,places=5)
+        self.assertAlmostEqual(p[2].item(),p[0].item(),places=5) #unseen views count as the hardest seen
+        self.assertLess(p[1],p[0])
+
+        sampler.close()
+
+        sampler = ViewSampler(torch.rand(views,2,2,3,device=DEVICE),batch_size=2,importance=.9,generator=torch.Generator(DEVICE).manual_seed(0))
+        sampler.update(torch.arange(views),(torch.arange(views)==5).float())
+        counts = torch.zeros(views,device=DEVICE)
+        for _ in range(200):
+            b,_ = sampler.next()
+            counts[b] += 1
+        sampler.close()
+        self.assertEqual(counts.argmax().item(),5)
+        self.assertTrue(counts.gt(0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
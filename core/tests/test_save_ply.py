@@ -0,0 +1,34 @@
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import torch
+import trimesh
+from util.func import save_ply
+
+class TestSavePly(unittest.TestCase):
+
+    def test_save_ply(self):
+        V,F = 100,200
+        vertices = torch.rand(V,3)
+        faces = torch.randint(0,V,(F,3))
+        faces[0] = torch.tensor([0,1,V-1])
+        vertex_colors = torch.rand(V,3)
+        vertex_normals = torch.nn.functional.normalize(torch.rand(V,3),dim=-1)
+        with tempfile.TemporaryDirectory() as tmp:
+            for binary in [True,False]:
+                for colors,normals in [(None,None),(vertex_colors,None),(vertex_colors,vertex_normals)]:
+                    fname = Path(tmp)/'mesh.ply'
+                    save_ply(fname,vertices,faces,colors,normals,binary=binary)
+                    self.assertEqual(fname.read_bytes().startswith(b'ply\nformat binary_little_endian'),binary)
+                    mesh = trimesh.load(fname,process=False)
+                    self.assertTrue(np.allclose(mesh.vertices,vertices.numpy()))
+                    self.assertTrue(np.array_equal(mesh.faces,faces.numpy()))
+                    if colors is not None:
+                        self.assertTrue(np.array_equal(mesh.visual.vertex_colors[:,:3],(colors*255).numpy().astype(np.uint8)))
+                    if normals is not None:
+                        self.assertTrue(np.allclose(mesh.vertex_normals,normals.numpy(),atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
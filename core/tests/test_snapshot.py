@@ -0,0 +1,34 @@
+import pickle
+import unittest
+import torch
+from core.opt import MeshOptimizer
+from util.func import DEVICE, make_sphere
+from util.snapshot import CompactSnapshot, snapshot
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_compact_snapshot(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        opt = MeshOptimizer(vertices,faces)
+        for half in [False,True]:
+            opt.zero_grad()
+            (opt.vertices.norm(dim=-1)-.8).abs().mean().backward()
+            opt.step()
+            s = snapshot(opt,compact=True,half=half)
+            expected = opt.vertices.detach().clone(),opt.faces.clone(),opt._nu.clone(),opt._ref_len.clone()
+            opt.vertices.data += 1 #snapshot is a copy
+            pickled = pickle.loads(pickle.dumps(s))
+            for s in [s,pickled]:
+                self.assertIsInstance(s,CompactSnapshot)
+                self.assertEqual(s.vertices.dtype,torch.float32)
+                self.assertEqual(s.faces.dtype,torch.long)
+                tol = 1e-3 if half else 0
+                self.assertTrue(s.vertices.allclose(expected[0].cpu(),atol=tol,rtol=tol))
+                self.assertTrue(s.faces.equal(expected[1].cpu()))
+                self.assertTrue(s.nu.allclose(expected[2].cpu(),atol=tol,rtol=tol))
+                self.assertTrue(s.ref_len.allclose(expected[3].cpu(),atol=tol,rtol=tol))
+                self.assertIsNone(s.optimizer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,12 @@
 import unittest
 from core.remesh import calc_edges, calc_face_normals, split_edges
+from util.func import DEVICE
 import torch
 from torch import nan
 
-device='cuda'
 
 def tensor(*args, **kwargs):
-    return torch.tensor(*args, device=device, **kwargs)
+    return torch.tensor(*args, device=DEVICE, **kwargs)
     
 class TestSplitEdges(unittest.TestCase):
 
@@ -59,7 +59,7 @@ class TestSplitEdges(unittest.TestCase):
 
         edges,face_to_edge = calc_edges(faces)
 
-        splits = torch.zeros(edges.shape[0],dtype=torch.bool,device=device)
+        splits = torch.zeros(edges.shape[0],dtype=torch.bool,device=DEVICE)
         splits[[3,4,5]] = True 
         self.assertTrue(edges[[3,4,5]].equal(tensor([[1,4],[2,3],[2,4]])))
 
@@ -89,7 +89,7 @@ class TestSplitEdges(unittest.TestCase):
                 area = calc_face_normals(vertices,faces)[1:,2].sum().item()/2
                 self.assertAlmostEqual(area,.5)
                 edges,face_to_edge = calc_edges(faces)
-                splits = torch.randint(0,3,size=(edges.shape[0],),device=device)==0
+                splits = torch.randint(0,3,size=(edges.shape[0],),device=DEVICE)==0
                 splits[0] = False #dont split dummy
                 vertices,faces = split_edges(vertices,faces,edges,face_to_edge,splits)
 
@@ -0,0 +1,105 @@
+import unittest
+import torch
+from core import remesh_sync_free
+from core.opt import MeshOptimizer, remesh
+from core.remesh import calc_edge_to_face, calc_edges, calc_face_normals, collapse_edges, flip_edges, split_edges
+from core.tests.grid import area, make_grid
+from core.tests.test_topology import check_topology
+from util.func import DEVICE, make_sphere
+
+class TestSyncFree(unittest.TestCase):
+
+    def test_collapse(self):
+        for w in range(1,20):
+            flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=DEVICE)
+            vertices,faces = make_grid(flip)
+            edges,face_to_edge = calc_edges(faces)
+            priorities = torch.rand(edges.shape[0],device=DEVICE)-.5
+            priorities[0] = 0
+
+            vertices_expected,faces_expected = collapse_edges(vertices.clone(),faces,edges,priorities,stable=True)
+            vertices,faces,edges,face_to_edge = remesh_sync_free.collapse_edges(vertices,faces,edges,priorities,face_to_edge,stable=True)
+
+            self.assertTrue(vertices.allclose(vertices_expected,equal_nan=True))
+            self.assertTrue(faces.equal(faces_expected))
+            check_topology(self,faces,edges,face_to_edge)
+
+    def test_split(self):
+        for w in range(1,20):
+            flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=DEVICE)
+            vertices,faces = make_grid(flip)
+            edges,face_to_edge = calc_edges(faces)
+            splits = torch.randint(0,3,size=(edges.shape[0],),device=DEVICE)==0
+            splits[0] = False
+            splits[-1] = True #split_edges() returns unexpanded faces without splits
+
+            vertices_expected,faces_expected = split_edges(vertices,faces,edges,face_to_edge,splits,pack_faces=False)
+            vertices,faces,edges,face_to_edge = remesh_sync_free.split_edges(vertices,faces,edges,face_to_edge,splits)
+
+            V = vertices_expected.shape[0]
+            self.assertTrue(vertices[:V].allclose(vertices_expected,equal_nan=True))
+            self.assertTrue(vertices[V:].isnan().all().item())
+            self.assertTrue(faces.equal(faces_expected))
+            check_topology(self,faces,edges,face_to_edge)
+
+            vertices,faces,edges,face_to_edge,counts = remesh_sync_free.pack(vertices,faces,edges,face_to_edge)
+            V,F,E = counts.tolist()
+            self.assertEqual(V,vertices_expected.shape[0])
+            self.assertEqual(E,calc_edges(faces[:F])[0].shape[0])
+            self.assertTrue((faces[F:]==0).all().item() and (edges[E:]==0).all().item())
+            check_topology(self,faces,edges,face_to_edge)
+            self.assertAlmostEqual(area(vertices[:V],faces[:F]),w*w,places=4)
+
+    def test_split_max_vertices(self):
+        vertices,faces = make_grid(torch.zeros((4,4),dtype=torch.bool,device=DEVICE))
+        edges,face_to_edge = calc_edges(faces)
+        splits = torch.ones(edges.shape[0],dtype=torch.bool,device=DEVICE)
+        splits[0] = False
+        V = vertices.shape[0]
+        vertices,faces,edges,face_to_edge = remesh_sync_free.split_edges(vertices,faces,edges,face_to_edge,splits,max_vertices=V+5)
+        self.assertEqual(vertices.shape[0],V+5)
+        self.assertFalse(vertices[V:].isnan().any().item())
+        check_topology(self,faces,edges,face_to_edge)
+
+    def test_remesh_max_vertices(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        edge_len = torch.full((vertices.shape[0],),.02,device=DEVICE)
+        for max_vertices in (vertices.shape[0]+1,vertices.shape[0]+20,vertices.shape[0]+100):
+            result = [remesh(vertices.clone(),faces,edge_len*.5,edge_len,flip=False,max_vertices=max_vertices,sync_free=sync_free)
+                      for sync_free in (False,True)]
+            self.assertEqual(result[0][0].shape[0],max_vertices-1) #without the dummy
+            self.assertEqual(result[1][0].shape[0],result[0][0].shape[0])
+            self.assertTrue(result[1][0].allclose(result[0][0]))
+
+    def test_flip(self):
+        for w in range(1,30):
+            flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=DEVICE)
+            vertices,faces = make_grid(flip)
+            edges,face_to_edge,edge_to_face = calc_edges(faces,with_edge_to_face=True)
+
+            faces_expected = faces.clone()
+            flip_edges(vertices,faces_expected,edges.clone(),edge_to_face.clone(),stable=True)
+            remesh_sync_free.flip_edges(vertices,faces,edges,edge_to_face,face_to_edge,stable=True)
+
+            self.assertTrue(faces.equal(faces_expected))
+            check_topology(self,faces,edges,face_to_edge)
+            self.assertTrue(edge_to_face.equal(calc_edge_to_face(faces,edges,face_to_edge)))
+            self.assertTrue((calc_face_normals(vertices,faces)[1:,2]>0).all().item())
+
+    def test_optimizer(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        opt = MeshOptimizer(vertices,faces,edge_len_lims=(.02,.15),sync_free=True)
+        vertices = opt.vertices
+        for _ in range(20):
+            opt.zero_grad()
+            loss = (vertices.norm(dim=-1)-.8).abs().mean()
+            loss.backward()
+            opt.step()
+            vertices,faces = opt.remesh()
+            self.assertFalse(vertices.isnan().any().item())
+            self.assertEqual(faces.max().item(),vertices.shape[0]-1)
+            check_topology(self,faces,opt._edges,opt._face_to_edge,dummies=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+import torch
+from util.func import DEVICE, make_sphere, make_star_cameras
+from util.render import NormalsRenderer
+from util.targets import TargetCache, TargetStore, load_targets, mean_abs_error
+from core.remesh import calc_vertex_normals
+
+def make_images():
+    images = torch.zeros(3,40,50,4,device=DEVICE)
+    images[0,5:20,10:30] = torch.rand(15,20,4,device=DEVICE)
+    images[2,30:] = 1
+    return images
+
+class TestTargetStore(unittest.TestCase):
+
+    def test_store(self):
+        images = make_images()
+        for dtype,atol in [(torch.float32,0),(torch.float16,1e-3),(torch.bfloat16,4e-3),(torch.uint8,.5/255+1e-6)]:
+            store = TargetStore.from_images(images,dtype=dtype,tile_size=16)
+            self.assertEqual(store.shape,images.shape)
+            self.assertEqual(store.dtype,dtype)
+            self.assertEqual(store._tiles.shape[0],4+8) #of 3x4 tiles, view 0 covers 2x2, view 2 the bottom 2x4
+            self.assertTrue(store.get().allclose(images,atol=atol,rtol=0))
+            views = torch.tensor([2,0],device=DEVICE)
+            self.assertTrue(store.get(views).allclose(images[views],atol=atol,rtol=0))
+
+    def test_mean_abs_error(self):
+        targets = make_images()
+        store = TargetStore.from_images(targets,dtype=torch.float32,tile_size=16)
+        images = torch.rand_like(targets,requires_grad=True)
+        expected = (images-targets).abs().mean()
+        loss = mean_abs_error(images,store,chunk=2)
+        self.assertTrue(loss.allclose(expected))
+        grad, = torch.autograd.grad(loss,images)
+        self.assertTrue(grad.allclose(torch.autograd.grad(expected,images)[0]))
+
+    def test_save_load(self):
+        images = make_images()
+        with tempfile.TemporaryDirectory() as tmp:
+            for dtype in [torch.uint8,torch.bfloat16]:
+                store = TargetStore.from_images(images,dtype=dtype)
+                path = Path(tmp)/str(dtype)
+                store.save(path)
+                loaded = TargetStore.load(path,device=DEVICE)
+                self.assertEqual(loaded.dtype,dtype)
+                self.assertTrue(loaded.get().equal(store.get()))
+
+    def test_cache(self):
+        mv,proj = make_star_cameras(2,2,device=DEVICE)
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        renderer = NormalsRenderer(mv,proj,[32,32],backend='torch')
+        renders = []
+        def render():
+            renders.append(1)
+            return renderer.render(vertices,calc_vertex_normals(vertices,faces),faces)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TargetCache(tmp)
+            expected = load_targets(render,vertices,faces,mv,proj,[32,32],cache=cache,device=DEVICE)
+            cached = load_targets(render,vertices,faces,mv,proj,[32,32],cache=cache,device=DEVICE)
+            self.assertEqual(len(renders),1)
+            self.assertTrue(cached.get().equal(expected.get()))
+            self.assertTrue(expected.get().allclose(render(),atol=.5/255+1e-6,rtol=0))
+            load_targets(render,vertices*1.01,faces,mv,proj,[32,32],cache=cache,device=DEVICE)
+            load_targets(render,vertices,faces,mv,proj,[32,32],dtype=torch.float16,cache=cache,device=DEVICE)
+            self.assertEqual(len(renders),4)
+
+    def test_evict(self):
+        images = make_images()
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TargetCache(tmp)
+            cache.load('a',lambda: images)
+            size = sum(f.stat().st_size for f in Path(tmp).iterdir())
+            time.sleep(.01)
+            cache = TargetCache(tmp,max_bytes=size)
+            cache.load('b',lambda: images*.5)
+            self.assertEqual(sorted({f.name[0] for f in Path(tmp).iterdir()}),['b'])
+            cache.clear()
+            self.assertEqual(len(list(Path(tmp).iterdir())),0)
+
+
+if __name__ == '__main__':
+    unittest.main()
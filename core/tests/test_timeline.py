@@ -0,0 +1,49 @@
+import tempfile
+import unittest
+import torch
+from core.opt import MeshOptimizer
+from util.func import DEVICE, make_sphere
+from util.snapshot import snapshot
+from util.timeline import Timeline, TimelineWriter
+
+def run(steps:int):
+    vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+    opt = MeshOptimizer(vertices,faces,edge_len_lims=(.05,.15))
+    for step in range(steps):
+        opt.zero_grad()
+        (opt.vertices.norm(dim=-1)-.8).abs().mean().backward()
+        opt.step()
+        yield snapshot(opt,compact=True)
+        if step%10==9:
+            opt.remesh()
+
+class TestTimeline(unittest.TestCase):
+
+    def test_timeline(self):
+        for half,keyframe_interval in [(False,100),(False,3),(True,100)]:
+            with tempfile.TemporaryDirectory() as tmp:
+                snapshots = []
+                with TimelineWriter(tmp,half=half,keyframe_interval=keyframe_interval) as writer:
+                    for s in run(40):
+                        writer.append(s)
+                        snapshots.append(s)
+                timeline = Timeline(tmp)
+                self.assertEqual(len(timeline),len(snapshots))
+                self.assertLess(timeline._vertices.size,sum(s.vertices.numel() for s in snapshots))
+                tol = 1e-3 if half else 1e-6
+                for i in [0,5,39,17,-1]: #random access
+                    s,expected = timeline[i],snapshots[i]
+                    self.assertEqual(s.step,expected.step)
+                    self.assertEqual(s.time,expected.time)
+                    self.assertTrue(s.vertices.allclose(expected.vertices,atol=tol))
+                    self.assertTrue(s.faces.equal(expected.faces))
+                    self.assertTrue(s.nu.allclose(expected.nu,atol=tol,rtol=tol))
+                    self.assertTrue(s.ref_len.allclose(expected.ref_len,atol=tol,rtol=tol))
+                self.assertEqual(timeline.steps.tolist(),[s.step for s in snapshots])
+                with self.assertRaises(IndexError):
+                    timeline[len(snapshots)]
+                del timeline,s #release the memory maps
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import torch
+from core.opt import MeshOptimizer, remesh
+from core.remesh import calc_edge_to_face, calc_edges, collapse_edges, flip_edges, pack, split_edges
+from core.tests.grid import make_grid
+from util.func import DEVICE, make_sphere
+
+def check_topology(test:unittest.TestCase,faces:torch.Tensor,edges:torch.Tensor,face_to_edge:torch.Tensor,dummies=True):
+    """compare incrementally updated edges and face_to_edge with calc_edges()"""
+    used = faces[:,0]!=0 if dummies else torch.ones(faces.shape[0],dtype=torch.bool,device=faces.device)
+    used_faces = faces[used] #F',3
+    used_face_to_edge = face_to_edge[used] #F',3
+    side_edges,_ = torch.stack((used_faces,used_faces.roll(-1,dims=-1)),dim=-1).sort(dim=-1) #F',3,2
+    test.assertTrue(edges[used_face_to_edge].equal(side_edges))
+    test.assertTrue((face_to_edge[~used]==0).all().item())
+
+    expected_edges,_ = calc_edges(used_faces)
+    referenced = used_face_to_edge.unique()
+    test.assertEqual(referenced.shape[0],expected_edges.shape[0])
+    test.assertTrue(torch.unique(edges[referenced],dim=0).equal(expected_edges))
+
+class TestTopology(unittest.TestCase):
+
+    def test_collapse_split_pack_flip(self):
+        for _ in range(5):
+            for w in range(1,20):
+                flip = torch.randint(0,2,(w,w),dtype=torch.bool,device=DEVICE)
+                vertices,faces = make_grid(flip)
+                edges,face_to_edge = calc_edges(faces)
+
+                priorities = torch.rand(edges.shape[0],device=DEVICE)-.5
+                priorities[0] = 0
+                vertices,faces,edges,face_to_edge = collapse_edges(vertices,faces,edges,priorities,face_to_edge=face_to_edge)
+                check_topology(self,faces,edges,face_to_edge)
+
+                splits = torch.randint(0,3,size=(edges.shape[0],),device=DEVICE)==0
+                splits[0] = False
+                splits.logical_and_(edges[:,0]!=edges[:,1])
+                vertices,faces,edges,face_to_edge = split_edges(vertices,faces,edges,face_to_edge,splits,pack_faces=False,with_edges=True)
+                check_topology(self,faces,edges,face_to_edge)
+
+                vertices,faces,edges,face_to_edge = pack(vertices,faces,edges,face_to_edge)
+                check_topology(self,faces,edges,face_to_edge)
+                self.assertEqual(edges.shape[0],calc_edges(faces)[0].shape[0])
+
+                edge_to_face = calc_edge_to_face(faces,edges,face_to_edge)
+                flip_edges(vertices,faces,edges,edge_to_face,face_to_edge=face_to_edge)
+                check_topology(self,faces,edges,face_to_edge)
+                self.assertTrue(edge_to_face.equal(calc_edge_to_face(faces,edges,face_to_edge)))
+
+    def test_optimizer(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        opt = MeshOptimizer(vertices,faces,edge_len_lims=(.02,.15))
+        vertices = opt.vertices
+        for _ in range(20):
+            opt.zero_grad()
+            loss = (vertices.norm(dim=-1)-.8).abs().mean()
+            loss.backward()
+            opt.step()
+            vertices,faces = opt.remesh()
+            check_topology(self,faces,opt._edges,opt._face_to_edge,dummies=False)
+
+    def test_remesh_return(self):
+        vertices,faces = make_sphere(level=2,radius=.5,device=DEVICE)
+        edge_len = torch.full((vertices.shape[0],),.1,device=DEVICE)
+        for sync_free in [False,True]:
+            result = remesh(vertices,faces,edge_len*.5,edge_len*1.5,flip=True,sync_free=sync_free)
+            self.assertEqual(len(result),2)
+            v,f,edges,face_to_edge = remesh(vertices,faces,edge_len*.5,edge_len*1.5,flip=True,sync_free=sync_free,return_topology=True)
+            self.assertTrue(v.equal(result[0]) and f.equal(result[1]))
+            check_topology(self,f,edges,face_to_edge,dummies=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
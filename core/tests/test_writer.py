@@ -0,0 +1,54 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+import torch
+from util.func import load_obj
+from util.writer import AsyncWriter
+
+class TestAsyncWriter(unittest.TestCase):
+
+    def test_exports(self):
+        vertices = torch.rand(10,3)
+        faces = torch.randint(0,10,(20,3))
+        faces[0,:2] = torch.tensor([0,9])
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            with AsyncWriter() as writer:
+                expected = vertices.clone()
+                writer.save_obj(vertices,faces,tmp/'mesh.obj')
+                vertices += 1 #host copy was taken
+                writer.save_ply(tmp/'mesh.ply',vertices,faces)
+                writer.save_images(torch.rand(2,8,8,4),tmp/'images')
+            vertices_loaded,faces_loaded = load_obj(tmp/'mesh.obj',device='cpu')
+            self.assertTrue(vertices_loaded.allclose(expected,atol=1e-4))
+            self.assertTrue(faces_loaded.equal(faces))
+            self.assertTrue((tmp/'mesh.ply').exists())
+            self.assertEqual(sorted(f.name for f in (tmp/'images').iterdir()),['00.png','01.png'])
+
+    def test_backpressure(self):
+        release = threading.Event()
+        done = []
+        writer = AsyncWriter(max_pending=1)
+        writer.submit(release.wait)
+        writer.submit(done.append,1) #queued
+        blocked = threading.Thread(target=writer.submit,args=(done.append,2))
+        blocked.start()
+        blocked.join(timeout=.1)
+        self.assertTrue(blocked.is_alive()) #queue is full
+        release.set()
+        blocked.join()
+        writer.flush()
+        self.assertEqual(done,[1,2])
+        writer.close()
+
+    def test_error(self):
+        writer = AsyncWriter()
+        writer.submit(lambda: 1/0)
+        with self.assertRaises(ZeroDivisionError):
+            writer.flush()
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
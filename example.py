@@ -1,9 +1,11 @@
+import torch
 from core.remesh import calc_vertex_normals
 from core.opt import MeshOptimizer
 from util.func import load_obj, make_sphere,make_star_cameras, normalize_vertices, save_obj, save_images
 from util.render import NormalsRenderer
 from tqdm import tqdm
 from util.snapshot import snapshot
+from util.targets import load_targets, mean_abs_error
 try:
     from util.view import show
 except:
@@ -12,16 +14,23 @@ except:
 fname = 'data/lucy.obj'
 steps = 100
 snapshot_step = 1
+target_dtype = None #e.g. torch.uint8 to cache the target images on disk for the next run and keep them compressed, see util.targets
 
 mv,proj = make_star_cameras(4,4)
 renderer = NormalsRenderer(mv,proj,[512,512])
 
 target_vertices,target_faces =  load_obj(fname)
 target_vertices = normalize_vertices(target_vertices)
-target_normals = calc_vertex_normals(target_vertices,target_faces)
-target_images = renderer.render(target_vertices,target_normals,target_faces)
-save_images(target_images[...,:3], './out/target_images/')
-save_images(target_images[...,[3, 3, 3,]], './out/target_alpha/')
+render_targets = lambda: renderer.render(target_vertices,calc_vertex_normals(target_vertices,target_faces),target_faces)
+if target_dtype is None:
+    target_images = render_targets()
+else:
+    target_images = load_targets(render_targets,target_vertices,target_faces,mv,proj,[512,512],dtype=target_dtype,
+        params={'renderer':'NormalsRenderer','backend':renderer.backend},device=target_vertices.device)
+decoded = target_images if target_dtype is None else target_images.get()
+save_images(decoded[...,:3], './out/target_images/')
+save_images(decoded[...,[3, 3, 3,]], './out/target_alpha/')
+del decoded
 
 vertices,faces = make_sphere(level=2,radius=.5)
 
@@ -33,7 +42,7 @@ for i in tqdm(range(steps)):
     opt.zero_grad()
     normals = calc_vertex_normals(vertices,faces)
     images = renderer.render(vertices,normals,faces)
-    loss = (images-target_images).abs().mean()
+    loss = mean_abs_error(images,target_images)
     loss.backward()
     opt.step()
 
@@ -6,11 +6,16 @@ from timeit import timeit
 import matplotlib.pyplot as plt
 import numpy as np
 from core.remesh import calc_edge_length, calc_edges, calc_face_collapses, calc_face_normals, calc_vertex_normals, collapse_edges, flip_edges, pack, prepend_dummies, split_edges
+from util.func import DEVICE
+
+def synchronize():
+    if DEVICE=='cuda':
+        torch.cuda.synchronize()
 
 def make_inputs(level):
     sphere = trimesh.creation.icosphere(subdivisions=level, radius=1.0, color=None)
-    vertices = torch.tensor(sphere.vertices, device='cuda', dtype=torch.float32)
-    faces = torch.tensor(sphere.faces, device='cuda', dtype=torch.long)
+    vertices = torch.tensor(sphere.vertices, device=DEVICE, dtype=torch.float32)
+    faces = torch.tensor(sphere.faces, device=DEVICE, dtype=torch.long)
     vertices,faces = prepend_dummies(vertices,faces)
     return vertices,faces
 
@@ -56,10 +61,10 @@ funs = {
 def test_fun(f,inputs,number):
     for _ in range(number):
         f(*inputs)
-    torch.cuda.synchronize()
+    synchronize()
 
 levels = np.arange(1,8)
-number = 100
+number = 100 if DEVICE=='cuda' else 5
 
 #warm-up
 for f in funs.values():
@@ -72,7 +77,7 @@ for f in funs.values():
     for level in levels:
         inputs = make_inputs(level)
         test_fun(f,inputs,number)
-        torch.cuda.synchronize()
+        synchronize()
         t.append(timeit(lambda: test_fun(f,inputs,number),number=1)/number)            
     ts.append(t)
 
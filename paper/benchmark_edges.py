@@ -0,0 +1,45 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import torch
+from timeit import timeit
+from core.remesh import calc_edges
+from util.func import DEVICE
+
+def make_faces(face_count):
+    #triangulated grid with about face_count faces
+    w = max(1,round((face_count/2)**.5))
+    c = (torch.arange(0,w,device=DEVICE) + (w+1)*torch.arange(0,w,device=DEVICE)[:,None]).reshape(-1) #W*W
+    faces = torch.stack((torch.stack((c,c+1,c+w+2),dim=-1),torch.stack((c,c+w+2,c+w+1),dim=-1)),dim=1) #W*W,2,3
+    faces = faces.reshape(-1,3)
+    return faces[torch.randperm(faces.shape[0],device=DEVICE)]
+
+def synchronize():
+    if DEVICE=='cuda':
+        torch.cuda.synchronize()
+
+face_counts = [10**3,10**4,10**5,10**6,10**7]
+engines = ['rows','key']
+ts = {engine:[] for engine in engines}
+
+for face_count in face_counts:
+    faces = make_faces(face_count)
+    results = [calc_edges(faces,with_edge_to_face=True,engine=engine) for engine in engines]
+    assert all(a.equal(b) for a,b in zip(*results)), 'engines differ'
+    number = max(1,10**6//face_count)
+    for engine in engines:
+        synchronize()
+        t = timeit(lambda: calc_edges(faces,engine=engine),number=number)
+        synchronize()
+        ts[engine].append(t/number)
+    print(f'F={faces.shape[0]:>9} ' + ' '.join(f'{engine}={ts[engine][-1]*1e3:9.2f}ms' for engine in engines))
+
+for engine in engines:
+    plt.plot(face_counts, np.array(ts[engine])*1e3,'-o',label=engine)
+plt.legend()
+plt.xscale('log')
+plt.yscale('log')
+plt.xlabel('faces')
+plt.ylabel('ms')
+plt.grid()
+plt.title(f'calc_edges() {DEVICE}')
+plt.show()
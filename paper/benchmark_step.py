@@ -0,0 +1,43 @@
+import torch
+from timeit import timeit
+from core.opt import MeshOptimizer
+from core.remesh import calc_edge_length
+from util.func import DEVICE, make_sphere
+
+def synchronize():
+    if DEVICE=='cuda':
+        torch.cuda.synchronize()
+
+def make_optimizer(level,gammas,fused,layout):
+    vertices,faces = make_sphere(level=level,radius=.5,device=DEVICE)
+    opt = MeshOptimizer(vertices,faces,gammas=gammas,fused=fused,layout=layout)
+    grad = torch.rand_like(vertices) * 1e-3
+    def step():
+        opt._vertices.grad = grad[:opt._vertices.shape[0]]
+        opt.step()
+    mean_edge_length = calc_edge_length(vertices,opt._edges).mean().item()
+    def remesh():
+        opt._ref_len.uniform_(.8,1.25).mul_(mean_edge_length) #random collapses and splits, mesh size stays about the same
+        opt.remesh()
+    for _ in range(5): #warm-up and compilation
+        step()
+    return step,remesh
+
+def measure(fun,number):
+    synchronize()
+    t = timeit(fun,number=number)
+    synchronize()
+    return t / number
+
+levels = [4,5,6,7]
+configs = [(fused,layout) for fused in [False,True] for layout in ['aos','soa']]
+for gammas in [(0,0,0),(.5,.5,.5)]:
+    for level in levels:
+        number = 100 if DEVICE=='cuda' else 20
+        step_ts,remesh_ts = [],[]
+        for fused,layout in configs:
+            step,remesh = make_optimizer(level,gammas,fused,layout)
+            step_ts.append(measure(step,number))
+            remesh_ts.append(measure(remesh,max(1,number//10)))
+        print(f'gammas={gammas} level={level} step ' + ' '.join(f'{"fused" if fused else "eager"},{layout}={t*1e3:7.2f}ms' for (fused,layout),t in zip(configs,step_ts)))
+        print(f'gammas={gammas} level={level} remesh ' + ' '.join(f'{layout}={t*1e3:7.2f}ms' for (fused,layout),t in zip(configs[:2],remesh_ts[:2])))
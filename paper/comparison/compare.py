@@ -36,6 +36,7 @@ for model in (model_bar:=tqdm(models)):
         settings.target_vertices,settings.target_faces = target_vertices,target_faces
         settings.steps = None
         settings.timeout = 3
+        settings.timeline_dir = outdir/'timeline'/model/method
         settings.result_interval = 5
         result = optimize(settings)
 
@@ -58,7 +59,7 @@ for model in (model_bar:=tqdm(models)):
         
         for time in 1,2,3:
             if time<settings.timeout:
-                ind = np.nonzero([s.time>=time for s in result.snapshots])[0][0]
+                ind = np.nonzero(result.snapshots.times>=time)[0][0]
             else:
                 ind = -1
             snapshot = result.snapshots[ind]
@@ -51,6 +51,7 @@ if not fname:
                 settings.target_vertices, settings.target_faces = target_meshes[model]
                 settings.timeout = 3
                 settings.steps = None
+                settings.compact_snapshots = True
                 settings.result_interval = 0
                 set_value(settings,setting_name,setting_value)
                 result = optimize(settings)
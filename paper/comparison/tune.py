@@ -42,6 +42,7 @@ for method in (method_bar:=tqdm(methods)):
     settings.timeout = 3
     settings.steps = None
     settings.result_interval = 0
+    settings.compact_snapshots = True
     settings.result_meshes = True
 
     hyperparams = ['lr','betas']
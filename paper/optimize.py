@@ -7,9 +7,13 @@ from tqdm import tqdm
 from pathlib import Path
 from core.opt import MeshOptimizer
 from core.remesh import calc_edge_length, calc_edges, calc_vertex_normals
-from util.func import laplacian, load_obj, make_sphere, make_star_cameras, normalize_vertices, save_images, to_numpy
+from util.func import DEVICE, OBJ_LOADER_VERSION, laplacian, laplacian_matmul, load_obj, make_sphere, make_star_cameras, normalize_vertices, to_numpy
+from util.mesh_cache import MeshCache, mesh_cache
 from util.render import NormalsRenderer
-from util.snapshot import Snapshot, snapshot
+from util.snapshot import Snapshot, compact_snapshot, snapshot
+from util.targets import TargetStore, load_targets, mean_abs_error, target_cache
+from util.timeline import Timeline, TimelineWriter
+from util.writer import AsyncWriter
 import numpy as np
 try:
     from pyremesh import remesh_botsch
@@ -37,7 +41,15 @@ class OptimizeSettings:
     sphere_level:int = 2 #0->12,42,162,642,2562, 5->10k,40k,160k
     sphere_shift:tuple[float,float,float] = None
     cameras:tuple[int,int] = (4,4)
-    device = 'cuda'
+    device:str = DEVICE
+    target_dtype:str = None #None keeps float32 target images, 'uint8' or 'float16' keeps compressed tiles and decodes a few views at a time in the loss, see util.targets.mean_abs_error()
+    target_cache:bool = False #reuse target renderings across runs, keyed by target mesh and cameras, requires target_dtype
+    mesh_cache:bool = False #reuse the parsed and normalized target_fname across runs, see util.mesh_cache
+
+    #coarse-to-fine rendering, method ours
+    min_image_size:int = None #render at image_size/2^k >= min_image_size chosen from the mean reference edge length, None for always image_size
+    pixels_per_edge:float = 4. #size of the mean reference edge length in pixels at the chosen resolution
+    image_size_interval:int = 10 #steps between resolution choices, each reads the edge length back from the device
 
     #optimizer common
     lr:float = 0.5
@@ -61,6 +73,9 @@ class OptimizeSettings:
     result_interval:int = 5
     result_meshes:bool = False
     result_snapshots:bool = False
+    compact_snapshots:bool = False #keep only positions, faces, nu and ref_len on the host, see util.snapshot.CompactSnapshot
+    snapshot_half:bool = False #store compact snapshots as float16/int32
+    timeline_dir:Path = None #stream snapshots to an on-disk timeline, result.snapshots is then a util.timeline.Timeline
     
     save_images:bool = False
 
@@ -70,11 +85,11 @@ class OptimizeResult:
     settings:OptimizeSettings
     target_vertices:torch.Tensor = None
     target_faces:torch.Tensor = None
-    snapshots:list[Snapshot] = field(default_factory=list)
+    snapshots:"list[Snapshot]|Timeline" = field(default_factory=list)
     
 
 def make_optimizer(settings,vertices,faces):
-    edges,_ = calc_edges(faces)
+    edges,_ = calc_edges(faces,num_vertices=vertices.shape[0])
     mean_edge_length = calc_edge_length(vertices,edges).mean().item()
     lr = settings.lr * mean_edge_length
     Laplacian = None
@@ -82,9 +97,8 @@ def make_optimizer(settings,vertices,faces):
     if settings.method=='adam':
         vertices.requires_grad_()
         opt = torch.optim.Adam([vertices],lr=lr,betas=settings.betas)
-        edges,_ = calc_edges(faces)
         Laplacian = laplacian(vertices.shape[0],edges)
-        loss = (vertices * (Laplacian@vertices)).mean() #warm-up
+        laplacian_matmul(Laplacian,vertices) #warm-up
     elif settings.method=='ours':
         opt = MeshOptimizer(vertices,faces,lr=settings.lr,betas=settings.betas,gammas=settings.gammas,nu_ref=settings.nu_ref,
             edge_len_lims=settings.edge_len_lims,edge_len_tol=settings.edge_len_tol, gain=settings.gain, 
@@ -97,10 +111,25 @@ def make_optimizer(settings,vertices,faces):
 
     return opt,lr,vertices,Laplacian
 
-def load_target_mesh(fname,device='cuda'):
-    vertices,faces = load_obj(fname,device=device)
-    vertices = normalize_vertices(vertices)
-    return vertices,faces
+def scheduled_image_size(
+        ref_len:float, #mean reference edge length
+        image_sizes:"list[int]", #descending
+        pixels_per_edge:float,
+        )->int:
+    """smallest image size at which ref_len covers pixels_per_edge pixels, the views of make_star_cameras(distance=10) span 2 units"""
+    for image_size in reversed(image_sizes):
+        if ref_len * image_size / 2 >= pixels_per_edge:
+            return image_size
+    return image_sizes[0]
+
+def load_target_mesh(fname,device=DEVICE,cache:Optional[MeshCache]=None):
+    def load():
+        vertices,faces = load_obj(fname,device=device)
+        vertices = normalize_vertices(vertices)
+        return vertices,faces
+    if cache is None:
+        return load()
+    return cache.load(Path(fname).with_suffix('.obj'),{'loader':'load_obj','normalize':'normalize_vertices','version':OBJ_LOADER_VERSION},load,device=device)
 
 def optimize(settings:OptimizeSettings):
     result = OptimizeResult(settings=settings)
@@ -113,20 +142,36 @@ def optimize(settings:OptimizeSettings):
     mv,proj = make_star_cameras(settings.cameras[0],settings.cameras[1],distance=10,
         image_size=[settings.image_size,settings.image_size],device=settings.device)
 
-    renderer = NormalsRenderer(mv,proj,image_size=[settings.image_size,settings.image_size])
+    image_sizes = [settings.image_size]
+    if settings.min_image_size and settings.method=='ours':
+        while image_sizes[-1]//2 >= settings.min_image_size:
+            image_sizes.append(image_sizes[-1]//2)
+    renderers = {size:NormalsRenderer(mv,proj,image_size=[size,size]) for size in image_sizes}
     
     if settings.target_vertices is None:
-        target_vertices,target_faces =  load_target_mesh(settings.target_fname)
+        target_vertices,target_faces =  load_target_mesh(settings.target_fname,device=settings.device,
+            cache=mesh_cache if settings.mesh_cache else None)
     else:
         target_vertices,target_faces = settings.target_vertices,settings.target_faces
 
     result.target_vertices,result.target_faces = target_vertices,target_faces
 
     target_normals = calc_vertex_normals(target_vertices,target_faces)
-    target_images = renderer.render(target_vertices,target_normals,target_faces)
-
+    def make_targets(size): #target image pyramid level, float32 images or a compact TargetStore
+        renderer = renderers[size]
+        render_targets = lambda: renderer.render(target_vertices,target_normals,target_faces)
+        if settings.target_dtype is None:
+            return render_targets()
+        return load_targets(render_targets,target_vertices,target_faces,mv,proj,[size,size],
+            dtype=getattr(torch,settings.target_dtype),params={'renderer':'NormalsRenderer','backend':renderer.backend},
+            cache=target_cache if settings.target_cache else None,device=settings.device)
+    targets = {size:make_targets(size) for size in image_sizes}
+    writer = AsyncWriter() if settings.save_images else None #png encoding off the optimization loop
     if settings.save_images:
-        save_images(target_images,outdir/'target_images')
+        target_images = targets[settings.image_size]
+        writer.save_images(target_images.get() if isinstance(target_images,TargetStore) else target_images,outdir/'target_images')
+
+    timeline = TimelineWriter(settings.timeline_dir,half=settings.snapshot_half) if settings.timeline_dir else None
 
     opt,lr,vertices,Laplacian = make_optimizer(settings,vertices,faces)
     start = time.time()
@@ -140,12 +185,15 @@ def optimize(settings:OptimizeSettings):
             opt.zero_grad()
 
             normals = calc_vertex_normals(vertices,faces)
-            images = renderer.render(vertices,normals,faces)
-            loss = (images-target_images).abs().mean()
+            if (step-1) % settings.image_size_interval == 0:
+                image_size = settings.image_size if len(image_sizes)==1 else \
+                    scheduled_image_size(opt.mean_ref_len().item(),image_sizes,settings.pixels_per_edge)
+            images = renderers[image_size].render(vertices,normals,faces)
+            loss = mean_abs_error(images,targets[image_size])
 
             if isinstance(opt,torch.optim.Adam):
                 #laplacian regularization
-                loss = loss + (vertices * (Laplacian@vertices)).mean() * settings.laplacian_weight
+                loss = loss + (vertices * laplacian_matmul(Laplacian,vertices)).mean() * settings.laplacian_weight
 
             loss.backward()
 
@@ -159,8 +207,11 @@ def optimize(settings:OptimizeSettings):
             #snapshot
             with torch.no_grad():
                 if (settings.result_interval and step % settings.result_interval == 1) or is_last:
+                    compact = settings.compact_snapshots or timeline is not None
                     if settings.method=='ours':
-                        s = snapshot(opt)
+                        s = snapshot(opt,compact=compact,half=settings.snapshot_half)
+                    elif compact:
+                        s = compact_snapshot(step,time.time()-start,vertices,faces,half=settings.snapshot_half)
                     else:
                         s = Snapshot(
                             step=step,
@@ -168,7 +219,10 @@ def optimize(settings:OptimizeSettings):
                             vertices=vertices.clone().requires_grad_(False),
                             faces=faces.clone(),
                         )
-                    result.snapshots.append(s)
+                    if timeline is not None:
+                        timeline.append(s)
+                    else:
+                        result.snapshots.append(s)
 
             #remesh
             if settings.remesh_interval is not None \
@@ -179,7 +233,7 @@ def optimize(settings:OptimizeSettings):
                     vertices,faces = opt.remesh()
                 else:
                     with torch.no_grad():
-                        edges,_ = calc_edges(faces)
+                        edges,_ = calc_edges(faces,num_vertices=vertices.shape[0])
                         mean_edge_length = calc_edge_length(vertices,edges).mean().item()
                         target_edgelen = mean_edge_length * settings.remesh_ratio
                         target_edgelen = max(target_edgelen, settings.edge_len_lims[0])
@@ -195,7 +249,7 @@ def optimize(settings:OptimizeSettings):
                     is_last = True #mesh collapsed
 
             if settings.save_images:
-                save_images(images,outdir/'images')
+                writer.save_images(images,outdir/'images')
 
             step += 1
             if settings.steps is not None:
@@ -203,4 +257,10 @@ def optimize(settings:OptimizeSettings):
             else:
                 tqdm_.update(min(settings.timeout, round(time.time()-start,3)) - tqdm_.n)
 
+    if writer is not None:
+        writer.close()
+    if timeline is not None:
+        timeline.close()
+        result.snapshots = Timeline(settings.timeline_dir)
+
     return result
\ No newline at end of file
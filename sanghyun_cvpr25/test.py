@@ -1,7 +1,6 @@
 import argparse
 import numpy as np
 import torch
-import nvdiffrast.torch as dr
 import trimesh
 import os
 import imageio
@@ -15,6 +14,9 @@ sys.path.append('..')
 from tqdm import tqdm
 from test_renderer import AlphaRenderer, make_star_cameras, GTInitializer, calc_vertex_normals, import_mesh
 from util.func import make_sphere
+from util.mesh_cache import mesh_cache
+from util.sampler import ViewSampler
+from util.writer import AsyncWriter
 from core.opt import MeshOptimizer
 
 from torch.utils.tensorboard import SummaryWriter
@@ -32,6 +34,10 @@ def save_image(img, path):
         img = Image.fromarray(img)
         img.save(path)
 
+def export_mesh(vertices, faces, path):
+    mesh = trimesh.base.Trimesh(vertices=vertices.numpy(), faces=faces.numpy())
+    mesh.export(path)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='remeshing optimization')
     parser.add_argument('-o', '--out_dir', type=str, default='out')
@@ -41,6 +47,11 @@ if __name__ == "__main__":
     parser.add_argument('-b', '--batch', type=int, default=8)
     parser.add_argument('-lr', '--learning_rate', type=float, default=0.1)
     parser.add_argument('-domain', '--domain', type=float, default=None)
+    parser.add_argument('--backend', type=str, default='auto', choices=['auto', 'nvdiffrast', 'torch'])
+    parser.add_argument('--cull', type=str, default=None, choices=['cw', 'ccw'], help='per view face culling, torch backend only')
+    parser.add_argument('--target_dtype', type=str, default='float32', choices=['float32', 'float16', 'bfloat16', 'uint8'], help='storage of the target images')
+    parser.add_argument('--mesh_cache', action='store_true', help='reuse the parsed and normalized ref_mesh across runs')
+    parser.add_argument('--importance', type=float, default=0., help='0 uniform view sampling, 1 proportional to recent view loss')
     FLAGS = parser.parse_args()
     device = 'cuda:0'
 
@@ -56,9 +67,10 @@ if __name__ == "__main__":
         f.write(str(FLAGS))
 
     writer = SummaryWriter(logdir)
+    async_writer = AsyncWriter()    # image and mesh exports on a background thread
     
     # Load GT mesh
-    gt_verts, gt_faces, gt_normals, gt_colors = import_mesh(FLAGS.ref_mesh, device, scale=DOMAIN)
+    gt_verts, gt_faces, gt_normals, gt_colors = import_mesh(FLAGS.ref_mesh, device, scale=DOMAIN, cache=mesh_cache if FLAGS.mesh_cache else None)
 
     print("===== Ground truth mesh =====")
     print("Number of vertices: ", gt_verts.shape[0])
@@ -77,7 +89,7 @@ if __name__ == "__main__":
     
     mv, proj = make_star_cameras(num_viewpoints, num_viewpoints, distance=2.0, r=0.6, n=1.0, f=3.0)
     proj = proj.unsqueeze(0).expand(mv.shape[0], -1, -1)
-    renderer = AlphaRenderer(mv, proj, [image_size, image_size])
+    renderer = AlphaRenderer(mv, proj, [image_size, image_size], backend=FLAGS.backend, cull=FLAGS.cull)
 
     gt_manager = GTInitializer(gt_verts, gt_faces, DEVICE)
     gt_manager.render(renderer)
@@ -93,12 +105,16 @@ if __name__ == "__main__":
         os.makedirs(image_save_path)
 
     for i in range(len(gt_diffuse_map)):
-        save_image(gt_diffuse_map[i], os.path.join(image_save_path, "diffuse_{}.png".format(i)))
-        save_image(gt_depth_map[i], os.path.join(image_save_path, "depth_{}.png".format(i)))
+        async_writer.submit(save_image, gt_diffuse_map[i], os.path.join(image_save_path, "diffuse_{}.png".format(i)))
+        async_writer.submit(save_image, gt_depth_map[i], os.path.join(image_save_path, "depth_{}.png".format(i)))
 
     '''
     Optimization
     '''
+    sampler = ViewSampler(gt_diffuse_map, gt_depth_map, batch_size=FLAGS.batch, device=DEVICE,
+                          dtype=getattr(torch, FLAGS.target_dtype), importance=FLAGS.importance)
+    del gt_diffuse_map, gt_depth_map
+
     vertices,faces = make_sphere(level=2,radius=.5)
 
     opt = MeshOptimizer(vertices, faces, lr=FLAGS.learning_rate, edge_len_lims=(0.02, 0.15))
@@ -112,7 +128,7 @@ if __name__ == "__main__":
     for i in bar:
         opt.zero_grad()
 
-        batches = torch.randperm(gt_diffuse_map.shape[0])[:FLAGS.batch]
+        batches, (b_gt_diffuse_map, b_gt_depth_map) = sampler.next()
         
         normals = calc_vertex_normals(vertices, faces)
         cols, _ = renderer.forward(vertices, normals, faces, batches)
@@ -120,11 +136,10 @@ if __name__ == "__main__":
         diffuse = cols[..., :3]
         depth = cols[..., [3, 3, 3]]
 
-        b_gt_diffuse_map = gt_diffuse_map[batches].to(DEVICE)
-        b_gt_depth_map = gt_depth_map[batches].to(DEVICE)
-
-        diffuse_loss = (diffuse - b_gt_diffuse_map).abs().mean()
-        depth_loss = (depth - b_gt_depth_map).abs().mean()
+        diffuse_loss = (diffuse - b_gt_diffuse_map).abs().mean(dim=(1, 2, 3))  # per view
+        depth_loss = (depth - b_gt_depth_map).abs().mean(dim=(1, 2, 3))
+        sampler.update(batches, diffuse_loss + depth_loss)
+        diffuse_loss, depth_loss = diffuse_loss.mean(), depth_loss.mean()
 
         loss = diffuse_loss + depth_loss
         loss.backward()
@@ -140,14 +155,12 @@ if __name__ == "__main__":
             writer.add_scalar('depth_loss', depth_loss.item(), i)
 
         if i % 200 == 0:
-            with torch.no_grad():
-                mesh = trimesh.base.Trimesh(vertices=vertices.cpu().numpy(), faces=faces.cpu().numpy())
-                mesh.export(os.path.join(logdir, "iter_{}.obj".format(i)))
+            async_writer.submit(export_mesh, vertices, faces, os.path.join(logdir, "iter_{}.obj".format(i)))
 
     end_time = time.time()
     with open(os.path.join(logdir, "time.txt"), 'w') as f:
         f.write("Time: {:.6f} sec".format(end_time - start_time))
 
-    with torch.no_grad():
-        final_mesh = trimesh.base.Trimesh(vertices=vertices.cpu().numpy(), faces=faces.cpu().numpy())
-        final_mesh.export(os.path.join(logdir, "final_mesh.obj"))
\ No newline at end of file
+    sampler.close()
+    async_writer.submit(export_mesh, vertices, faces, os.path.join(logdir, "final_mesh.obj"))
+    async_writer.close()
\ No newline at end of file
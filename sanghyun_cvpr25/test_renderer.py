@@ -1,7 +1,13 @@
+from functools import partial
 import torch as th
-import nvdiffrast.torch as dr
+try:
+    import nvdiffrast.torch as dr
+except ImportError:
+    dr = None
 from torch.utils.tensorboard import SummaryWriter
 import trimesh
+from util import rasterize
+from util.render import get_backend
 
 LIGHT_DIR = [0., 0., -1.]    #3
 
@@ -73,22 +79,35 @@ def _warmup(glctx):
 
 class NormalsRenderer:
     
-    _glctx:dr.RasterizeGLContext = None
+    _glctx = None
     
     def __init__(
             self,
             mv: th.Tensor, #C,4,4
             proj: th.Tensor, #C,4,4
             image_size: "tuple[int,int]",
+            backend: str = 'auto', #'nvdiffrast', 'torch' or 'auto', see util.render.get_backend()
+            cull: str = None, #None, 'cw' or 'ccw', faces culled per view by the torch backend, see util.rasterize
             ):
         self._mvp = proj @ mv #C,4,4
         self._image_size = image_size
+        self._backend = get_backend(backend)
+        if self._backend=='torch':
+            self._rasterize = partial(rasterize.rasterize,cull=cull)
+            self._interpolate = rasterize.interpolate
+            self._antialias = rasterize.antialias
+            return
+        if cull is not None:
+            raise ValueError('face culling requires the torch render backend')
         try:
             self._glctx = dr.RasterizeGLContext()
         except Exception as e:
             print("Could not use GL rasterizer, falling back to CUDA rasterizer.")
             self._glctx = dr.RasterizeCudaContext()
         _warmup(self._glctx)
+        self._rasterize = partial(dr.rasterize,self._glctx,grad_db=False)
+        self._interpolate = dr.interpolate
+        self._antialias = dr.antialias
 
     def render(self,
             vertices: th.Tensor, #V,3 float
@@ -100,12 +119,12 @@ class NormalsRenderer:
         faces = faces.type(th.int32)
         vert_hom = th.cat((vertices, th.ones(V,1,device=vertices.device)),axis=-1) #V,3 -> V,4
         vertices_clip = vert_hom @ self._mvp.transpose(-2,-1) #C,V,4
-        rast_out,_ = dr.rasterize(self._glctx, vertices_clip, faces, resolution=self._image_size, grad_db=False) #C,H,W,4
+        rast_out,_ = self._rasterize(vertices_clip, faces, resolution=self._image_size) #C,H,W,4
         vert_col = (normals+1)/2 #V,3
-        col,_ = dr.interpolate(vert_col, rast_out, faces) #C,H,W,3
+        col,_ = self._interpolate(vert_col, rast_out, faces) #C,H,W,3
         alpha = th.clamp(rast_out[..., -1:], max=1) #C,H,W,1
         col = th.concat((col,alpha),dim=-1) #C,H,W,4
-        col = dr.antialias(col, rast_out, vertices_clip, faces) #C,H,W,4
+        col = self._antialias(col, rast_out, vertices_clip, faces) #C,H,W,4
         return col #C,H,W,4
 
 def calc_face_normals(
@@ -160,8 +179,10 @@ class AlphaRenderer(NormalsRenderer):
             mv: th.Tensor, #C,4,4
             proj: th.Tensor, #C,4,4
             image_size: "tuple[int,int]",
+            backend: str = 'auto',
+            cull: str = None,
             ):
-        super().__init__(mv,proj,image_size)
+        super().__init__(mv,proj,image_size,backend,cull)
         self._mv = mv
         self._proj = proj
 
@@ -185,11 +206,9 @@ class AlphaRenderer(NormalsRenderer):
         faces = faces.type(th.int32)
         vert_hom = th.cat((verts, th.ones(V,1,device=verts.device)),axis=-1) #V,3 -> V,4
         verts_clip = vert_hom @ mvp.transpose(-2,-1) #C,V,4
-        rast_out,_ = dr.rasterize(self._glctx, 
-                                verts_clip, 
+        rast_out,_ = self._rasterize(verts_clip, 
                                 faces, 
-                                resolution=self._image_size, 
-                                grad_db=False) #C,H,W,4
+                                resolution=self._image_size) #C,H,W,4
 
         # view space normal;
         vert_normals_hom = th.cat((normals, th.zeros(V,1,device=verts.device)),axis=-1) #V,3 -> V,4
@@ -206,7 +225,7 @@ class AlphaRenderer(NormalsRenderer):
         lightdir = lightdir.view((1, 1, 1, 3)) #1,1,1,3
 
         # normal;
-        pixel_normals_view, _ = dr.interpolate(vert_normals_view, rast_out, faces)  #C,H,W,3
+        pixel_normals_view, _ = self._interpolate(vert_normals_view, rast_out, faces)  #C,H,W,3
         pixel_normals_view = pixel_normals_view / th.clamp(th.norm(pixel_normals_view, p=2, dim=-1, keepdim=True), min=1e-5)
         diffuse = th.sum(lightdir * pixel_normals_view, -1, keepdim=True)           #C,H,W,1
         diffuse = th.clamp(diffuse, min=0.0, max=1.0)
@@ -214,7 +233,7 @@ class AlphaRenderer(NormalsRenderer):
 
         # depth;
         verts_depth = (verts_clip[..., [2]] / verts_clip[..., [3]])     #C,V,1
-        depth, _ = dr.interpolate(verts_depth, rast_out, faces) #C,H,W,1    range: [-1, 1], -1 is near, 1 is far
+        depth, _ = self._interpolate(verts_depth, rast_out, faces) #C,H,W,1    range: [-1, 1], -1 is near, 1 is far
         depth = (depth + 1.) * 0.5      # since depth in [-1, 1], normalize to [0, 1]
         
         depth[rast_out[..., -1] == 0] = 1.0         # exclude background;
@@ -227,7 +246,7 @@ class AlphaRenderer(NormalsRenderer):
         alpha = th.clamp(rast_out[..., [-1]], max=1) #C,H,W,1
         
         col = th.concat((diffuse, depth, alpha),dim=-1) #C,H,W,5
-        col = dr.antialias(col, rast_out, verts_clip, faces) #C,H,W,5
+        col = self._antialias(col, rast_out, verts_clip, faces) #C,H,W,5
         return col, depth_info
 
 class GTInitializer:
@@ -280,28 +299,38 @@ class GTInitializer:
         return self.gt_images[...,[-1,-1,-1]]
 
 
-def import_mesh(fname, device, scale=0.8):
-    if fname.endswith(".obj"):
-        target_mesh = trimesh.load_mesh(fname, 'obj')
-    elif fname.endswith(".stl"):
-        target_mesh = trimesh.load_mesh(fname, 'stl')    
-    elif fname.endswith(".ply"):
-        target_mesh = trimesh.load_mesh(fname, 'ply')
-    else:
-        raise ValueError(f"unknown mesh file type: {fname}")
+def import_mesh(fname, device, scale=0.8, cache=None):
+    '''
+    Optional cache (util.mesh_cache.MeshCache) skips parsing and normalization of previously loaded files.
+    '''
+    def load():
+        if fname.endswith(".obj"):
+            target_mesh = trimesh.load_mesh(fname, 'obj')
+        elif fname.endswith(".stl"):
+            target_mesh = trimesh.load_mesh(fname, 'stl')    
+        elif fname.endswith(".ply"):
+            target_mesh = trimesh.load_mesh(fname, 'ply')
+        else:
+            raise ValueError(f"unknown mesh file type: {fname}")
 
-    target_vertices, target_faces = target_mesh.vertices,target_mesh.faces
-    target_vertices, target_faces = \
-        th.tensor(target_vertices, dtype=th.float32, device=device), \
-        th.tensor(target_faces, dtype=th.long, device=device)
-    
-    # normalize to fit mesh into a sphere of radius [scale];
-    if scale > 0:
-        target_vertices = target_vertices - target_vertices.mean(dim=0, keepdim=True)
-        max_norm = th.max(th.norm(target_vertices, dim=-1)) + 1e-6
-        target_vertices = (target_vertices / max_norm) * scale
+        target_vertices, target_faces = target_mesh.vertices,target_mesh.faces
+        target_vertices, target_faces = \
+            th.tensor(target_vertices, dtype=th.float32), \
+            th.tensor(target_faces, dtype=th.long)
+        
+        # normalize to fit mesh into a sphere of radius [scale];
+        if scale > 0:
+            target_vertices = target_vertices - target_vertices.mean(dim=0, keepdim=True)
+            max_norm = th.max(th.norm(target_vertices, dim=-1)) + 1e-6
+            target_vertices = (target_vertices / max_norm) * scale
+        return target_vertices, target_faces
+
+    if cache is None:
+        target_vertices, target_faces = load()
+    else:
+        target_vertices, target_faces = cache.load(fname, {'loader': 'trimesh', 'trimesh': trimesh.__version__, 'normalize': 'mean_max_norm', 'scale': scale}, load)
+    target_vertices, target_faces = target_vertices.to(device), target_faces.to(device)
 
-    vertex_normals = th.tensor(target_mesh.vertex_normals, dtype=th.float32, device=device)
     vertex_colors = th.ones_like(target_vertices)
     
     ### get duplicate verts and define vertex normal from face normals
@@ -0,0 +1,53 @@
+import os
+from pathlib import Path
+from typing import Callable
+import numpy as np
+
+def save_npy(path:Path,array:np.ndarray):
+    with open(path,'wb') as file:
+        np.save(file,array)
+
+class DiskCache:
+    """
+    base of the on-disk caches, files are written atomically and the least recently used ones are evicted above max_bytes.
+    Subclasses mark hits with touch() and list their entry files in _entry_patterns, temporary files are never evicted.
+    """
+
+    _entry_patterns = ('*.npy',)
+
+    def __init__(self,cache_dir:Path,max_bytes:int):
+        self._dir = Path(cache_dir)
+        self._max_bytes = max_bytes
+
+    def write(self,path:Path,write:Callable[[Path],None]):
+        """write to a temporary file and rename, concurrent readers never see partial files"""
+        path.parent.mkdir(parents=True,exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        write(tmp_path)
+        os.replace(tmp_path,path)
+
+    def touch(self,*paths:Path):
+        """mark as recently used, raises FileNotFoundError on a miss"""
+        for path in paths:
+            os.utime(path)
+
+    def evict(self):
+        """remove least recently used files until the cache is below max_bytes"""
+        files = []
+        for pattern in self._entry_patterns:
+            for f in self._dir.glob(pattern):
+                try:
+                    files.append((f.stat(),f))
+                except FileNotFoundError: #evicted by another process
+                    pass
+        size = sum(stat.st_size for stat,_ in files)
+        for stat,f in sorted(files,key=lambda s: s[0].st_mtime_ns):
+            if size<=self._max_bytes:
+                break
+            f.unlink(missing_ok=True)
+            size -= stat.st_size
+
+    def clear(self):
+        for f in self._dir.glob('**/*'):
+            if f.is_file():
+                f.unlink(missing_ok=True)
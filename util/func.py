@@ -6,6 +6,8 @@ import re
 import trimesh
 import imageio
 
+DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu' #default device, first available backend
+
 def to_numpy(*args):
     def convert(a):
         if isinstance(a,torch.Tensor):
@@ -15,6 +17,22 @@ def to_numpy(*args):
     
     return convert(args[0]) if len(args)==1 else tuple(convert(a) for a in args)
 
+def to_host(
+        x:torch.Tensor,
+        dtype:torch.dtype=None,
+        )->torch.Tensor:
+    """
+    detached host copy, optionally converted to dtype on the source device first.
+    Copies from cuda go to pinned memory and are non-blocking, synchronize before reading them.
+    """
+    x = x.detach()
+    if dtype is not None:
+        x = x.to(dtype)
+    if x.is_cuda:
+        host = torch.empty(x.shape,dtype=x.dtype,pin_memory=True)
+        return host.copy_(x,non_blocking=True)
+    return x.clone()
+
 def save_obj(
         vertices:torch.Tensor,
         faces:torch.Tensor,
@@ -30,97 +48,189 @@ def save_obj(
     with open(obj_path, 'w') as file:
         file.write(bytes_io.getvalue().decode('UTF-8'))
 
+OBJ_CHUNK_SIZE = 1<<24 #bytes read and parsed at a time by load_obj()
+OBJ_LOADER_VERSION = 2 #part of util.mesh_cache keys, bump when load_obj() or normalize_vertices() results change
+
+_obj_attrib_re = re.compile(rb"/\S*") #vt and vn indices of v/vt, v/vt/vn and v//vn
+
+class _GrowingBuffer:
+    """numpy buffer with amortized appends"""
+    def __init__(self,dtype,capacity=1<<16):
+        self._data = np.empty(capacity,dtype=dtype)
+        self._size = 0
+
+    def append(self,values:np.ndarray):
+        size = self._size + values.shape[0]
+        if size > self._data.shape[0]:
+            data = np.empty(max(size,2*self._data.shape[0]),dtype=self._data.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+        self._data[self._size:size] = values
+        self._size = size
+
+    @property
+    def data(self)->np.ndarray:
+        return self._data[:self._size]
+
+def _select_obj_lines(text:np.ndarray,keywords:np.ndarray,starts:np.ndarray,lengths:np.ndarray,mask:np.ndarray)->bytes:
+    """concatenated lines where mask is set, the keyword char at keywords is replaced by a space"""
+    text = text.copy()
+    text[keywords[mask]] = ord(' ')
+    return text[np.repeat(mask,lengths)].tobytes()
+
+def _parse_obj_faces(text:bytes,count:int)->np.ndarray: #F,3 long, 1-based, polygons fan triangulated
+    text = _obj_attrib_re.sub(b'',text)
+    try:
+        corners = np.loadtxt(io.BytesIO(text),dtype=np.int64,ndmin=2) #count,N
+        if corners.shape[1]==3: #only triangles
+            return corners
+        counts = np.full(count,corners.shape[1])
+        corners = corners.reshape(-1)
+    except ValueError: #polygons of different sizes
+        corners = np.array(text.split(),dtype=np.int64)
+        counts = np.array([len(line.split()) for line in text.splitlines()]) #count
+    starts = np.cumsum(counts) - counts
+    tri_counts = counts - 2
+    first = np.repeat(starts,tri_counts) #T
+    k = np.arange(tri_counts.sum()) - np.repeat(np.cumsum(tri_counts)-tri_counts,tri_counts) + 1 #T
+    return np.stack((corners[first],corners[first+k],corners[first+k+1]),axis=-1)
+
+def _parse_obj(text:bytes,vertices:_GrowingBuffer,faces:_GrowingBuffer):
+    """parse complete lines, v and f lines are found by their first two non-blank bytes and tokenized by numpy"""
+    if not text:
+        return
+    a = np.frombuffer(text,dtype=np.uint8)
+    starts = np.flatnonzero(a[:-1]==ord('\n')) + 1
+    starts = np.concatenate(([0],starts[starts<a.shape[0]])) #L
+    lengths = np.diff(starts,append=a.shape[0]) #L
+    ends = starts + lengths - 1 #L, last byte
+    first = starts.copy() #L, after leading blanks
+    indented = np.flatnonzero((a[starts]==ord(' ')) | (a[starts]==ord('\t')))
+    while indented.shape[0]: #one pass per blank, usually none
+        indented = indented[first[indented]<ends[indented]]
+        first[indented] += 1
+        c = a[first[indented]]
+        indented = indented[(c==ord(' ')) | (c==ord('\t'))]
+    second = a[np.minimum(first+1,a.shape[0]-1)] #L
+    keyword = np.where((second==ord(' ')) | (second==ord('\t')),a[first],0) #L
+
+    is_vertex = keyword==ord('v') #L
+    if is_vertex.any():
+        lines = io.BytesIO(_select_obj_lines(a,first,starts,lengths,is_vertex))
+        vertices.append(np.loadtxt(lines,dtype=np.float32,usecols=(0,1,2),ndmin=2).reshape(-1)) #ignores w and colors
+
+    is_face = keyword==ord('f') #L
+    count = int(is_face.sum())
+    if count:
+        faces.append(_parse_obj_faces(_select_obj_lines(a,first,starts,lengths,is_face),count).reshape(-1))
+
 def load_obj(
         filename:Path, 
-        device='cuda'
+        device=DEVICE,
+        chunk_size:int=OBJ_CHUNK_SIZE,
         ) -> "tuple[torch.Tensor,torch.Tensor]":
+    """
+    streaming OBJ reader, parses chunk_size bytes at a time so memory is bounded by the chunk and the result,
+    faces may use v, v/vt, v/vt/vn and v//vn corners, polygons are fan triangulated
+    """
     filename = Path(filename)
     obj_path = filename.with_suffix('.obj')
-    with open(obj_path) as file:
-        obj_text = file.read()
-    num = r"([0-9\.\-eE]+)"
-    v = re.findall(f"(v {num} {num} {num})",obj_text)
-    vertices = np.array(v)[:,1:].astype(np.float32)
-    all_faces = []
-    f = re.findall(f"(f {num} {num} {num})",obj_text)
-    if f:
-        all_faces.append(np.array(f)[:,1:].astype(np.long).reshape(-1,3,1)[...,:1])
-    f = re.findall(f"(f {num}/{num} {num}/{num} {num}/{num})",obj_text)
-    if f:
-        all_faces.append(np.array(f)[:,1:].astype(np.long).reshape(-1,3,2)[...,:2])
-    f = re.findall(f"(f {num}/{num}/{num} {num}/{num}/{num} {num}/{num}/{num})",obj_text)
-    if f:
-        all_faces.append(np.array(f)[:,1:].astype(np.long).reshape(-1,3,3)[...,:2])
-    f = re.findall(f"(f {num}//{num} {num}//{num} {num}//{num})",obj_text)
-    if f:
-        all_faces.append(np.array(f)[:,1:].astype(np.long).reshape(-1,3,2)[...,:1])
-    all_faces = np.concatenate(all_faces,axis=0)
-    all_faces -= 1 #1-based indexing
-    faces = all_faces[:,:,0]
+    vertices = _GrowingBuffer(np.float32)
+    faces = _GrowingBuffer(np.int64)
+
+    with open(obj_path,'rb') as file:
+        rest = b''
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            end = chunk.rfind(b'\n') + 1 #parse complete lines only
+            _parse_obj(chunk[:end],vertices,faces)
+            rest = chunk[end:]
+        _parse_obj(rest,vertices,faces)
+
+    vertices = vertices.data.reshape(-1,3)
+    faces = faces.data.reshape(-1,3) - 1 #1-based indexing
 
     vertices = torch.tensor(vertices,dtype=torch.float32,device=device)
     faces = torch.tensor(faces,dtype=torch.long,device=device)
 
     return vertices,faces
 
+PLY_ASCII_CHUNK = 1<<16 #rows formatted at a time by the ascii writer
+
 def save_ply(
         filename:Path,
         vertices:torch.Tensor, #V,3
         faces:torch.Tensor, #F,3
-        vertex_colors:torch.Tensor=None, #V,3
+        vertex_colors:torch.Tensor=None, #V,3 in [0,1]
         vertex_normals:torch.Tensor=None, #V,3
+        binary:bool=True, #binary little endian, or ascii
         ):
-        
     filename = Path(filename).with_suffix('.ply')
-    vertices,faces,vertex_colors = to_numpy(vertices,faces,vertex_colors)
+    vertices,faces,vertex_colors,vertex_normals = to_numpy(vertices,faces,vertex_colors,vertex_normals)
     assert np.all(np.isfinite(vertices)) and faces.min()==0 and faces.max()==vertices.shape[0]-1
+    V = vertices.shape[0]
+    F = faces.shape[0]
 
-    header = 'ply\nformat ascii 1.0\n'
-
-    header += 'element vertex ' + str(vertices.shape[0]) + '\n'
-    header += 'property double x\n'
-    header += 'property double y\n'
-    header += 'property double z\n'
-
+    # vertex and face elements as structured arrays, fields in header order
+    vertex_fields = [('x','<f4'),('y','<f4'),('z','<f4')]
     if vertex_normals is not None:
-        header += 'property double nx\n'
-        header += 'property double ny\n'
-        header += 'property double nz\n'
-
+        assert vertex_normals.shape[0] == V
+        vertex_fields += [('nx','<f4'),('ny','<f4'),('nz','<f4')]
+    if vertex_colors is not None:
+        assert vertex_colors.shape[0] == V
+        vertex_fields += [('red','u1'),('green','u1'),('blue','u1')]
+    vertex_data = np.empty(V,dtype=vertex_fields)
+    vertex_data['x'],vertex_data['y'],vertex_data['z'] = vertices.T
+    if vertex_normals is not None:
+        vertex_data['nx'],vertex_data['ny'],vertex_data['nz'] = vertex_normals.T
     if vertex_colors is not None:
-        assert vertex_colors.shape[0] == vertices.shape[0]
-        color = (vertex_colors*255).astype(np.uint8)
-        header += 'property uchar red\n'
-        header += 'property uchar green\n'
-        header += 'property uchar blue\n'
-
-    header += 'element face ' + str(faces.shape[0]) + '\n'
-    header += 'property list int int vertex_indices\n'
+        vertex_data['red'],vertex_data['green'],vertex_data['blue'] = (vertex_colors*255).astype(np.uint8).T
+
+    face_data = np.empty(F,dtype=[('count','u1'),('vertex_indices','<i4',(3,))])
+    face_data['count'] = 3
+    face_data['vertex_indices'] = faces
+
+    ply_types = {'<f4':'float','u1':'uchar'}
+    header = 'ply\n'
+    header += f'format {"binary_little_endian" if binary else "ascii"} 1.0\n'
+    header += f'element vertex {V}\n'
+    header += ''.join(f'property {ply_types[t]} {name}\n' for name,t in vertex_fields)
+    header += f'element face {F}\n'
+    header += 'property list uchar int vertex_indices\n'
     header += 'end_header\n'
 
+    if binary:
+        with open(filename, 'wb') as file:
+            file.write(header.encode('ascii'))
+            vertex_data.tofile(file)
+            face_data.tofile(file)
+        return
+
+    vertex_columns = np.stack([vertex_data[name].astype(np.float64) for name,_ in vertex_fields],axis=-1) #V,C
+    vertex_fmt = ' '.join('%.9g' if t=='<f4' else '%d' for _,t in vertex_fields) + '\n'
+    face_columns = np.concatenate((np.full((F,1),3),faces),axis=-1) #F,4
     with open(filename, 'w') as file:
         file.write(header)
+        # one % formatting per chunk of rows instead of one per value
+        for columns,fmt in [(vertex_columns,vertex_fmt),(face_columns,'%d %d %d %d\n')]:
+            for start in range(0,columns.shape[0],PLY_ASCII_CHUNK):
+                chunk = columns[start:start+PLY_ASCII_CHUNK]
+                file.write((fmt*chunk.shape[0]) % tuple(chunk.ravel().tolist()))
 
-        for i in range(vertices.shape[0]):
-            s = f"{vertices[i,0]} {vertices[i,1]} {vertices[i,2]}"    
-            if vertex_normals is not None:
-                s += f" {vertex_normals[i,0]} {vertex_normals[i,1]} {vertex_normals[i,2]}"
-            if vertex_colors is not None:
-                s += f" {color[i,0]:03d} {color[i,1]:03d} {color[i,2]:03d}"
-            file.write(s+'\n')
-        
-        for i in range(faces.shape[0]):
-            file.write(f"3 {faces[i,0]} {faces[i,1]} {faces[i,2]}\n")
-    full_verts = vertices[faces] #F,3,3
-    
 def save_images(
-        images:torch.Tensor, #B,H,W,CH
+        images:torch.Tensor, #B,H,W,CH float in [0,1] or uint8
         dir:Path,
         ):
     dir = Path(dir)
     dir.mkdir(parents=True,exist_ok=True)
+    if images.dtype!=torch.uint8:
+        images = (images.detach()[...,:3]*255).clamp(max=255).type(torch.uint8)
+    images = images[...,:3].cpu().numpy()
     for i in range(images.shape[0]):
-        imageio.imwrite(dir/f'{i:02d}.png',(images.detach()[i,:,:,:3]*255).clamp(max=255).type(torch.uint8).cpu().numpy())
+        imageio.imwrite(dir/f'{i:02d}.png',images[i])
 
 def normalize_vertices(
         vertices:torch.Tensor, #V,3
@@ -133,23 +243,39 @@ def normalize_vertices(
 def laplacian(
         num_verts:int,
         edges: torch.Tensor #E,2
-        ) -> torch.Tensor: #sparse V,V
-    """create sparse Laplacian matrix"""
+        ) -> torch.Tensor: #sparse CSR V,V
+    """create sparse Laplacian matrix D-A in CSR format, the degrees are stored on the diagonal"""
     V = num_verts
     E = edges.shape[0]
+    edges = edges.type(torch.long)
+    diagonal = torch.arange(V, device=edges.device)
+
+    rows = torch.cat([edges[:,0], edges[:,1], diagonal])
+    cols = torch.cat([edges[:,1], edges[:,0], diagonal])
+    deg = torch.bincount(edges.flatten(), minlength=V).type(torch.float32)
+    values = torch.cat([torch.full((2*E,), -1., device=edges.device), deg])
+
+    _,order = torch.sort(rows * V + cols)
+    crow = torch.zeros(V+1, dtype=torch.long, device=edges.device)
+    torch.cumsum(torch.bincount(rows, minlength=V), dim=0, out=crow[1:])
+    return torch.sparse_csr_tensor(crow, cols[order], values[order], (V, V))
 
-    #adjacency matrix,
-    idx = torch.cat([edges, edges.fliplr()], dim=0).type(torch.long).T  # (2, 2*E)
-    ones = torch.ones(2*E, dtype=torch.float32, device=edges.device)
-    A = torch.sparse.FloatTensor(idx, ones, (V, V))
+class _SymmetricMatmul(torch.autograd.Function):
+    @staticmethod
+    def forward(ctx, L, x):
+        ctx.L = L
+        return L @ x
 
-    #degree matrix
-    deg = torch.sparse.sum(A, dim=1).to_dense()
-    idx = torch.arange(V, device=edges.device)
-    idx = torch.stack([idx, idx], dim=0)
-    D = torch.sparse.FloatTensor(idx, deg, (V, V))
+    @staticmethod
+    def backward(ctx, grad):
+        return None, ctx.L @ grad #L is symmetric, no transpose
 
-    return D - A
+def laplacian_matmul(
+        L:torch.Tensor, #sparse V,V from laplacian()
+        x:torch.Tensor, #V,C
+        ) -> torch.Tensor: #V,C
+    """L @ x, single sparse matvec in forward and backward"""
+    return _SymmetricMatmul.apply(L, x)
 
 def _translation(x, y, z, device):
     return torch.tensor([[1., 0, 0, x],
@@ -174,7 +300,7 @@ def _projection(r, device, l=None, t=None, b=None, n=1.0, f=50.0, flip_y=True):
     p[3,2] = -1
     return p #4,4
 
-def make_star_cameras(az_count,pol_count,distance:float=10.,r=None,image_size=[512,512],device='cuda'):
+def make_star_cameras(az_count,pol_count,distance:float=10.,r=None,image_size=[512,512],device=DEVICE):
     if r is None:
         r = 1/distance
     A = az_count
@@ -202,7 +328,7 @@ def make_star_cameras(az_count,pol_count,distance:float=10.,r=None,image_size=[5
 
     return mv, _projection(r,device)
 
-def make_sphere(level:int=2,radius=1.,device='cuda') -> "tuple[torch.Tensor,torch.Tensor]":
+def make_sphere(level:int=2,radius=1.,device=DEVICE) -> "tuple[torch.Tensor,torch.Tensor]":
     sphere = trimesh.creation.icosphere(subdivisions=level, radius=1.0, color=None)
     vertices = torch.tensor(sphere.vertices, device=device, dtype=torch.float32) * radius
     faces = torch.tensor(sphere.faces, device=device, dtype=torch.long)
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable
+import numpy as np
+import torch
+from util.disk_cache import DiskCache, save_npy
+
+DEFAULT_CACHE_DIR = Path(os.environ.get('MESH_CACHE_DIR','out/mesh_cache'))
+DEFAULT_MAX_BYTES = 4<<30
+
+class MeshCache(DiskCache):
+    """
+    on-disk cache of parsed and normalized meshes, keyed by file content hash and load parameters.
+    Arrays are stored as .npy files and memory mapped copy-on-write on load, so a hit costs neither parsing nor copying.
+    Content hashes are remembered per (path,size,mtime), least recently used entries are evicted above max_bytes.
+    Callers tag params with their loader and normalization versions so that changed code never hits stale entries.
+    """
+
+    version = 1 #storage layout, part of every key
+
+    def __init__(self,cache_dir:Path=DEFAULT_CACHE_DIR,max_bytes:int=DEFAULT_MAX_BYTES):
+        super().__init__(cache_dir,max_bytes)
+
+    def _content_hash(self,filename:Path)->str:
+        stat = filename.stat()
+        stat_key = hashlib.sha1(f'{filename.resolve()}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+        stat_path = self._dir/'hash'/stat_key
+        if stat_path.exists():
+            return stat_path.read_text()
+        h = hashlib.blake2b(digest_size=20)
+        with open(filename,'rb') as file:
+            while chunk := file.read(1<<24):
+                h.update(chunk)
+        content_hash = h.hexdigest()
+        self.write(stat_path,lambda path: path.write_text(content_hash))
+        return content_hash
+
+    def key(self,filename:Path,params:dict)->str:
+        params = json.dumps(params,sort_keys=True)
+        return hashlib.sha1(f'{self.version}:{self._content_hash(Path(filename))}:{params}'.encode()).hexdigest()
+
+    def load(
+            self,
+            filename:Path,
+            params:dict, #everything besides the file content that changes the result, e.g. loader version and normalization
+            load:Callable[[],"tuple[torch.Tensor,torch.Tensor]"], #called on a miss, returns vertices V,3 and faces F,3
+            device='cpu',
+            )->"tuple[torch.Tensor,torch.Tensor]":
+        key = self.key(filename,params)
+        vertices_path = self._dir/f'{key}.vertices.npy'
+        faces_path = self._dir/f'{key}.faces.npy'
+
+        try:
+            self.touch(vertices_path,faces_path)
+            vertices = torch.from_numpy(np.load(vertices_path,mmap_mode='c'))
+            faces = torch.from_numpy(np.load(faces_path,mmap_mode='c'))
+            return vertices.to(device),faces.to(device)
+        except FileNotFoundError: #miss or evicted by another process
+            pass
+
+        vertices,faces = load()
+        self.write(faces_path,lambda path: save_npy(path,faces.cpu().numpy()))
+        self.write(vertices_path,lambda path: save_npy(path,vertices.detach().cpu().numpy()))
+        self.evict()
+        return vertices.to(device),faces.to(device)
+
+mesh_cache = MeshCache()
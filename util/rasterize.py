@@ -0,0 +1,301 @@
+"""
+vectorized torch stand-in for nvdiffrast.torch rasterize(), interpolate() and antialias(), see util.render
+
+same conventions as nvdiffrast
+- pos C,V,4 clip space, tri F,3
+- rast C,H,W,4 = (u,v,z/w,triangle_id+1), all zero for background,
+  u,v are the perspective correct barycentrics of corners 0 and 1 and differentiable wrt pos
+- pixel (row,col) is centered at ndc ((col+.5)/W*2-1,(row+.5)/H*2-1), row 0 at y=-1
+
+differences
+- triangles with a vertex behind the camera (w<=0) are dropped instead of clipped
+- antialias() finds the silhouette edge between two pixel centers by walking across the triangles
+  on the segment between them instead of looking only at the two triangles seen at the centers
+"""
+
+import torch
+from core.kernels import parallel_map
+from core.remesh import calc_edges
+
+MAX_CANDIDATES = 2**20 #covered pixel candidates per chunk, bounds the temporary memory of rasterize()
+TILE_SIZE = 16 #pixels per side of the screen tiles rasterize() bins triangles into
+MAX_WALK = 16 #triangles antialias() crosses from a pixel center in search of the silhouette edge
+
+_topology_cache = None #tri,face_to_edge,edge_faces
+
+def _cross2(a:torch.Tensor,b:torch.Tensor)->torch.Tensor: #...,2 -> ...
+    return a[...,0]*b[...,1] - a[...,1]*b[...,0]
+
+def _to_pixels(
+        pos:torch.Tensor, #...,4 clip space
+        resolution:"tuple[int,int]",
+        )->torch.Tensor: #...,2 x,y in pixel units, pixel centers at i+.5
+    H,W = resolution
+    xy = pos[...,:2] / pos[...,3:]
+    return torch.stack(((xy[...,0]+1)*(W/2),(xy[...,1]+1)*(H/2)),dim=-1)
+
+def _cull_faces(
+        pos:torch.Tensor, #V,4 clip space of one view
+        tri:torch.Tensor, #F,3 long
+        resolution:"tuple[int,int]",
+        cull:str=None, #None, 'cw' or 'ccw', ndc winding of the faces to drop
+        )->"tuple[torch.Tensor,torch.Tensor,torch.Tensor,torch.Tensor]": #face F', corners F',3,2, lo F',2, hi F',2
+    """
+    faces that may cover a pixel center with their corners in pixel units and on screen pixel bounding boxes.
+    Drops faces outside the view frustum, behind the camera, degenerate or between pixel centers and,
+    with cull, faces of the given winding. make_star_cameras() flips y, its back faces are 'ccw'.
+    """
+    H,W = resolution
+    xyz,w = pos[:,:3],pos[:,3:] #V,3 V,1
+    bits = 2**torch.arange(6,device=pos.device) #one bit per clip plane
+    outcode = (torch.cat((xyz>w,xyz<-w),dim=-1)*bits).sum(dim=-1) #V
+    codes = outcode[tri] #F,3
+    valid = (codes[:,0] & codes[:,1] & codes[:,2]) == 0 #F, not all corners beyond the same clip plane
+    valid.logical_and_((w[:,0]>0)[tri].all(dim=-1))
+    face = valid.nonzero()[:,0] #F'
+
+    corners = _to_pixels(pos,resolution)[tri[face]] #F',3,2
+    area = _cross2(corners[:,1]-corners[:,0],corners[:,2]-corners[:,0]) #F', doubled signed area
+    valid = area<0 if cull=='ccw' else area>0 if cull=='cw' else area!=0
+    # pixel bounding boxes, pixel i is covered if its center i+.5 lies in the triangle
+    lo = (corners.amin(dim=1)-.5).ceil_() #F',2
+    hi = (corners.amax(dim=1)-.5).floor_() #F',2
+    lo = torch.maximum(lo,torch.zeros(2,device=pos.device)).long()
+    hi = torch.minimum(hi,torch.tensor([W-1,H-1],device=pos.device)).long()
+    valid.logical_and_((lo<=hi).all(dim=-1))
+    return face[valid],corners[valid],lo[valid],hi[valid]
+
+def _rasterize_view(
+        pos:torch.Tensor, #V,4 clip space
+        tri:torch.Tensor, #F,3 long
+        resolution:"tuple[int,int]",
+        cull:str=None,
+        )->torch.Tensor: #H,W long triangle_id+1, 0 for background
+    H,W = resolution
+    device = pos.device
+
+    face,corners,lo,hi = _cull_faces(pos,tri,resolution,cull) #F' F',3,2 F',2 F',2
+    corner_z = (pos[:,2]/pos[:,3])[tri[face]] #F',3
+
+    # barycentrics and depth as linear functions of the pixel offset from the bounding box corner lo+.5,
+    # a single gather per candidate pixel
+    rel = corners - (lo.type(corners.dtype)+.5)[:,None] #F',3,2
+    area = _cross2(rel[:,1]-rel[:,0],rel[:,2]-rel[:,0]) #F'
+    c1 = rel.roll(-1,dims=1) #F',3,2 edge opposite corner k from corner k+1 to k+2
+    d = rel.roll(-2,dims=1) - c1
+    coef = torch.stack((-d[...,1],d[...,0],-_cross2(d,c1)),dim=-1) / area[:,None,None] #F',3,3 x,y,1 for each barycentric
+    coef = torch.cat((coef,(coef*corner_z[...,None]).sum(dim=1,keepdim=True)),dim=1) #F',4,3 and depth
+
+    # bin into screen tiles, a (tile,face) pair covers the part of the bounding box inside the tile
+    tile_lo = lo.div(TILE_SIZE,rounding_mode='floor') #F',2
+    tile_size = hi.div(TILE_SIZE,rounding_mode='floor')-tile_lo+1 #F',2
+    tile_counts = tile_size[:,0]*tile_size[:,1] #F'
+    pair_face = torch.arange(face.shape[0],device=device).repeat_interleave(tile_counts) #P
+    local = torch.arange(pair_face.shape[0],device=device) - (tile_counts.cumsum(dim=0)-tile_counts)[pair_face] #P
+    tile = tile_lo[pair_face] + torch.stack((local % tile_size[pair_face,0],local.div(tile_size[pair_face,0],rounding_mode='floor')),dim=-1) #P,2 x,y
+    order = (tile[:,1]*((W+TILE_SIZE-1)//TILE_SIZE)+tile[:,0]).argsort(stable=True) #tile major, nearby pixels in each chunk
+    pair_face,tile = pair_face[order],tile[order]
+    pair_lo = torch.maximum(lo[pair_face],tile*TILE_SIZE) #P,2
+    pair_hi = torch.minimum(hi[pair_face],tile*TILE_SIZE+TILE_SIZE-1)
+
+    # drop pairs with the tile part of the bounding box outside of an edge, the maximum of a linear function
+    # over a box is at a corner, for slivers this leaves the tiles along the triangle instead of its bounding box
+    c = coef.index_select(0,pair_face)[:,:3] #P,3,3
+    offset_lo = (pair_lo-lo[pair_face]).type(c.dtype) #P,2
+    offset_hi = (pair_hi-lo[pair_face]).type(c.dtype)
+    bound = torch.maximum(c[...,0]*offset_lo[:,None,0],c[...,0]*offset_hi[:,None,0]) \
+        + torch.maximum(c[...,1]*offset_lo[:,None,1],c[...,1]*offset_hi[:,None,1]) + c[...,2] #P,3 same rounding as below
+    keep = (bound>=0).all(dim=-1).nonzero()[:,0]
+    pair_face,pair_lo,pair_hi = pair_face[keep],pair_lo[keep],pair_hi[keep]
+    size = pair_hi-pair_lo+1 #P,2
+    counts = size[:,0]*size[:,1] #P
+    ends = counts.cumsum(dim=0) #P
+    P = counts.shape[0]
+    pairs = torch.cat((pair_lo,size[:,:1],pair_face[:,None],pair_lo-lo[pair_face]),dim=-1) #P,6 x,y,width,face,offset x,y
+
+    zbuf = torch.full((H*W,),torch.iinfo(torch.long).max,dtype=torch.long,device=device) #(depth bits,triangle) packed into int64
+    start = 0
+    while start<P:
+        # chunk of pairs with at most MAX_CANDIDATES pixels, at least one pair
+        offset = ends[start-1] if start>0 else 0
+        end = max(start+1,int(torch.searchsorted(ends,offset+MAX_CANDIDATES,right=True)))
+        pair = torch.arange(start,end,device=device).repeat_interleave(counts[start:end]) #N
+        local = torch.arange(0,pair.shape[0],device=device) - (ends[pair]-counts[pair]-offset) #N
+        x,y,width,t,dx,dy = pairs.index_select(0,pair).unbind(dim=-1) #N
+        local_x = local % width
+        local_y = local.div(width,rounding_mode='floor')
+        col,row = x+local_x,y+local_y
+        c = coef.index_select(0,t) #N,4,3
+        v = c[...,0]*(dx+local_x)[:,None] + c[...,1]*(dy+local_y)[:,None] + c[...,2] #N,4 screen space barycentrics and depth
+        z = v[:,3]
+        inside = (v[:,:3]>=0).all(dim=-1).logical_and_(z>=-1).logical_and_(z<=1) #N
+
+        depth_bits = ((z[inside]+1)*.5).float().view(torch.int32).long() #non-negative floats sort like their bits
+        key = depth_bits<<32 | face[t[inside]]
+        zbuf.scatter_reduce_(dim=0,index=row[inside]*W+col[inside],src=key,reduce='amin')
+        start = end
+
+    covered = zbuf!=torch.iinfo(torch.long).max
+    return torch.where(covered,(zbuf & 0xffffffff)+1,0).reshape(H,W)
+
+def rasterize(
+        pos:torch.Tensor, #C,V,4 clip space
+        tri:torch.Tensor, #F,3 int32 or long
+        resolution:"tuple[int,int]",
+        threads:int=None, #views rasterized in parallel, None for torch.get_num_threads()
+        cull:str=None, #None, 'cw' or 'ccw', see _cull_faces()
+        )->"tuple[torch.Tensor,None]": #rast C,H,W,4, None in place of nvdiffrast's derivatives
+    C = pos.shape[0]
+    H,W = resolution
+    tri = tri.long()
+    threads = torch.get_num_threads() if threads is None else threads
+
+    with torch.no_grad():
+        pos_detached = pos.detach()
+        if min(C,threads)<=1:
+            ids = [_rasterize_view(pos_detached[i],tri,resolution,cull) for i in range(C)]
+        else: #one view per worker, each single threaded
+            ids = parallel_map(lambda i: _rasterize_view(pos_detached[i],tri,resolution,cull),range(C),threads)
+        ids = torch.stack(ids,dim=0) #C,H,W
+
+    # differentiable barycentrics and depth of the covered pixels
+    cam,row,col = ids.nonzero(as_tuple=True) #N
+    t = ids[cam,row,col]-1 #N
+    corner_pos = pos[cam[:,None],tri[t]] #N,3,4
+    c = _to_pixels(corner_pos,resolution) #N,3,2
+    p = torch.stack((col,row),dim=-1) + .5 #N,2
+    area = _cross2(c[:,1]-c[:,0],c[:,2]-c[:,0]) #N
+    b = torch.stack([_cross2(c[:,(k+2)%3]-c[:,(k+1)%3],p-c[:,(k+1)%3]) for k in range(3)],dim=-1) / area[:,None] #N,3
+    z = (b * corner_pos[...,2] / corner_pos[...,3]).sum(dim=-1) #N
+    b = b / corner_pos[...,3] #perspective correction
+    b = b / b.sum(dim=-1,keepdim=True)
+
+    rast = torch.zeros((C,H,W,4),dtype=pos.dtype,device=pos.device)
+    rast = rast.index_put((cam,row,col),torch.stack((b[:,0],b[:,1],z,(t+1).type(pos.dtype)),dim=-1))
+    return rast,None
+
+def interpolate(
+        attr:torch.Tensor, #V,A or C,V,A
+        rast:torch.Tensor, #C,H,W,4 from rasterize()
+        tri:torch.Tensor, #F,3
+        )->"tuple[torch.Tensor,None]": #C,H,W,A, None in place of nvdiffrast's derivatives
+    C,H,W,_ = rast.shape
+    cam,row,col = (rast[...,3]>0).nonzero(as_tuple=True) #N
+    uv = rast[cam,row,col] #N,4
+    t = uv[:,3].long()-1 #N
+    corner_attr = attr[tri.long()[t]] if attr.dim()==2 else attr[cam[:,None],tri.long()[t]] #N,3,A
+    u,v = uv[:,0:1],uv[:,1:2]
+    values = corner_attr[:,0]*u + corner_attr[:,1]*v + corner_attr[:,2]*(1-u-v) #N,A
+    out = torch.zeros((C,H,W,attr.shape[-1]),dtype=attr.dtype,device=attr.device)
+    return out.index_put((cam,row,col),values),None
+
+def _get_topology(tri:torch.Tensor)->"tuple[torch.Tensor,torch.Tensor]":
+    """
+    face_to_edge F,3 and edge_faces E,2 (-1 for boundary) of tri, reused while tri has the same content.
+    Callers convert faces per render, so the comparison is on values, which is much cheaper than calc_edges()
+    """
+    global _topology_cache
+    if _topology_cache is not None:
+        cached_tri,*topology = _topology_cache
+        if cached_tri.shape==tri.shape and cached_tri.device==tri.device and torch.equal(cached_tri,tri):
+            return topology
+    faces = torch.concat((torch.zeros((1,3),dtype=torch.long,device=tri.device),tri.long()+1)) #dummy face, see core.remesh.prepend_dummies()
+    _,face_to_edge,edge_to_face = calc_edges(faces,with_edge_to_face=True) #F+1,3 E,2,2
+    topology = face_to_edge[1:],edge_to_face[:,:,0]-1
+    _topology_cache = tri.clone(),*topology #copy, tri may be modified in place
+    return topology
+
+def _exit_edges(
+        corners:torch.Tensor, #N,3,2 triangle in pixel units
+        p:torch.Tensor, #N,2
+        q:torch.Tensor, #N,2
+        )->"tuple[torch.Tensor,torch.Tensor]": #t N, k N
+    """edge k where the segment p->q leaves the triangle at p+t*(q-p), t=inf if it does not"""
+    sign = _cross2(corners[:,1]-corners[:,0],corners[:,2]-corners[:,0]).sign()[:,None] #N,1
+    a = corners
+    b = corners.roll(-1,dims=1) #edge k from corner k to k+1
+    fp = _cross2(b-a,p[:,None]-a) * sign #N,3 >=0 inside
+    fq = _cross2(b-a,q[:,None]-a) * sign
+    exits = (fp>=0).logical_and_(fq<0) #N,3
+    t = torch.where(exits,fp/(fp-fq).masked_fill(~exits,1),torch.inf) #N,3
+    return t.min(dim=-1)
+
+def antialias(
+        color:torch.Tensor, #C,H,W,K
+        rast:torch.Tensor, #C,H,W,4 from rasterize()
+        pos:torch.Tensor, #C,V,4 clip space
+        tri:torch.Tensor, #F,3
+        )->torch.Tensor: #C,H,W,K
+    """
+    analytic antialiasing of silhouette edges, differentiable wrt color and pos.
+    For neighboring pixels showing different triangles, the silhouette edge crossing the segment between the
+    pixel centers at t (0 front center, 1 other center) blends the other pixel towards the front color by t-.5
+    if t>.5, else the front pixel towards the other color by .5-t. The silhouette edge is searched by walking
+    from the front triangle across at most MAX_WALK triangles along the segment.
+    """
+    C,H,W,K = color.shape
+    face_to_edge,edge_faces = _get_topology(tri)
+    tri = tri.long()
+    ids = rast[...,3].detach().long() #C,H,W
+    depth = torch.where(ids>0,rast[...,2].detach(),torch.inf) #C,H,W
+    flat_color = color.reshape(C*H*W,K)
+    out = flat_color
+    pos_detached = pos.detach()
+
+    for dim in (1,2): #vertical and horizontal neighbors
+        n = ids.shape[dim]-1
+        diff = ids.narrow(dim,0,n)!=ids.narrow(dim,1,n) #pairs (p,p+1 along dim)
+        cam,row,col = diff.nonzero(as_tuple=True) #N
+        first = torch.stack((row,col),dim=-1) #N,2 row,col
+        second = first.clone()
+        second[:,dim-1] += 1
+        first_front = depth[cam,first[:,0],first[:,1]] < depth[cam,second[:,0],second[:,1]] #N
+        front = torch.where(first_front[:,None],first,second) #N,2
+        other = torch.where(first_front[:,None],second,first) #N,2
+        p = front.flip(-1) + .5 #N,2 x,y
+        q = other.flip(-1) + .5
+        other_id = ids[cam,other[:,0],other[:,1]]-1 #N, -1 for background
+
+        # walk to the first silhouette edge, a boundary edge or an edge between a front and a back facing triangle
+        # in this view, give up when reaching the triangle of the other pixel
+        face = ids[cam,front[:,0],front[:,1]]-1 #N
+        edge_ind = torch.full_like(face,-1) #N, edge of face crossed by the silhouette
+        active = torch.arange(face.shape[0],device=face.device)
+        for _ in range(MAX_WALK):
+            f = face[active]
+            corners = _to_pixels(pos_detached[cam[active,None],tri[f]],(H,W)) #A,3,2
+            t,k = _exit_edges(corners,p[active],q[active]) #A
+            faces = edge_faces[face_to_edge[f,k]] #A,2
+            face_corners = _to_pixels(pos_detached[cam[active,None,None],tri[faces.clamp(min=0)]],(H,W)) #A,2,3,2
+            facing = _cross2(face_corners[:,:,1]-face_corners[:,:,0],face_corners[:,:,2]-face_corners[:,:,0])>0 #A,2
+            silhouette = (faces<0).any(dim=-1).logical_or_(facing[:,0]!=facing[:,1]).logical_and_(t.isfinite()) #A
+            # like nvdiffrast, an edge is only handled by the pairs crossing it at the steeper angle
+            d = (corners.roll(-1,dims=1)-corners).gather(1,k[:,None,None].expand(-1,1,2)).squeeze(1).abs() #A,2 x,y
+            edge_ind[active[silhouette]] = k[silhouette].masked_fill(d[silhouette,1]<d[silhouette,0] if dim==2 else d[silhouette,0]<=d[silhouette,1],-1)
+            next_face = torch.where(faces[:,0]==f,faces[:,1],faces[:,0]) #A
+            walk = (~silhouette).logical_and_(t.isfinite()).logical_and_(next_face!=other_id[active])
+            active = active[walk]
+            face[active] = next_face[walk]
+            if active.shape[0]==0:
+                break
+
+        found = edge_ind>=0 #N
+        cam,front,other,face,k = cam[found],front[found],other[found],face[found],edge_ind[found]
+        p,q = p[found],q[found]
+        corners = _to_pixels(pos[cam[:,None],tri[face]],(H,W)) #N',3,2
+        sign = _cross2(corners[:,1]-corners[:,0],corners[:,2]-corners[:,0]).sign() #N'
+        a = corners.gather(1,k[:,None,None].expand(-1,1,2)).squeeze(1) #N',2
+        b = corners.gather(1,((k+1)%3)[:,None,None].expand(-1,1,2)).squeeze(1)
+        fp = _cross2(b-a,p-a) * sign
+        fq = _cross2(b-a,q-a) * sign
+        t = fp/(fp-fq) #N'
+
+        front_ind = (cam*H+front[:,0])*W+front[:,1]
+        other_ind = (cam*H+other[:,0])*W+other[:,1]
+        blend_other = t>.5
+        target = torch.where(blend_other,other_ind,front_ind) #pixel to blend
+        source = torch.where(blend_other,front_ind,other_ind) #color to blend towards
+        weight = torch.where(blend_other,t-.5,.5-t)[:,None] #N',1
+        out = out.index_add(0,target,(flat_color[source]-flat_color[target])*weight)
+
+    return out.reshape(C,H,W,K)
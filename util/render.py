@@ -1,6 +1,23 @@
+from functools import partial
 from matplotlib import image
-import nvdiffrast.torch as dr
 import torch
+from util import rasterize
+try:
+    import nvdiffrast.torch as dr
+except ImportError:
+    dr = None
+
+BACKENDS = ('auto','nvdiffrast','torch')
+
+def get_backend(backend:str='auto')->str:
+    """resolve 'auto' to 'nvdiffrast' if it is installed and cuda is available, else to the 'torch' CPU rasterizer in util.rasterize"""
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown render backend: {backend}')
+    if backend=='nvdiffrast' and dr is None:
+        raise ValueError('render backend nvdiffrast requires the nvdiffrast package')
+    if backend=='auto':
+        return 'nvdiffrast' if dr is not None and torch.cuda.is_available() else 'torch'
+    return backend
 
 def _warmup(glctx):
     #windows workaround for https://github.com/NVlabs/nvdiffrast/issues/59
@@ -12,37 +29,56 @@ def _warmup(glctx):
 
 class NormalsRenderer:
     
-    _glctx:dr.RasterizeGLContext = None
+    _glctx = None
     
     def __init__(
             self,
             mv: torch.Tensor, #C,4,4
             proj: torch.Tensor, #C,4,4
             image_size: "tuple[int,int]",
+            backend: str = 'auto', #'nvdiffrast', 'torch' or 'auto', see get_backend()
+            cull: str = None, #None, 'cw' or 'ccw', faces culled per view by the torch backend, see util.rasterize
             ):
         self._mvp = proj @ mv #C,4,4
         self._image_size = image_size
+        self._backend = get_backend(backend)
+        if self._backend=='torch':
+            self._rasterize = partial(rasterize.rasterize,cull=cull)
+            self._interpolate = rasterize.interpolate
+            self._antialias = rasterize.antialias
+            return
+        if cull is not None:
+            raise ValueError('face culling requires the torch render backend')
         try:
             self._glctx = dr.RasterizeGLContext()
         except Exception as e:
             print("Could not use GL rasterizer, falling back to CUDA rasterizer.")
             self._glctx = dr.RasterizeCudaContext()
         _warmup(self._glctx)
+        self._rasterize = partial(dr.rasterize,self._glctx,grad_db=False)
+        self._interpolate = dr.interpolate
+        self._antialias = dr.antialias
+
+    @property
+    def backend(self)->str:
+        """'nvdiffrast' or 'torch', 'auto' resolved"""
+        return self._backend
 
     def render(self,
             vertices: torch.Tensor, #V,3 float
             normals: torch.Tensor, #V,3 float
-            faces: torch.Tensor, #F,3 long
+            faces: torch.Tensor, #F,3 long or int32, int32 is used without a copy
             ) ->torch.Tensor: #C,H,W,4
 
         V = vertices.shape[0]
-        faces = faces.type(torch.int32)
+        if faces.dtype!=torch.int32:
+            faces = faces.type(torch.int32)
         vert_hom = torch.cat((vertices, torch.ones(V,1,device=vertices.device)),axis=-1) #V,3 -> V,4
         vertices_clip = vert_hom @ self._mvp.transpose(-2,-1) #C,V,4
-        rast_out,_ = dr.rasterize(self._glctx, vertices_clip, faces, resolution=self._image_size, grad_db=False) #C,H,W,4
+        rast_out,_ = self._rasterize(vertices_clip, faces, resolution=self._image_size) #C,H,W,4
         vert_col = (normals+1)/2 #V,3
-        col,_ = dr.interpolate(vert_col, rast_out, faces) #C,H,W,3
+        col,_ = self._interpolate(vert_col, rast_out, faces) #C,H,W,3
         alpha = torch.clamp(rast_out[..., -1:], max=1) #C,H,W,1
         col = torch.concat((col,alpha),dim=-1) #C,H,W,4
-        col = dr.antialias(col, rast_out, vertices_clip, faces) #C,H,W,4
+        col = self._antialias(col, rast_out, vertices_clip, faces) #C,H,W,4
         return col #C,H,W,4
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+import torch
+
+def encode(images:torch.Tensor,dtype:torch.dtype)->torch.Tensor:
+    """images in [0,1] to dtype, uint8 is quantized to 255 levels"""
+    if dtype==torch.uint8:
+        return (images*255).round_().clamp_(0,255).type(torch.uint8)
+    return images.type(dtype)
+
+def decode(images:torch.Tensor,dtype:torch.dtype=torch.float32)->torch.Tensor:
+    """inverse of encode()"""
+    if images.dtype==torch.uint8:
+        return images.type(dtype).mul_(1/255)
+    return images.type(dtype)
+
+class ViewSampler:
+    """
+    Draws batches of views for stochastic multi-view optimization. The targets of all views stay resident on
+    device in a compact dtype, the next batch is gathered and decoded on a background thread (and cuda stream)
+    while the current one is used. With importance>0 views are drawn with probability mixing uniform and their
+    recent loss, reported with update(). The next batch is drawn when the current one is handed out, so it
+    sees the losses up to the previous step.
+    """
+
+    def __init__(
+            self,
+            *targets:torch.Tensor, #C,... each, e.g. C,H,W,3 images in [0,1]
+            batch_size:int,
+            device=None, #default: device of the first target
+            dtype:torch.dtype=torch.float16, #storage dtype, float16, bfloat16, uint8 or float32
+            out_dtype:torch.dtype=torch.float32,
+            importance:float=0., #0 uniform, 1 proportional to loss
+            decay:float=.9, #of the per view loss average
+            prefetch:bool=True,
+            generator:torch.Generator=None, #on device to draw without host syncs, importance sampling with a cpu generator reads back the losses
+            ):
+        self._device = targets[0].device if device is None else torch.device(device)
+        self._targets = [encode(t.detach().to(self._device),dtype) for t in targets]
+        self._views = targets[0].shape[0]
+        self._batch_size = min(batch_size,self._views)
+        self._out_dtype = out_dtype
+        self._importance = importance
+        self._decay = decay
+        self._generator = generator
+        self._loss = torch.zeros(self._views,device=self._device) #C
+        self._seen = torch.zeros(self._views,dtype=torch.bool,device=self._device) #C
+        self._stream = torch.cuda.Stream(self._device) if self._device.type=='cuda' else None
+        self._pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self._next = None
+
+    def probabilities(self)->torch.Tensor: #C
+        uniform = torch.full((self._views,),1/self._views,device=self._device)
+        if self._importance==0:
+            return uniform
+        # unseen views count as the hardest so far, every view is drawn early on
+        hardest = self._loss.masked_fill(~self._seen,0).amax()
+        loss = torch.where(self._seen,self._loss,torch.where(hardest>0,hardest,1.)) #C
+        total = loss.sum()
+        weight = torch.where(total>0,loss/total.clamp(min=torch.finfo(loss.dtype).tiny),uniform)
+        return uniform*(1-self._importance) + weight*self._importance
+
+    def _sample(self)->torch.Tensor: #B long
+        device = self._device if self._generator is None else self._generator.device #sampled where the generator lives
+        if self._importance==0:
+            views = torch.randperm(self._views,generator=self._generator,device=device)[:self._batch_size]
+        else:
+            views = torch.multinomial(self.probabilities().to(device),self._batch_size,replacement=False,generator=self._generator)
+        return views.to(self._device)
+
+    def _gather(self,views:torch.Tensor)->"tuple[list[torch.Tensor],torch.cuda.Event]":
+        if self._stream is None:
+            return [decode(t.index_select(0,views),self._out_dtype) for t in self._targets],None
+        with torch.cuda.stream(self._stream):
+            batch = [decode(t.index_select(0,views),self._out_dtype) for t in self._targets]
+            event = torch.cuda.Event()
+            event.record(self._stream)
+        return batch,event
+
+    def _submit(self):
+        views = self._sample()
+        if self._stream is not None:
+            self._stream.wait_stream(torch.cuda.current_stream(self._device)) #views and update() writes
+        future = self._pool.submit(self._gather,views) if self._pool is not None else None
+        self._next = views,future
+
+    def next(self)->"tuple[torch.Tensor,list[torch.Tensor]]": #views B, targets B,... each in out_dtype
+        if self._next is None:
+            self._submit()
+        views,future = self._next
+        batch,event = future.result() if future is not None else self._gather(views)
+        if event is not None:
+            stream = torch.cuda.current_stream(self._device)
+            stream.wait_event(event)
+            for t in batch:
+                t.record_stream(stream)
+        if self._pool is not None:
+            self._submit()
+        else:
+            self._next = None
+        return views,batch
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def update(self,views:torch.Tensor,loss:torch.Tensor):
+        """record per view losses B of the batch views B, kept as exponential moving average"""
+        views = views.to(self._device)
+        loss = loss.detach().to(self._loss.dtype).to(self._device)
+        old = torch.where(self._seen[views],self._loss[views],loss)
+        self._loss[views] = old*self._decay + loss*(1-self._decay)
+        self._seen[views] = True
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -2,9 +2,10 @@ from copy import deepcopy
 from time import time
 from typing import Any
 import torch
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from core.opt import MeshOptimizer
+from util.func import to_host
 
 
 @dataclass
@@ -15,7 +16,81 @@ class Snapshot:
     faces:torch.Tensor #F,3
     optimizer:Any=None
 
-def snapshot(opt:MeshOptimizer):
+@dataclass
+class CompactSnapshot:
+    """
+    Snapshot without optimizer, only positions, faces and optionally nu and ref_len in host memory.
+    Tensors may be stored as float16/int32, the properties return float32/long.
+    """
+    step:int
+    time:float
+    stored_vertices:torch.Tensor #V,3
+    stored_faces:torch.Tensor #F,3
+    stored_nu:torch.Tensor=None #V
+    stored_ref_len:torch.Tensor=None #V
+    optimizer:Any=None
+    _copied:Any=field(default=None,repr=False) #cuda event of the non-blocking copies
+
+    def _wait(self):
+        if self._copied is not None:
+            self._copied.synchronize()
+            self._copied = None
+
+    @property
+    def vertices(self)->torch.Tensor:
+        self._wait()
+        return self.stored_vertices.float()
+
+    @property
+    def faces(self)->torch.Tensor:
+        self._wait()
+        return self.stored_faces.long()
+
+    @property
+    def nu(self)->torch.Tensor:
+        self._wait()
+        return None if self.stored_nu is None else self.stored_nu.float()
+
+    @property
+    def ref_len(self)->torch.Tensor:
+        self._wait()
+        return None if self.stored_ref_len is None else self.stored_ref_len.float()
+
+    def __getstate__(self): #cuda events can't be pickled
+        self._wait()
+        return self.__dict__
+
+def compact_snapshot(
+        step:int,
+        time:float,
+        vertices:torch.Tensor, #V,3
+        faces:torch.Tensor, #F,3
+        nu:torch.Tensor=None, #V
+        ref_len:torch.Tensor=None, #V
+        half:bool=False, #store float16 and int32, faces must have less than 2**31 vertices
+        )->CompactSnapshot:
+    float_type = torch.float16 if half else None
+    s = CompactSnapshot(
+        step=step,
+        time=time,
+        stored_vertices=to_host(vertices,float_type),
+        stored_faces=to_host(faces,torch.int32 if half else None),
+        stored_nu=None if nu is None else to_host(nu,float_type),
+        stored_ref_len=None if ref_len is None else to_host(ref_len,float_type),
+    )
+    if vertices.is_cuda:
+        s._copied = torch.cuda.Event()
+        s._copied.record()
+    return s
+
+def snapshot(
+        opt:MeshOptimizer,
+        compact:bool=False, #CompactSnapshot instead of a deep copy of the optimizer
+        half:bool=False, #see compact_snapshot()
+        ):
+    if compact:
+        return compact_snapshot(opt._step,time()-opt._start,opt.vertices,opt.faces,opt._nu,opt._ref_len,half=half)
+
     opt = deepcopy(opt)
     opt._vertices.requires_grad_(False)
 
@@ -25,4 +100,4 @@ def snapshot(opt:MeshOptimizer):
         vertices=opt.vertices,
         faces=opt.faces,
         optimizer=opt,
-    )
\ No newline at end of file
+    )
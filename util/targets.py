@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Optional
+import numpy as np
+import torch
+from util.disk_cache import DiskCache, save_npy
+from util.sampler import decode, encode
+
+DEFAULT_CACHE_DIR = Path(os.environ.get('TARGET_CACHE_DIR','out/target_cache'))
+DEFAULT_MAX_BYTES = 4<<30
+TILE_SIZE = 32
+
+_numpy_views = {torch.bfloat16:torch.int16} #dtypes without numpy equivalent, stored bitwise
+
+class TargetStore:
+    """
+    target images C,H,W,K in [0,1] held as tiles of tile_size² pixels in a compact dtype, see util.sampler.encode().
+    Tiles that are zero after encoding (background) are not stored, get() decodes the requested views on demand.
+    """
+
+    def __init__(
+            self,
+            tiles:torch.Tensor, #N,T,T,K encoded
+            index:torch.Tensor, #C,TH,TW long, tile of each view and position, -1 for zero
+            shape:"tuple[int,int,int,int]", #C,H,W,K
+            ):
+        self._tiles = tiles
+        self._index = index
+        self.shape = torch.Size(shape)
+
+    @staticmethod
+    def from_images(
+            images:torch.Tensor, #C,H,W,K
+            dtype:torch.dtype=torch.uint8,
+            tile_size:int=TILE_SIZE,
+            )->"TargetStore":
+        C,H,W,K = images.shape
+        T = tile_size
+        TH,TW = -(-H//T),-(-W//T)
+        images = torch.nn.functional.pad(images.detach(),(0,0,0,TW*T-W,0,TH*T-H)) #C,TH*T,TW*T,K
+        tiles = encode(images.reshape(C,TH,T,TW,T,K).transpose(2,3),dtype) #C,TH,TW,T,T,K
+        nonzero = tiles.flatten(3).ne(0).any(dim=-1) #C,TH,TW
+        index = nonzero.flatten().cumsum(dim=0).sub_(1).reshape(C,TH,TW).masked_fill_(~nonzero,-1)
+        return TargetStore(tiles[nonzero].contiguous(),index,(C,H,W,K))
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def dtype(self)->torch.dtype:
+        return self._tiles.dtype
+
+    @property
+    def device(self)->torch.device:
+        return self._tiles.device
+
+    @property
+    def nbytes(self)->int:
+        return self._tiles.nbytes + self._index.nbytes
+
+    def get(
+            self,
+            views:torch.Tensor=None, #B long, None for all views
+            dtype:torch.dtype=torch.float32,
+            )->torch.Tensor: #B,H,W,K
+        C,H,W,K = self.shape
+        index = self._index if views is None else self._index[views.to(self._index.device)] #B,TH,TW
+        B,TH,TW = index.shape
+        T = self._tiles.shape[1]
+        out = torch.zeros((B,TH,TW,T,T,K),dtype=dtype,device=self.device)
+        stored = index>=0
+        out[stored] = decode(self._tiles[index[stored]],dtype)
+        return out.transpose(2,3).reshape(B,TH*T,TW*T,K)[:,:H,:W]
+
+    def to(self,device)->"TargetStore":
+        return TargetStore(self._tiles.to(device),self._index.to(device),self.shape)
+
+    def save(self,path:Path,write:Callable[[Path,Callable[[Path],None]],None]=None):
+        """writes path.tiles.npy, path.index.npy and path.json, write(path,fn) may replace the plain fn(path)"""
+        if write is None:
+            write = lambda p,fn: fn(p)
+        tiles = self._tiles.view(_numpy_views.get(self.dtype,self.dtype))
+        meta = {'shape':list(self.shape),'dtype':str(self.dtype).removeprefix('torch.')}
+        write(path.with_name(path.name+'.tiles.npy'),lambda p: save_npy(p,tiles.cpu().numpy()))
+        write(path.with_name(path.name+'.index.npy'),lambda p: save_npy(p,self._index.cpu().numpy()))
+        write(path.with_name(path.name+'.json'),lambda p: p.write_text(json.dumps(meta))) #last, marks a complete entry
+
+    @staticmethod
+    def load(path:Path,device='cpu')->"TargetStore":
+        """memory maps the files written by save() and copies them to device"""
+        meta = json.loads(path.with_name(path.name+'.json').read_text())
+        dtype = getattr(torch,meta['dtype'])
+        tiles = torch.from_numpy(np.load(path.with_name(path.name+'.tiles.npy'),mmap_mode='c'))
+        index = torch.from_numpy(np.load(path.with_name(path.name+'.index.npy'),mmap_mode='c'))
+        return TargetStore(tiles.to(device).view(dtype),index.to(device),meta['shape'])
+
+
+def mean_abs_error(
+        images:torch.Tensor, #C,H,W,K
+        targets:"TargetStore|torch.Tensor", #C,H,W,K
+        chunk:int=4, #views decoded at a time
+        )->torch.Tensor:
+    """(images-targets).abs().mean(), a TargetStore is decoded chunk views at a time and never held in full as float32"""
+    if not isinstance(targets,TargetStore):
+        return (images-targets).abs().mean()
+    total = 0
+    for start in range(0,len(targets),chunk):
+        views = torch.arange(start,min(start+chunk,len(targets)),device=targets.device)
+        total = total + (images[start:start+chunk]-targets.get(views,images.dtype)).abs().sum()
+    return total / images.numel()
+
+
+class TargetCache(DiskCache):
+    """
+    on-disk cache of rendered target images as TargetStore files, keyed by a hash of the target mesh, the cameras,
+    the image size and render parameters. Restarts and sweeps reuse the targets instead of rendering them again.
+    Entries are written atomically, least recently used entries are evicted above max_bytes.
+    """
+
+    _entry_patterns = ('*.npy','*.json')
+
+    def __init__(self,cache_dir:Path=DEFAULT_CACHE_DIR,max_bytes:int=DEFAULT_MAX_BYTES):
+        super().__init__(cache_dir,max_bytes)
+
+    def key(
+            self,
+            vertices:torch.Tensor, #V,3
+            faces:torch.Tensor, #F,3
+            mv:torch.Tensor, #C,4,4
+            proj:torch.Tensor, #4,4 or C,4,4
+            image_size:"tuple[int,int]",
+            params:dict, #everything else that changes the images, e.g. renderer and dtype
+            )->str:
+        h = hashlib.blake2b(digest_size=20)
+        for t in (vertices,faces,mv,proj):
+            t = t.detach().cpu().contiguous()
+            h.update(f'{t.dtype}{tuple(t.shape)}'.encode())
+            h.update(t.numpy().tobytes())
+        h.update(json.dumps({'image_size':list(image_size),**params},sort_keys=True).encode())
+        return h.hexdigest()
+
+    def load(
+            self,
+            key:str,
+            render:Callable[[],torch.Tensor], #called on a miss, returns images C,H,W,K in [0,1]
+            dtype:torch.dtype=torch.uint8,
+            tile_size:int=TILE_SIZE,
+            device='cpu',
+            )->TargetStore:
+        path = self._dir/f'{key}.{str(dtype).removeprefix("torch.")}.{tile_size}'
+        try:
+            self.touch(*(path.with_name(path.name+suffix) for suffix in ('.json','.tiles.npy','.index.npy')))
+            return TargetStore.load(path,device=device)
+        except FileNotFoundError: #miss or evicted by another process
+            pass
+
+        store = TargetStore.from_images(render(),dtype=dtype,tile_size=tile_size).to(device)
+        store.save(path,write=self.write)
+        self.evict()
+        return store
+
+target_cache = TargetCache()
+
+def load_targets(
+        render:Callable[[],torch.Tensor], #returns images C,H,W,K in [0,1]
+        vertices:torch.Tensor, #V,3 target mesh
+        faces:torch.Tensor, #F,3
+        mv:torch.Tensor, #C,4,4
+        proj:torch.Tensor, #4,4 or C,4,4
+        image_size:"tuple[int,int]",
+        dtype:torch.dtype=torch.uint8,
+        tile_size:int=TILE_SIZE,
+        params:dict=None, #renderer settings, part of the cache key
+        cache:Optional[TargetCache]=target_cache, #None to always render
+        device='cpu',
+        )->TargetStore:
+    if cache is None:
+        return TargetStore.from_images(render(),dtype=dtype,tile_size=tile_size).to(device)
+    key = cache.key(vertices,faces,mv,proj,image_size,params or {})
+    return cache.load(key,render,dtype=dtype,tile_size=tile_size,device=device)
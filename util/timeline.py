@@ -0,0 +1,188 @@
+import json
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+import numpy as np
+import torch
+
+INDEX_DTYPE = np.dtype([
+    ('step','<i8'),
+    ('time','<f8'),
+    ('key','<i8'), #index of the keyframe record, itself for keyframes
+    ('vertex_count','<i8'),
+    ('face_count','<i8'),
+    ('vertices','<i8'), #element offset into vertices.bin for keyframes, into deltas.bin otherwise
+    ('faces','<i8'), #element offset into faces.bin, shared by keyframes with equal faces
+    ('nu','<i8'), #element offset into attributes.bin, -1 if missing
+    ('ref_len','<i8'),
+])
+
+FILES = 'index.bin','vertices.bin','deltas.bin','faces.bin','attributes.bin'
+
+def _map(path:Path,dtype)->np.ndarray:
+    if path.stat().st_size==0: #empty files can't be mapped
+        return np.empty(0,dtype=dtype)
+    return np.memmap(path,dtype=dtype,mode='c')
+
+class TimelineWriter:
+    """
+    Appends snapshots to a timeline directory, see Timeline.
+    A keyframe with vertices and faces is written whenever the faces change (remesh) or after keyframe_interval snapshots,
+    in between only the vertex offsets to the last keyframe are written, in float16 if half is set.
+    Existing timelines in the directory are overwritten.
+    """
+
+    def __init__(self,dir:Path,half:bool=False,keyframe_interval:int=100):
+        self._dir = Path(dir)
+        self._dir.mkdir(parents=True,exist_ok=True)
+        self._delta_dtype = np.dtype(np.float16 if half else np.float32)
+        self._keyframe_interval = keyframe_interval
+        (self._dir/'meta.json').write_text(json.dumps({'delta_dtype':self._delta_dtype.str}))
+        self._files = {name:open(self._dir/name,'wb') for name in FILES}
+        self._sizes = {name:0 for name in FILES} #in elements
+        self._count = 0
+        self._key = -1
+        self._key_vertices = None #V,3 float32
+        self._key_faces = None #F,3 int32
+        self._key_faces_offset = -1
+
+    def _write(self,name:str,array:np.ndarray,dtype)->int:
+        array = np.ascontiguousarray(array,dtype=dtype)
+        offset = self._sizes[name]
+        self._files[name].write(array.tobytes())
+        self._sizes[name] += array.size
+        return offset
+
+    def append(self,snapshot:Any):
+        """snapshot needs step, time, vertices and faces, nu and ref_len are written if present and not None"""
+        vertices = snapshot.vertices.detach().cpu().numpy().astype(np.float32,copy=False)
+        faces = snapshot.faces.cpu().numpy().astype(np.int32,copy=False)
+        record = np.zeros(1,dtype=INDEX_DTYPE)[0]
+        record['step'] = snapshot.step
+        record['time'] = snapshot.time
+        record['vertex_count'] = vertices.shape[0]
+        record['face_count'] = faces.shape[0]
+
+        same_faces = self._key_faces is not None and self._key_vertices.shape==vertices.shape and np.array_equal(self._key_faces,faces)
+        if same_faces and self._count-self._key<self._keyframe_interval:
+            record['key'] = self._key
+            record['vertices'] = self._write('deltas.bin',vertices-self._key_vertices,self._delta_dtype)
+            record['faces'] = self._key_faces_offset
+        else:
+            if not same_faces:
+                self._key_faces = faces.copy()
+                self._key_faces_offset = self._write('faces.bin',faces,np.int32)
+            self._key = self._count
+            self._key_vertices = vertices.copy()
+            record['key'] = self._key
+            record['vertices'] = self._write('vertices.bin',vertices,np.float32)
+            record['faces'] = self._key_faces_offset
+
+        for name in 'nu','ref_len':
+            value = getattr(snapshot,name,None)
+            record[name] = -1 if value is None else self._write('attributes.bin',value.detach().cpu().numpy(),self._delta_dtype)
+
+        self._write('index.bin',record,INDEX_DTYPE) #last, readers only see complete records
+        self._count += 1
+
+    def flush(self):
+        for file in self._files.values():
+            file.flush()
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+@dataclass
+class TimelineSnapshot:
+    """lazy snapshot of a Timeline, tensors are read from disk on access"""
+    step:int
+    time:float
+    timeline:"Timeline"=field(repr=False)
+    index:int=field(repr=False)
+    optimizer:Any=None
+
+    @property
+    def vertices(self)->torch.Tensor:
+        return self.timeline.vertices(self.index)
+
+    @property
+    def faces(self)->torch.Tensor:
+        return self.timeline.faces(self.index)
+
+    @property
+    def nu(self)->torch.Tensor:
+        return self.timeline.attribute(self.index,'nu')
+
+    @property
+    def ref_len(self)->torch.Tensor:
+        return self.timeline.attribute(self.index,'ref_len')
+
+class Timeline(Sequence):
+    """
+    Memory mapped snapshot timeline written by TimelineWriter, a read-only list of TimelineSnapshot.
+    Any snapshot is read in O(1) from its keyframe plus a single offset, nothing but the index is loaded up front.
+    Snapshots appended after opening are not visible.
+    """
+
+    def __init__(self,dir:Path):
+        self._dir = Path(dir)
+        meta = json.loads((self._dir/'meta.json').read_text())
+        self._delta_dtype = np.dtype(meta['delta_dtype'])
+        self._index = _map(self._dir/'index.bin',INDEX_DTYPE)
+        self._vertices = _map(self._dir/'vertices.bin',np.float32)
+        self._deltas = _map(self._dir/'deltas.bin',self._delta_dtype)
+        self._faces = _map(self._dir/'faces.bin',np.int32)
+        self._attributes = _map(self._dir/'attributes.bin',self._delta_dtype)
+
+    def __len__(self):
+        return self._index.shape[0]
+
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i<0:
+            i += len(self)
+        if not 0<=i<len(self):
+            raise IndexError('timeline index out of range')
+        record = self._index[i]
+        return TimelineSnapshot(step=int(record['step']),time=float(record['time']),timeline=self,index=i)
+
+    @property
+    def steps(self)->np.ndarray:
+        return np.asarray(self._index['step'])
+
+    @property
+    def times(self)->np.ndarray:
+        return np.asarray(self._index['time'])
+
+    def vertices(self,i:int)->torch.Tensor: #V,3 float32
+        record = self._index[i]
+        key = self._index[record['key']]
+        V = int(record['vertex_count'])
+        vertices = self._vertices[key['vertices']:key['vertices']+V*3]
+        if record['key']==i:
+            vertices = vertices.copy()
+        else:
+            vertices = vertices + self._deltas[record['vertices']:record['vertices']+V*3]
+        return torch.from_numpy(vertices.reshape(V,3))
+
+    def faces(self,i:int)->torch.Tensor: #F,3 long
+        record = self._index[i]
+        F = int(record['face_count'])
+        faces = self._faces[record['faces']:record['faces']+F*3]
+        return torch.from_numpy(faces.reshape(F,3).astype(np.int64))
+
+    def attribute(self,i:int,name:str)->torch.Tensor: #V float32 or None
+        record = self._index[i]
+        if record[name]<0:
+            return None
+        V = int(record['vertex_count'])
+        return torch.from_numpy(self._attributes[record[name]:record[name]+V].astype(np.float32))
@@ -1,6 +1,6 @@
 from copy import deepcopy
 from re import S
-from typing import Union
+from typing import Sequence, Union
 import torch
 import open3d as o3d
 import open3d.visualization.gui as gui
@@ -16,7 +16,7 @@ class Viewer:
     def __init__(self, 
             target_vertices:torch.Tensor, #V,3 
             target_faces:torch.Tensor, #F,3 
-            snapshots:list[Snapshot],
+            snapshots:Sequence[Snapshot], #list or util.timeline.Timeline
             vertex_colors:dict[str,list[np.array]]
             ):
         self._target_vertices = target_vertices
@@ -126,8 +126,12 @@ class Viewer:
         clim = self._clim_slider.double_value
         if self._colorbox.selected_text=='Relative Velocity nu' and isinstance(snapshot.optimizer, MeshOptimizer):
             vertex_colors = snapshot.optimizer._nu
+        elif self._colorbox.selected_text=='Relative Velocity nu' and getattr(snapshot,'nu',None) is not None:
+            vertex_colors = snapshot.nu
         elif self._colorbox.selected_text=='Reference Edge Length l_ref' and isinstance(snapshot.optimizer, MeshOptimizer):
             vertex_colors = snapshot.optimizer._ref_len
+        elif self._colorbox.selected_text=='Reference Edge Length l_ref' and getattr(snapshot,'ref_len',None) is not None:
+            vertex_colors = snapshot.ref_len
         elif self._colorbox.selected_text in self._vertex_colors.keys():
             vertex_colors = self._vertex_colors[self._colorbox.selected_text][self._snapshot_slider.int_value]
         else:
@@ -241,7 +245,7 @@ class Viewer:
 def show(
     target_vertices:torch.Tensor, #V,3 
     target_faces:torch.Tensor, #F,3 
-    snapshots:list[Snapshot],
+    snapshots:Sequence[Snapshot], #list or util.timeline.Timeline
     vertex_colors:dict[str,list[np.array]]={}
     ):
     for vc in vertex_colors.values():
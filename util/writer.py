@@ -0,0 +1,90 @@
+import atexit
+import queue
+import threading
+from pathlib import Path
+from typing import Callable
+import torch
+from util.func import save_images, save_obj, save_ply, to_host
+
+def _host_copy(x):
+    return to_host(x) if isinstance(x,torch.Tensor) else x
+
+class AsyncWriter:
+    """
+    Runs file exports on a background thread, the calling thread only takes host copies of the arguments.
+    Copies from cuda are non-blocking, the writer thread waits for them before encoding.
+    At most max_pending jobs are queued, further calls block until a job is done (backpressure).
+    Errors on the writer thread are raised by the next call, flush() or close().
+    Use as context manager or call close(), pending jobs are also flushed at interpreter exit.
+    """
+
+    def __init__(self,max_pending:int=16):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run,daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                event,fn,args,kwargs = job
+                if event is not None:
+                    event.synchronize()
+                fn(*args,**kwargs)
+            except Exception as e:
+                if self._error is None: #keep the first error
+                    self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error,self._error = self._error,None
+            raise error
+
+    def submit(self,fn:Callable,*args,**kwargs):
+        """call fn(*args,**kwargs) on the writer thread, tensor arguments are replaced by host copies"""
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise RuntimeError('AsyncWriter is closed')
+        args = [_host_copy(a) for a in args]
+        kwargs = {k:_host_copy(v) for k,v in kwargs.items()}
+        event = None
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            event = torch.cuda.Event()
+            event.record()
+        self._queue.put((event,fn,args,kwargs))
+
+    def save_images(self,images:torch.Tensor,dir:Path):
+        """see util.func.save_images, converts to uint8 before the copy"""
+        images = (images.detach()[...,:3]*255).clamp(max=255).type(torch.uint8)
+        self.submit(save_images,images,dir)
+
+    def save_obj(self,vertices:torch.Tensor,faces:torch.Tensor,filename:Path):
+        self.submit(save_obj,vertices,faces,filename)
+
+    def save_ply(self,filename:Path,vertices:torch.Tensor,faces:torch.Tensor,vertex_colors:torch.Tensor=None,vertex_normals:torch.Tensor=None,binary:bool=True):
+        self.submit(save_ply,filename,vertices,faces,vertex_colors,vertex_normals,binary=binary)
+
+    def flush(self):
+        """wait for all pending jobs"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """flush and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        atexit.unregister(self.close)
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()